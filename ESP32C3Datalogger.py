@@ -1,14 +1,38 @@
-import network, socket, gc, time, ntptime, os, _thread, machine
+import network, socket, gc, time, os, _thread, machine, json, math, struct
+from array import array
 from machine import Pin, I2C, ADC
 import bme680
 
 # --- Config ---
 SSID = "XXXXXXXX"
 PASSWORD = "XXXXXXXX"
-MAX_LOG_FILES = 7  # Keep 1 week of daily logs
+NODE_NAME = "BreadBoard"  # Hostname, also identifies this node to collectors
+WIFI_CONNECT_TIMEOUT = 15  # Seconds per connection attempt
+WIFI_RETRY_MIN = 2  # First retry delay after a failure, doubles up to WIFI_RETRY_MAX
+WIFI_RETRY_MAX = 300  # Longest delay between connection attempts
+MAX_LOG_FILES = 31  # Most full-resolution daily logs to keep
+FLASH_HIGH_WATER = 0.80  # Compact old days once this fraction of flash is used
+SUMMARY_MAX_MONTHS = 24  # Monthly hourly-summary files to keep
+RECOVERY_WINDOW = 256  # Bytes at the end of the newest log checked at boot
 LOG_INTERVAL = 60  # seconds
 UTC_OFFSET = 0  # Adjust for your timezone (e.g., 3600 for UTC+1)
 
+# Clock (NTP) config
+NTP_HOST = "pool.ntp.org"
+NTP_PORT = 123
+NTP_SYNC_INTERVAL = 3600  # Seconds between NTP syncs once synced
+NTP_RETRY_MIN = 15  # First retry delay after a failed sync, doubles up to NTP_SYNC_INTERVAL
+NTP_TIMEOUT = 2000  # ms to wait for an NTP reply
+CLOCK_STEP_THRESHOLD = 1000  # ms; larger offsets are stepped, smaller ones slewed
+PRESYNC_FILE = "presync.jsonl"  # Samples held on flash until the first NTP sync dates them
+
+# I2C bus config
+I2C_SCL_PIN = 21
+I2C_SDA_PIN = 20
+I2C_FREQ = 100000
+BUS_RECOVERY_MIN = 1  # Seconds before retrying a bus recovery that didn't help, doubles up to BUS_RECOVERY_MAX
+BUS_RECOVERY_MAX = 300
+
 # Battery monitoring config
 BATTERY_PIN = 3  # GPIO3 = ADC1 Channel 3
 VOLTAGE_DIVIDER_RATIO = 2.0  # Adjust based on your resistor values (R1+R2)/R2
@@ -17,87 +41,731 @@ BATTERY_ENABLED = True  # Set to False to disable battery monitoring
 # VEML7700 config
 VEML7700_ENABLED = True  # Set to False to disable light sensor
 VEML7700_ADDRESS = 0x10  # Default I2C address
+VEML7700_IT = 100  # Integration time (ms: 25, 50, 100, 200, 400, 800)
+VEML7700_GAIN = 1/8  # Gain (1/8, 1/4, 1, 2); higher gain resolves dimmer light
+
+# Sensor Registry Configuration
+SENSOR_TAGS = {0x77: "duct"}  # Column tags for extra devices of a kind (default: address)
+# Seconds between reads of each channel group (0 = every sample). Slower groups
+# log their latest value and its age in an Age_<channel>(s) column
+CADENCE = {"temperature": 0, "gas": 0, "light": 0, "battery": 0}  # temperature = T/P/H
+
+# BME680 gas heater config
+BME680_GAS_ENABLED = True  # Set to False to skip gas readings (no heater energy)
+BME680_HEATER_TEMP = 320  # Heater target temperature (C, 200-400)
+BME680_HEATER_DURATION = 150  # Heater hold time per reading (ms, 1-4032)
+BME680_TEMP_OVERSAMPLE = 8  # Oversampling (0, 1, 2, 4, 8, 16); more is less noisy but slower
+BME680_PRESSURE_OVERSAMPLE = 4
+BME680_HUMIDITY_OVERSAMPLE = 2
+BME680_FILTER_SIZE = 3  # IIR filter coefficient (0, 1, 3, 7, 15, 31, 63, 127)
+BME680_CAL_CACHE = "bme680_cal.json"  # Parsed calibration, reused while the chip matches
+BME680_RAW = False  # Log the uncompensated ADC words and a #cal line instead of compensated values (see bme680_raw.py)
+
+# Runtime Configuration
+CONFIG_FILE = "config.json"  # Settings changed through /api/config, loaded at boot
+
+# Boot Configuration
+FAST_BOOT = True  # Skip the sensor test reads; the first sample checks the sensors
+
+# Adaptive sampling config
+ADAPTIVE_ENABLED = False  # Sample faster while readings change, slower while they are stable
+ADAPTIVE_MIN_INTERVAL = 10  # Fastest interval (seconds), used right after an alert
+ADAPTIVE_MAX_INTERVAL = 600  # Slowest interval after a long stable stretch
+ADAPTIVE_STABLE_SAMPLES = 5  # Stable samples before the interval is doubled
+ADAPTIVE_NOISE = {"temperature": 0.1, "pressure": 0.2, "humidity": 0.5, "gas": 0.05,
+                  "light": 5.0, "battery": 0.02}  # Changes inside these bands count as stable
+ADAPTIVE_RELATIVE = ("gas",)  # Channels whose bands and rates are fractions of the reading
+
+# Alert config (thresholds are per channel key, rates apply to tagged sensors too)
+ALERT_THRESHOLDS = {"temperature": (5, 35), "humidity": (None, 70)}  # (low, high), None = no limit
+ALERT_RATES = {"humidity": 2.0, "gas": -0.2}  # Change per minute; > 0 alerts on rising, < 0 on falling
+ALERT_HISTORY = 20  # Recent alert events kept for the web UI
+
+# Dead-band logging config
+DEADBAND_ENABLED = False  # Only write a row when a channel leaves its dead-band
+DEADBAND = {"temperature": 0.05, "pressure": 0.1, "humidity": 0.2, "gas": 0.02,
+            "light": 2.0, "battery": 0.01}  # Per channel, gas as a fraction (see ADAPTIVE_RELATIVE)
+DEADBAND_HEARTBEAT = 900  # Longest time between rows (seconds)
+
+# Burst sampling config
+BURST_ENABLED = False  # Sample T/P/H between log rows and log the interval mean
+BURST_RATE = 1.0  # Burst samples per second (gas heater off)
+
+# Uplink (store-and-forward push) config
+UPLINK_ENABLED = False  # Push new log records to a collector
+UPLINK_URL = "http://192.168.1.10:8080/ingest"  # Collector endpoint for HTTP POST
+UPLINK_MQTT_BROKER = ""  # Broker host; set to publish over MQTT instead of HTTP
+UPLINK_MQTT_TOPIC = "breadboard/readings"
+UPLINK_STATE_FILE = "uplink.json"  # Acknowledged-offset cursor on flash
+UPLINK_INTERVAL = 300  # Seconds between pushes once the backlog is sent
+UPLINK_BATCH_MIN = 10  # Records per batch on a poor link
+UPLINK_BATCH_MAX = 200  # Records per batch on a good link
+UPLINK_TIMEOUT = 5  # Seconds per push request (and MQTT connect)
+UPLINK_MQTT_KEEPALIVE = 900  # Seconds the broker keeps a silent MQTT session; reconnects after that
+
+# History buffer config
+HISTORY_HOURS = 24  # Hours of samples kept in RAM for /api/history
+
+# Air quality (IAQ) config
+IAQ_ENABLED = True  # Set to False to disable the IAQ calculation
+IAQ_STATE_FILE = "iaq_state.json"  # Gas baseline checkpoint on flash
+IAQ_SAVE_INTERVAL = 3600  # Seconds between baseline checkpoints
+IAQ_BURN_IN = 3600  # Seconds of samples before a fresh baseline is trusted
+IAQ_WARM_UP = 300  # Seconds of samples after a restored baseline (heater warm-up)
+IAQ_STATE_MAX_AGE = 7 * 86400  # Ignore checkpoints older than this (seconds)
 
 # Thread safety
 sensor_lock = _thread.allocate_lock()
 
+# In-RAM sample history, created at boot
+history = None
+
+# Runtime counters served by /api/metrics
+metrics = {}
+
+# Runtime settings (ConfigStore), created by the main program
+config = None
+
+# Sensors found at boot (SensorRegistry), created by the main program
+registry = None
+
+# (filename, column headers) of the daily log being appended to
+log_columns = None
+
+# Sample interval and alerts (AdaptiveSampler), created by the main program
+adaptive = None
+
+# Row filter for dead-band logging (DeadbandFilter), created by the main program
+deadband = None
+
+# --- Boot Profile ---
+boot_mark = 0  # ticks_ms() counts from reset, so the first phase includes startup
+
+def boot_phase(name):
+    """Record how long the boot phase that just ended took"""
+    global boot_mark
+    now = time.ticks_ms()
+    ms = time.ticks_diff(now, boot_mark)
+    metrics.setdefault("boot_phases_ms", []).append([name, ms])
+    metrics["boot_ms"] = now
+    boot_mark = now
+    print("Boot phase {}: {} ms".format(name, ms))
+
+# --- Config Store ---
+class ConfigStore:
+    """Validated runtime settings persisted on flash.
+
+    The settings are the module constants named in SCHEMA. Changes from the web
+    server are validated, saved and queued; the sampling loop takes them with
+    take_pending() between samples and applies them to the globals and drivers.
+    """
+
+    # Rules: (min, max) for numbers, a list of allowed values, or None for on/off
+    SCHEMA = {
+        "LOG_INTERVAL": (1, 3600),
+        "MAX_LOG_FILES": (1, 366),
+        "UTC_OFFSET": (-12 * 3600, 14 * 3600),
+        "BATTERY_ENABLED": None,
+        "VEML7700_ENABLED": None,
+        "VEML7700_IT": [25, 50, 100, 200, 400, 800],
+        "VEML7700_GAIN": [1/8, 1/4, 1, 2],
+        "BME680_GAS_ENABLED": None,
+        "BME680_HEATER_TEMP": (200, 400),
+        "BME680_HEATER_DURATION": (1, 4032),
+        "BME680_TEMP_OVERSAMPLE": [0, 1, 2, 4, 8, 16],
+        "BME680_PRESSURE_OVERSAMPLE": [0, 1, 2, 4, 8, 16],
+        "BME680_HUMIDITY_OVERSAMPLE": [0, 1, 2, 4, 8, 16],
+        "BME680_FILTER_SIZE": [0, 1, 3, 7, 15, 31, 63, 127],
+        "ADAPTIVE_ENABLED": None,
+        "ADAPTIVE_MIN_INTERVAL": (1, 3600),
+        "ADAPTIVE_MAX_INTERVAL": (1, 3600),
+        "DEADBAND_ENABLED": None,
+        "DEADBAND_HEARTBEAT": (60, 86400),
+    }
+
+    # Named trade-offs between resolution, conversion time and battery life
+    PROFILES = {
+        "low-power": {
+            "LOG_INTERVAL": 300,
+            "BME680_GAS_ENABLED": False,
+            "BME680_TEMP_OVERSAMPLE": 1,
+            "BME680_PRESSURE_OVERSAMPLE": 1,
+            "BME680_HUMIDITY_OVERSAMPLE": 1,
+            "BME680_FILTER_SIZE": 0,
+            "VEML7700_IT": 25,
+        },
+        "balanced": {
+            "LOG_INTERVAL": 60,
+            "BME680_GAS_ENABLED": True,
+            "BME680_TEMP_OVERSAMPLE": 8,
+            "BME680_PRESSURE_OVERSAMPLE": 4,
+            "BME680_HUMIDITY_OVERSAMPLE": 2,
+            "BME680_FILTER_SIZE": 3,
+            "VEML7700_IT": 100,
+        },
+        "high-resolution": {
+            "LOG_INTERVAL": 10,
+            "BME680_GAS_ENABLED": True,
+            "BME680_TEMP_OVERSAMPLE": 16,
+            "BME680_PRESSURE_OVERSAMPLE": 16,
+            "BME680_HUMIDITY_OVERSAMPLE": 16,
+            "BME680_FILTER_SIZE": 15,
+            "VEML7700_IT": 400,
+        },
+    }
+
+    # Sensors that are only set up at boot
+    RESTART_KEYS = ("BATTERY_ENABLED", "VEML7700_ENABLED")
+
+    # (lower, upper) settings where the lower one must not be above the upper one
+    ORDERED = (("ADAPTIVE_MIN_INTERVAL", "ADAPTIVE_MAX_INTERVAL"),)
+
+    def __init__(self, path):
+        self.path = path
+        self.values = {}
+        for key in self.SCHEMA:
+            self.values[key] = globals()[key]
+        self.boot = dict(self.values)  # Settings the drivers were initialized with
+        for error in self.check_order(self.values):
+            print("Config error in the defaults:", error)
+        self.pending = {}
+        self.lock = _thread.allocate_lock()
+
+    def check(self, key, value):
+        """Return an error message, or None if value is valid for key"""
+        if key not in self.SCHEMA:
+            return "unknown setting {}".format(key)
+        rule = self.SCHEMA[key]
+        if rule is None:
+            if not isinstance(value, bool):
+                return "{} must be true or false".format(key)
+        elif isinstance(rule, list):
+            if isinstance(value, bool) or value not in rule:
+                return "{} must be one of {}".format(key, rule)
+        else:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                return "{} must be a whole number".format(key)
+            if not rule[0] <= value <= rule[1]:
+                return "{} must be {} to {}".format(key, rule[0], rule[1])
+        return None
+
+    def check_order(self, values):
+        """Return error messages for ORDERED pairs that are inverted in values"""
+        errors = []
+        for low, high in self.ORDERED:
+            if values[low] > values[high]:
+                errors.append("{} must not be above {}".format(low, high))
+        return errors
+
+    def profile(self):
+        """Name of the profile the current settings match, or None"""
+        for name, settings in self.PROFILES.items():
+            if all(self.values[k] == v for k, v in settings.items()):
+                return name
+        return None
+
+    def load(self):
+        """Read saved settings into the globals (at boot, before the drivers start)"""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except OSError:
+            return
+        except Exception as e:
+            print("Config unreadable, using defaults:", e)
+            return
+        defaults = dict(self.values)
+        for key, value in saved.items():
+            error = self.check(key, value)
+            if error:
+                print("Config ignored:", error)
+            else:
+                self.values[key] = value
+        for low, high in self.ORDERED:
+            if self.values[low] > self.values[high]:
+                print("Config ignored: {} must not be above {}".format(low, high))
+                self.values[low] = defaults[low]
+                self.values[high] = defaults[high]
+        globals().update(self.values)
+        self.boot = dict(self.values)
+        print("Config loaded, profile:", self.profile() or "custom")
+
+    def save(self):
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.values, f)
+            os.rename(tmp, self.path)
+        except Exception as e:
+            print("Config save error:", e)
+
+    def update(self, changes):
+        """Validate, save and queue changes (a "profile" name and/or settings).
+        Returns a list of errors; nothing is changed if there are any."""
+        settings = {}
+        errors = []
+        profile = changes.get("profile")
+        if profile is not None:
+            if profile in self.PROFILES:
+                settings.update(self.PROFILES[profile])
+            else:
+                errors.append("unknown profile {}".format(profile))
+        for key, value in changes.items():
+            if key == "profile":
+                continue
+            error = self.check(key, value)
+            if error:
+                errors.append(error)
+            else:
+                settings[key] = value
+        if not errors:
+            merged = dict(self.values)
+            merged.update(settings)
+            errors = self.check_order(merged)
+        if errors:
+            return errors
+        with self.lock:
+            self.values.update(settings)
+            self.pending.update(settings)
+        self.save()
+        return []
+
+    def restart_needed(self):
+        """True if a sensor that was disabled at boot has been enabled"""
+        for key in self.RESTART_KEYS:
+            if self.values[key] and not self.boot[key]:
+                return True
+        return False
+
+    def take_pending(self):
+        """Return and clear the changes not yet applied"""
+        with self.lock:
+            changes = self.pending
+            self.pending = {}
+        return changes
+
+    def as_dict(self):
+        return {"profile": self.profile(), "values": self.values, "profiles": self.PROFILES}
+
 # --- Wi-Fi ---
-def connect_wifi(ssid, password, max_retries=5, timeout=15):
-    wlan = network.WLAN(network.STA_IF)
-    
-    # Force cleanup of any existing connection state
-    try:
-        wlan.active(False)
-        time.sleep(1)
-    except:
-        pass
-    
-    wlan.active(True)
-    time.sleep(1)
-    
-    # Disconnect any existing connection
-    try:
-        wlan.disconnect()
-        time.sleep(1)
-    except:
-        pass
-    
-    wlan.config(dhcp_hostname="BreadBoard")
-    
-    for attempt in range(1, max_retries + 1):
-        print("Attempt {} of {}...".format(attempt, max_retries))
+class WifiManager:
+    """Non-blocking Wi-Fi connection state machine.
+
+    poll() is called from the sampling loop and never waits: it starts a
+    connection attempt, checks on it on later polls, and after a failed or
+    lost connection retries with exponential backoff between WIFI_RETRY_MIN
+    and WIFI_RETRY_MAX seconds.
+    """
+
+    FAIL_STATUSES = [getattr(network, name) for name in
+                     ("STAT_WRONG_PASSWORD", "STAT_NO_AP_FOUND", "STAT_CONNECT_FAIL")
+                     if hasattr(network, name)]
+
+    def __init__(self, ssid, password):
+        self.ssid = ssid
+        self.password = password
+        self.wlan = network.WLAN(network.STA_IF)
+        self.wlan.active(True)
         try:
-            wlan.connect(ssid, password)
-            for t in range(timeout):
-                if wlan.isconnected():
-                    print("Connected to WiFi")
-                    print("IP:", wlan.ifconfig()[0])
-                    return wlan
-                time.sleep(1)
-                print("  waiting... ({}/{})".format(t + 1, timeout))
+            self.wlan.config(dhcp_hostname=NODE_NAME)
         except Exception as e:
-            print("  Connection error:", e)
-            
-        print("  Timeout on attempt", attempt)
+            print("Cannot set hostname:", e)
+        self.state = "down"
+        self.retry = WIFI_RETRY_MIN
+        self.next_attempt = time.ticks_ms()
+        self.attempt_start = 0
+        metrics["wifi_state"] = self.state
+        metrics["wifi_connects"] = 0
+        metrics["wifi_failures"] = 0
+
+    @property
+    def connected(self):
+        return self.state == "up"
+
+    def ip(self):
+        return self.wlan.ifconfig()[0] if self.connected else "Disconnected"
+
+    def poll(self):
+        """Advance the connection state machine"""
+        now = time.ticks_ms()
+        if self.state == "up":
+            if not self.wlan.isconnected():
+                print("WiFi connection lost")
+                self.set_state("down")
+                self.next_attempt = now
+        elif self.state == "connecting":
+            if self.wlan.isconnected():
+                print("Connected to WiFi, IP:", self.wlan.ifconfig()[0])
+                self.retry = WIFI_RETRY_MIN
+                metrics["wifi_connects"] += 1
+                self.set_state("up")
+            elif self.wlan.status() in self.FAIL_STATUSES or \
+                    time.ticks_diff(now, self.attempt_start) > WIFI_CONNECT_TIMEOUT * 1000:
+                self.failed()
+        elif time.ticks_diff(now, self.next_attempt) >= 0:
+            try:
+                self.wlan.connect(self.ssid, self.password)
+                self.attempt_start = now
+                self.set_state("connecting")
+            except Exception as e:
+                print("WiFi connect error:", e)
+                self.failed()
+
+    def failed(self):
         try:
-            wlan.disconnect()
+            self.wlan.disconnect()
         except:
             pass
-        time.sleep(2)
-        
-    print("Failed to connect after {} retries.".format(max_retries))
-    return None
-
-def check_wifi_reconnect(wlan, ssid, password):
-    """Check WiFi connection and reconnect if needed"""
-    if not wlan.isconnected():
-        print("WiFi disconnected, attempting reconnection...")
-        wlan.connect(ssid, password)
-        for _ in range(30):  # 30 second timeout
-            if wlan.isconnected():
-                print("Reconnected to WiFi")
-                return True
-            time.sleep(1)
-        print("Reconnection failed")
-        return False
-    return True
+        metrics["wifi_failures"] += 1
+        print("WiFi connection failed, retry in {} s".format(self.retry))
+        self.next_attempt = time.ticks_add(time.ticks_ms(), self.retry * 1000)
+        self.retry = min(self.retry * 2, WIFI_RETRY_MAX)
+        self.set_state("down")
+
+    def set_state(self, state):
+        self.state = state
+        metrics["wifi_state"] = state
 
 # --- Time ---
-def sync_time():
-    try:
-        ntptime.settime()
-        print("Time synchronized via NTP")
-    except Exception as e:
-        print("NTP sync failed:", e)
+class ClockService:
+    """Keeps the RTC disciplined to NTP without blocking sampling.
+
+    poll() runs a small state machine: send a request, pick up the reply on a
+    later poll and schedule the next sync, NTP_SYNC_INTERVAL after a success or
+    with a doubling backoff from NTP_RETRY_MIN after a failure. Offsets above
+    CLOCK_STEP_THRESHOLD are stepped, smaller ones are slewed in gradually. The
+    crystal drift seen between syncs is estimated and corrected continuously.
+    """
+
+    SLEW_MS_PER_S = 5  # Largest slew per second of run time (0.5%)
+    ADJUST_MIN_MS = 10  # Collect corrections until they reach this size
+    DRIFT_GAIN = 0.5  # Share of the measured drift error folded into the estimate
+    DRIFT_MIN_SPAN = 600000  # ms between syncs needed to measure drift
+    MAX_DRIFT_PPM = 500
+
+    def __init__(self, host, port, on_step=None):
+        self.host = host
+        self.port = port
+        self.on_step = on_step  # Called after the clock is stepped
+        self.rtc = machine.RTC()
+        # NTP counts from 1900, MicroPython from 2000 or 1970 depending on port
+        self.ntp_delta = 2208988800 if time.gmtime(0)[0] == 1970 else 3155673600
+        self.addr = None
+        self.sock = None
+        self.request = bytearray(48)
+        self.sent_us = 0
+        self.sent_ticks = 0
+        self.next_sync = time.ticks_ms()
+        self.retry = NTP_RETRY_MIN
+        self.synced = False
+        self.drift_ppm = 0.0
+        self.pending_ms = 0.0  # Offset still to be slewed
+        self.correction_ms = 0.0  # Corrections collected but not yet applied
+        self.last_sync_ticks = None
+        self.last_discipline = time.ticks_ms()
+        metrics["ntp_syncs"] = 0
+        metrics["ntp_failures"] = 0
+        metrics["ntp_steps"] = 0
+
+    def wall_us(self):
+        if hasattr(time, "time_ns"):
+            return time.time_ns() // 1000
+        return time.time() * 1000000
+
+    def adjust(self, delta_us):
+        """Move the RTC by delta_us (an integer, a step can be years)"""
+        us = self.wall_us() + delta_us
+        tm = time.gmtime(us // 1000000)
+        self.rtc.datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], us % 1000000))
+
+    def poll(self, online):
+        """Advance the sync state machine and apply drift/slew corrections"""
+        self.discipline()
+        if self.sock is not None:
+            self.receive()
+        elif online and time.ticks_diff(time.ticks_ms(), self.next_sync) >= 0:
+            self.send()
+
+    def discipline(self):
+        """Correct estimated crystal drift and slew any pending offset"""
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self.last_discipline)
+        if elapsed < 1000:
+            return
+        self.last_discipline = now
+        correction = self.drift_ppm * elapsed / 1000000
+        if self.pending_ms:
+            limit = self.SLEW_MS_PER_S * elapsed / 1000
+            step = max(-limit, min(self.pending_ms, limit))
+            self.pending_ms -= step
+            correction += step
+        self.correction_ms += correction
+        if abs(self.correction_ms) >= self.ADJUST_MIN_MS:
+            self.adjust(int(self.correction_ms * 1000))
+            self.correction_ms = 0.0
+
+    def send(self):
+        try:
+            if self.addr is None:
+                self.addr = socket.getaddrinfo(self.host, self.port)[0][-1]
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setblocking(False)
+            # Version 4 client request; our transmit time comes back as the originate time
+            self.request[0] = 0x23
+            self.sent_us = self.wall_us()
+            secs = self.sent_us // 1000000 + self.ntp_delta
+            frac = ((self.sent_us % 1000000) << 32) // 1000000
+            struct.pack_into("!II", self.request, 40, secs, frac)
+            self.sent_ticks = time.ticks_ms()
+            self.sock.sendto(self.request, self.addr)
+        except Exception as e:
+            self.failed("send error: {}".format(e))
 
-def timestamp():
-    tm = time.localtime(time.time() + UTC_OFFSET)
+    def receive(self):
+        try:
+            data = self.sock.recv(48)
+        except OSError:
+            if time.ticks_diff(time.ticks_ms(), self.sent_ticks) > NTP_TIMEOUT:
+                self.failed("timeout")
+            return
+        received_us = self.wall_us()
+        self.close()
+        if len(data) < 48 or data[0] & 0x07 != 4 or data[1] == 0:
+            self.failed("bad reply")
+            return
+        if data[24:32] != self.request[40:48]:
+            self.failed("reply does not match request")
+            return
+        t2 = self.ntp_us(data, 32)  # Server receive
+        t3 = self.ntp_us(data, 40)  # Server transmit
+        # Integer us: the first offset is decades, beyond what a single-precision float holds
+        offset_us = ((t2 - self.sent_us) + (t3 - received_us)) // 2
+        delay = ((received_us - self.sent_us) - (t3 - t2)) / 1000
+        self.synced_with(offset_us, delay, data[1])
+
+    def ntp_us(self, data, pos):
+        secs, frac = struct.unpack_from("!II", data, pos)
+        return (secs - self.ntp_delta) * 1000000 + ((frac * 1000000) >> 32)
+
+    def synced_with(self, offset_us, delay, stratum):
+        now = time.ticks_ms()
+        offset = offset_us / 1000  # ms as a float, only used once the offset is small
+        if not self.synced or abs(offset_us) > CLOCK_STEP_THRESHOLD * 1000:
+            self.adjust(offset_us)
+            self.pending_ms = 0.0
+            self.correction_ms = 0.0
+            self.last_sync_ticks = None  # Drift can't be measured across a step
+            metrics["ntp_steps"] += 1
+            print("Clock stepped by {} ms (NTP)".format(offset_us // 1000))
+            if self.on_step is not None:
+                self.on_step()
+        else:
+            # Whatever is left after the drift correction is drift estimate error
+            if self.last_sync_ticks is not None:
+                span = time.ticks_diff(now, self.last_sync_ticks)
+                if span >= self.DRIFT_MIN_SPAN:
+                    residual = offset - self.pending_ms
+                    drift = self.drift_ppm + self.DRIFT_GAIN * residual * 1000000 / span
+                    self.drift_ppm = max(-self.MAX_DRIFT_PPM, min(drift, self.MAX_DRIFT_PPM))
+            self.pending_ms = offset
+        if self.last_sync_ticks is None or \
+                time.ticks_diff(now, self.last_sync_ticks) >= self.DRIFT_MIN_SPAN:
+            self.last_sync_ticks = now
+
+        self.synced = True
+        self.retry = NTP_RETRY_MIN
+        self.next_sync = time.ticks_add(now, NTP_SYNC_INTERVAL * 1000)
+        metrics["ntp_syncs"] += 1
+        metrics["ntp_offset_ms"] = offset
+        metrics["ntp_delay_ms"] = delay
+        metrics["ntp_stratum"] = stratum
+        metrics["ntp_drift_ppm"] = self.drift_ppm
+        metrics["ntp_last_sync"] = time.time()
+
+    def failed(self, reason):
+        self.close()
+        self.addr = None  # Resolve again next time
+        metrics["ntp_failures"] += 1
+        print("NTP sync failed ({}), retry in {} s".format(reason, self.retry))
+        self.next_sync = time.ticks_add(time.ticks_ms(), self.retry * 1000)
+        self.retry = min(self.retry * 2, NTP_SYNC_INTERVAL)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except:
+                pass
+            self.sock = None
+
+def timestamp(t=None):
+    tm = time.localtime((time.time() if t is None else t) + UTC_OFFSET)
     return "{:02d}:{:02d}:{:02d}".format(tm[3], tm[4], tm[5])
 
-def date_str():
-    tm = time.localtime(time.time() + UTC_OFFSET)
+def date_str(t=None):
+    tm = time.localtime((time.time() if t is None else t) + UTC_OFFSET)
     return "{:04d}-{:02d}-{:02d}".format(tm[0], tm[1], tm[2])
 
+def wall_ms():
+    """Wall-clock time in milliseconds (sub-second where the port supports time_ns)"""
+    if hasattr(time, "time_ns"):
+        return time.time_ns() // 1000000
+    return time.time() * 1000
+
+def rtc_valid():
+    """True once the RTC holds a real date (NTP has synced at least once)"""
+    return time.localtime()[0] >= 2024
+
+# --- I2C Bus Health ---
+class I2CBus:
+    """machine.I2C wrapper that tracks bus health and recovers a stuck bus.
+
+    Drivers are given this object instead of the I2C peripheral. Every
+    transaction is timed and counted per device address. After a failed
+    transaction, recover() clocks SCL up to 9 times so a device holding SDA
+    low can finish its byte, sends a STOP, re-creates the I2C peripheral and
+    has the failed drivers set up again. A recovery that doesn't help is
+    retried after BUS_RECOVERY_MIN seconds, doubling up to BUS_RECOVERY_MAX.
+    """
+
+    EVENTS = 10  # Recent recoveries kept in metrics
+
+    def __init__(self, bus_id, scl, sda, freq):
+        self.bus_id = bus_id
+        self.scl = scl
+        self.sda = sda
+        self.freq = freq
+        # Address: [transactions, errors, consecutive errors, last us, max us, total us]
+        self.devices = {}
+        self.backoff = BUS_RECOVERY_MIN
+        self.next_recovery = time.ticks_ms()
+        metrics["i2c_recoveries"] = 0
+        metrics["i2c_recovery_failures"] = 0
+        metrics["i2c_events"] = []
+        self.create()
+
+    def create(self):
+        self.i2c = i2c = I2C(self.bus_id, scl=Pin(self.scl), sda=Pin(self.sda), freq=self.freq)
+        # Bound once here, so a transaction doesn't allocate a bound method
+        self._readfrom_mem_into = i2c.readfrom_mem_into
+        self._readfrom_mem = i2c.readfrom_mem
+        self._writeto_mem = i2c.writeto_mem
+        self._readfrom_into = i2c.readfrom_into
+        self._writeto = i2c.writeto
+
+    def scan(self):
+        return self.i2c.scan()
+
+    def _call(self, method, address, arg, buf=None):
+        stats = self.devices.get(address)
+        if stats is None:
+            stats = self.devices[address] = [0, 0, 0, 0, 0, 0]
+        start = time.ticks_us()
+        try:
+            result = method(address, arg) if buf is None else method(address, arg, buf)
+        except OSError:
+            stats[1] += 1
+            stats[2] += 1
+            raise
+        us = time.ticks_diff(time.ticks_us(), start)
+        stats[0] += 1
+        stats[2] = 0
+        stats[3] = us
+        if us > stats[4]:
+            stats[4] = us
+        stats[5] += us
+        return result
+
+    def readfrom_mem_into(self, address, register, buf):
+        return self._call(self._readfrom_mem_into, address, register, buf)
+
+    def readfrom_mem(self, address, register, n):
+        return self._call(self._readfrom_mem, address, register, n)
+
+    def writeto_mem(self, address, register, buf):
+        return self._call(self._writeto_mem, address, register, buf)
+
+    def readfrom_into(self, address, buf):
+        return self._call(self._readfrom_into, address, buf)
+
+    def writeto(self, address, buf):
+        return self._call(self._writeto, address, buf)
+
+    def failing(self):
+        """Addresses whose last transaction failed"""
+        return [address for address, stats in self.devices.items() if stats[2]]
+
+    def release(self):
+        """Free SDA by clocking SCL by hand, then send a STOP.
+        Returns (SDA was stuck low, clock pulses sent)."""
+        scl = Pin(self.scl, Pin.OPEN_DRAIN, Pin.PULL_UP, value=1)
+        sda = Pin(self.sda, Pin.OPEN_DRAIN, Pin.PULL_UP, value=1)
+        time.sleep_us(10)
+        stuck = not sda.value()
+        pulses = 0
+        while not sda.value() and pulses < 9:
+            scl.value(0)
+            time.sleep_us(5)
+            scl.value(1)
+            time.sleep_us(5)
+            pulses += 1
+        # STOP: SDA rises while SCL is high
+        scl.value(0)
+        time.sleep_us(5)
+        sda.value(0)
+        time.sleep_us(5)
+        scl.value(1)
+        time.sleep_us(5)
+        sda.value(1)
+        time.sleep_us(5)
+        return stuck, pulses
+
+    def recover(self, reinit):
+        """Recover the bus after failed transactions. reinit(addresses) sets up
+        the failed drivers again and raises if they still fail. Returns True if
+        the devices work again, False if it failed or the backoff isn't over."""
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self.next_recovery) < 0:
+            return False
+        addresses = self.failing()
+        stuck, pulses = self.release()
+        self.create()
+        try:
+            reinit(addresses)
+            ok = True
+        except Exception as e:
+            print("I2C recovery failed:", e)
+            ok = False
+        ms = time.ticks_diff(time.ticks_ms(), now)
+
+        metrics["i2c_recoveries"] += 1
+        if ok:
+            self.backoff = BUS_RECOVERY_MIN
+            self.next_recovery = time.ticks_ms()
+        else:
+            metrics["i2c_recovery_failures"] += 1
+            self.next_recovery = time.ticks_add(time.ticks_ms(), self.backoff * 1000)
+            self.backoff = min(self.backoff * 2, BUS_RECOVERY_MAX)
+        events = metrics["i2c_events"]
+        events.append({"time": time.time(), "devices": [hex(a) for a in addresses],
+                       "sda_stuck": stuck, "pulses": pulses, "ms": ms, "ok": ok})
+        if len(events) > self.EVENTS:
+            events.pop(0)
+        print("I2C recovery for {}: SDA {}, {} pulses, {} ms, {}".format(
+            [hex(a) for a in addresses], "stuck" if stuck else "free", pulses, ms,
+            "OK" if ok else "still failing"))
+        return ok
+
+    def report(self):
+        """Per-device transaction counts and latency for /api/metrics"""
+        report = {}
+        for address, stats in self.devices.items():
+            report[hex(address)] = {
+                "transactions": stats[0], "errors": stats[1], "failing": stats[2],
+                "latency_us": stats[3], "latency_max_us": stats[4],
+                "latency_mean_us": stats[5] // stats[0] if stats[0] else None}
+        return report
+
 # --- Battery Monitoring ---
 def init_battery_monitor():
     """Initialize ADC for battery voltage monitoring"""
@@ -115,7 +783,7 @@ def init_battery_monitor():
 
 def read_battery_voltage(adc):
     """Read battery voltage with averaging"""
-    if adc is None:
+    if adc is None or not BATTERY_ENABLED:
         return None
     try:
         # Take 10 readings and average to reduce noise
@@ -139,34 +807,38 @@ def read_battery_voltage(adc):
 class VEML7700:
     """VEML7700 light sensor driver - based on working reference implementation"""
     
+    # Configuration values for different integration times and gains
+    # Format: CONF_VALUES[integration_time][gain] = bytearray([low_byte, high_byte])
+    CONF_VALUES = {
+        25:  {1/8: bytearray([0x00, 0x13]), 1/4: bytearray([0x00, 0x1B]), 1: bytearray([0x00, 0x01]), 2: bytearray([0x00, 0x0B])},
+        50:  {1/8: bytearray([0x00, 0x12]), 1/4: bytearray([0x00, 0x1A]), 1: bytearray([0x00, 0x02]), 2: bytearray([0x00, 0x0A])},
+        100: {1/8: bytearray([0x00, 0x10]), 1/4: bytearray([0x00, 0x18]), 1: bytearray([0x00, 0x00]), 2: bytearray([0x00, 0x08])},
+        200: {1/8: bytearray([0x40, 0x10]), 1/4: bytearray([0x40, 0x18]), 1: bytearray([0x40, 0x00]), 2: bytearray([0x40, 0x08])},
+        400: {1/8: bytearray([0x80, 0x10]), 1/4: bytearray([0x80, 0x18]), 1: bytearray([0x80, 0x00]), 2: bytearray([0x80, 0x08])},
+        800: {1/8: bytearray([0xC0, 0x10]), 1/4: bytearray([0xC0, 0x18]), 1: bytearray([0xC0, 0x00]), 2: bytearray([0xC0, 0x08])}
+    }
+    
+    # Gain values (lux per count) for different integration times and gains
+    GAIN_VALUES = {
+        25:  {1/8: 1.8432, 1/4: 0.9216, 1: 0.2304, 2: 0.1152},
+        50:  {1/8: 0.9216, 1/4: 0.4608, 1: 0.1152, 2: 0.0576},
+        100: {1/8: 0.4608, 1/4: 0.2304, 1: 0.0288, 2: 0.0144},
+        200: {1/8: 0.2304, 1/4: 0.1152, 1: 0.0288, 2: 0.0144},
+        400: {1/8: 0.1152, 1/4: 0.0576, 1: 0.0144, 2: 0.0072},
+        800: {1/8: 0.0876, 1/4: 0.0288, 1: 0.0072, 2: 0.0036}
+    }
+    
     def __init__(self, i2c, address=0x10, it=100, gain=1/8):
         self.address = address
         self.i2c = i2c
-        
-        # Configuration values for different integration times and gains
-        # Format: confValues[integration_time][gain] = bytearray([low_byte, high_byte])
-        confValues = {
-            25:  {1/8: bytearray([0x00, 0x13]), 1/4: bytearray([0x00, 0x1B]), 1: bytearray([0x00, 0x01]), 2: bytearray([0x00, 0x0B])},
-            50:  {1/8: bytearray([0x00, 0x12]), 1/4: bytearray([0x00, 0x1A]), 1: bytearray([0x00, 0x02]), 2: bytearray([0x00, 0x0A])},
-            100: {1/8: bytearray([0x00, 0x10]), 1/4: bytearray([0x00, 0x18]), 1: bytearray([0x00, 0x00]), 2: bytearray([0x00, 0x08])},
-            200: {1/8: bytearray([0x40, 0x10]), 1/4: bytearray([0x40, 0x18]), 1: bytearray([0x40, 0x00]), 2: bytearray([0x40, 0x08])},
-            400: {1/8: bytearray([0x80, 0x10]), 1/4: bytearray([0x80, 0x18]), 1: bytearray([0x80, 0x00]), 2: bytearray([0x80, 0x08])},
-            800: {1/8: bytearray([0xC0, 0x10]), 1/4: bytearray([0xC0, 0x18]), 1: bytearray([0xC0, 0x00]), 2: bytearray([0xC0, 0x08])}
-        }
-        
-        # Gain values (lux per count) for different integration times and gains
-        gainValues = {
-            25:  {1/8: 1.8432, 1/4: 0.9216, 1: 0.2304, 2: 0.1152},
-            50:  {1/8: 0.9216, 1/4: 0.4608, 1: 0.1152, 2: 0.0576},
-            100: {1/8: 0.4608, 1/4: 0.2304, 1: 0.0288, 2: 0.0144},
-            200: {1/8: 0.2304, 1/4: 0.1152, 1: 0.0288, 2: 0.0144},
-            400: {1/8: 0.1152, 1/4: 0.0576, 1: 0.0144, 2: 0.0072},
-            800: {1/8: 0.0876, 1/4: 0.0288, 1: 0.0072, 2: 0.0036}
-        }
-        
+        self.lux_data = bytearray(2)  # Reused by every read
+        self.configure(it, gain)
+    
+    def configure(self, it, gain):
+        """Set integration time (ms) and gain, and (re)initialize the sensor"""
         # Get configuration for selected integration time and gain
-        confValuesForIt = confValues.get(it)
-        gainValuesForIt = gainValues.get(it)
+        confValuesForIt = self.CONF_VALUES.get(it)
+        gainValuesForIt = self.GAIN_VALUES.get(it)
         
         if confValuesForIt is not None and gainValuesForIt is not None:
             confValueForGain = confValuesForIt.get(gain)
@@ -179,6 +851,7 @@ class VEML7700:
         else:
             raise ValueError('Wrong integration time value. Use 25, 50, 100, 200, 400, 800')
         
+        self.it = it
         self.init()
     
     def init(self):
@@ -194,110 +867,1377 @@ class VEML7700:
         self.i2c.writeto_mem(self.address, ALS_WH, bytearray([0x00, 0x00]))  # interrupt high
         self.i2c.writeto_mem(self.address, ALS_WL, bytearray([0x00, 0x00]))  # interrupt low
         self.i2c.writeto_mem(self.address, POW_SAV, bytearray([0x00, 0x00])) # power save mode
-        print("VEML7700 initialized: IT={}ms, Gain={}".format(
-            100 if self.confValues == bytearray([0x00, 0x10]) else "custom",
-            "1/8" if self.gain == 0.4608 else str(self.gain)))
+        # The sensor integrates continuously; the first result is ready after one
+        # integration time (plus a margin for the internal oscillator tolerance)
+        self.ready_at = time.ticks_add(time.ticks_ms(), self.it + self.it // 10)
+        print("VEML7700 initialized: IT={}ms, Gain={:.4f} lux/count".format(self.it, self.gain))
     
     def read_lux(self):
-        """Read ambient light in lux"""
+        """Read ambient light in lux (raises OSError on a bus error)"""
+        ALS = 0x04
+        lux_data = self.lux_data
+        
+        # Only the first read after init has to wait for an integration
+        wait = time.ticks_diff(self.ready_at, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(wait)
+        
+        # Read ALS register
+        self.i2c.readfrom_mem_into(self.address, ALS, lux_data)
+        
+        # Convert to lux value
+        lux_raw = lux_data[0] + lux_data[1] * 256
+        return lux_raw * self.gain
+
+# --- BME680 Sensor ---
+def load_bme680_calibration(address):
+    """Cached BME680 calibration for the sensor at address, or None"""
+    try:
+        with open(BME680_CAL_CACHE) as f:
+            return json.load(f).get(hex(address))
+    except OSError:
+        return None
+    except Exception as e:
+        print("BME680 calibration cache unreadable:", e)
+        return None
+
+def save_bme680_calibration(address, calibration):
+    """Store the BME680 calibration in the cache (write-then-rename)"""
+    try:
         try:
-            ALS = 0x04
-            lux_data = bytearray(2)
-            
-            # Wait for measurement (40ms should be enough for IT=100ms)
-            time.sleep_ms(40)
-            
-            # Read ALS register
-            self.i2c.readfrom_mem_into(self.address, ALS, lux_data)
-            
-            # Convert to lux value
-            lux_raw = lux_data[0] + lux_data[1] * 256
-            lux = lux_raw * self.gain
-            
-            return lux
+            with open(BME680_CAL_CACHE) as f:
+                cache = json.load(f)
+        except Exception:
+            cache = {}
+        cache[hex(address)] = calibration
+        tmp = BME680_CAL_CACHE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f)
+        os.rename(tmp, BME680_CAL_CACHE)
+    except Exception as e:
+        print("BME680 calibration cache save error:", e)
+
+def configure_sensor(sensor):
+    """Apply the BME680 settings (oversampling, filter, heater) to the driver"""
+    sensor.temperature_oversample = BME680_TEMP_OVERSAMPLE
+    sensor.pressure_oversample = BME680_PRESSURE_OVERSAMPLE
+    sensor.humidity_oversample = BME680_HUMIDITY_OVERSAMPLE
+    sensor.filter_size = BME680_FILTER_SIZE
+    sensor.set_heater(BME680_HEATER_TEMP, BME680_HEATER_DURATION)
+    sensor.gas_enabled = BME680_GAS_ENABLED
+    for cost in sensor.profile_costs():
+        if cost["step"] is None:
+            label = "gas off"
+        else:
+            label = "{}C/{}ms".format(cost["temperature"], cost["duration"])
+        print("BME680 profile {}: {} ms, {:.2f} mJ per reading".format(
+            label, cost["time_ms"], cost["energy_mj"]))
+
+def init_sensor(i2c, address=0x76):
+    sensor = bme680.BME680_I2C(i2c=i2c, address=address,
+                               calibration=load_bme680_calibration(address))
+    if sensor.calibration_cached:
+        print("BME680 calibration loaded from cache")
+    else:
+        save_bme680_calibration(address, sensor.calibration)
+    configure_sensor(sensor)
+    return sensor
+
+def read_sensor(sensor):
+    """Thread-safe sensor reading"""
+    with sensor_lock:
+        try:
+            return {
+                "temperature": sensor.temperature,
+                "pressure": sensor.pressure,
+                "humidity": sensor.humidity,
+                "gas": sensor.gas
+            }
+        except Exception as e:
+            print("Sensor read error:", e)
+            return None
+
+# --- Sensor Registry ---
+class Probe:
+    """A device in the sensor registry.
+
+    Subclasses declare the I2C ADDRESSES they can be found at and their
+    CHANNELS as (key, column, label, unit, format). start() begins a conversion
+    and returns the ms it takes (0 when collect() reads at once); collect()
+    returns {key: value} for the keys it read (by default none, for a probe
+    that only has a start() or no reading yet). The first device of a kind uses the plain channel
+    keys; others get their tag appended, e.g. "temperature_duct" logged in a
+    "Temp_duct(C)" column.
+
+    Channels are read in GROUPS that share a conversion, each with its own
+    CADENCE; start() and collect() get the names of the groups that are due.
+    A group read less often than every sample also has an age channel per
+    channel, e.g. "age_gas" logged as "Age_gas(s)".
+
+    RAW_CHANNELS are uncompensated readings that logged() can put in the log
+    in place of CHANNELS; cal_marker() then gives the "#cal" line the host
+    needs to compensate them.
+    """
+
+    KIND = ""
+    ADDRESSES = ()
+    CHANNELS = ()
+    RAW_CHANNELS = ()
+    GROUPS = ()  # (cadence name, channel keys); default: all channels in one group
+
+    def __init__(self, device, address=None, tag=""):
+        self.device = device
+        self.address = address
+        self.tag = tag
+        # Expanded channels: (key, log header, label, unit, format)
+        self.channels = self._expand(self.CHANNELS, tag)
+        self.raw_channels = self._expand(self.RAW_CHANNELS, tag)
+        # Groups with expanded keys: (cadence name, [key])
+        self.groups = []
+        for group, keys in self.GROUPS or ((self.CHANNELS[0][0], [c[0] for c in self.CHANNELS]),):
+            keys = ["{}_{}".format(key, tag) if tag else key for key in keys]
+            self.groups.append((group, keys))
+            if CADENCE.get(group, 0):
+                for key, header, label, unit, fmt in list(self.channels):
+                    if key in keys:
+                        self.channels.append(("age_" + key, "Age_{}(s)".format(key),
+                                              label + " age", "s", "{:.0f}"))
+        self.last_read = {}  # Group: time of its last read
+
+    @staticmethod
+    def _expand(channels, tag):
+        expanded = []
+        for key, column, label, unit, fmt in channels:
+            if tag:
+                key = "{}_{}".format(key, tag)
+                column = "{}_{}".format(column, tag)
+                label = "{} ({})".format(label, tag)
+            expanded.append((key, "{}({})".format(column, unit), label, unit, fmt))
+        return expanded
+
+    @classmethod
+    def enabled(cls):
+        return True
+
+    def due(self, group, t):
+        """True if group's CADENCE has passed since its last read"""
+        cadence = CADENCE.get(group, 0)
+        last = self.last_read.get(group)
+        return not cadence or last is None or t - last >= cadence
+
+    def name(self):
+        if self.address is None:
+            return self.KIND
+        return "{} at 0x{:02X}".format(self.KIND, self.address)
+
+    def start(self, groups):
+        return 0
+
+    def collect(self, groups):
+        return {}
+
+    def logged(self):
+        """Channels written to the log"""
+        return self.channels
+
+    def cal_marker(self):
+        """Calibration line written at the top of a new log, or None"""
+        return None
+
+    def reinit(self):
+        """Set the device up again after an I2C bus recovery"""
+        pass
+
+class BME680Probe(Probe):
+    KIND = "BME680"
+    ADDRESSES = (0x76, 0x77)
+    CHANNELS = (
+        ("temperature", "Temp", "Temperature", "C", "{:.2f}"),
+        ("pressure", "Pressure", "Pressure", "hPa", "{:.2f}"),
+        ("humidity", "Humidity", "Humidity", "%", "{:.2f}"),
+        ("gas", "Gas", "Gas Resistance", "Ohm", "{}"),
+    )
+    RAW_CHANNELS = (
+        ("adc_temperature", "Temp", "Temperature ADC", "adc", "{}"),
+        ("adc_pressure", "Pressure", "Pressure ADC", "adc", "{}"),
+        ("adc_humidity", "Humidity", "Humidity ADC", "adc", "{}"),
+        ("adc_gas", "Gas", "Gas ADC", "adc", "{}"),
+        ("gas_range", "GasRange", "Gas Range", "adc", "{}"),
+    )
+    GROUPS = (("temperature", ("temperature", "pressure", "humidity",
+                               "adc_temperature", "adc_pressure", "adc_humidity")),
+              ("gas", ("gas", "adc_gas", "gas_range")))
+
+    @classmethod
+    def create(cls, i2c, address, tag):
+        return cls(init_sensor(i2c, address), address, tag)
+
+    def start(self, groups):
+        # The heater only runs when gas is due; T/P/H come with every conversion
+        sensor = self.device
+        gas = BME680_GAS_ENABLED and "gas" in groups
+        if sensor.gas_enabled != gas:
+            sensor.gas_enabled = gas
+        return sensor.start_measurement()
+
+    def collect(self, groups):
+        sensor = self.device
+        sensor.finish_measurement()
+        keys = [channel[0] for channel in self.channels]
+        values = {keys[0]: sensor.temperature, keys[1]: sensor.pressure, keys[2]: sensor.humidity}
+        if "gas" in groups:
+            values[keys[3]] = sensor.gas
+        # The ADC words also keep a raw log started before a restart going
+        count = 5 if "gas" in groups else 3
+        for channel, value in zip(self.raw_channels[:count], sensor.raw):
+            values[channel[0]] = value
+        return values
+
+    def logged(self):
+        # Raw mode logs the ADC words in place of the compensated values
+        if not BME680_RAW:
+            return self.channels
+        return self.raw_channels + [c for c in self.channels if c[0].startswith("age_")]
+
+    def cal_marker(self):
+        if not BME680_RAW:
+            return None
+        cal = self.device.calibration
+        parts = ["#cal", "tag=" + self.tag]
+        for name, key in (("T", "temperature"), ("P", "pressure"), ("H", "humidity")):
+            parts.append("{}={}".format(name, "|".join("{}".format(v) for v in cal[key])))
+        parts.append("sw_err={}".format(cal["sw_err"]))
+        return ", ".join(parts) + "\n"
+
+    def reinit(self):
+        configure_sensor(self.device)
+
+class VEML7700Probe(Probe):
+    KIND = "VEML7700"
+    ADDRESSES = (VEML7700_ADDRESS,)
+    CHANNELS = (("light", "Light", "Light Level", "lux", "{:.2f}"),)
+
+    @classmethod
+    def enabled(cls):
+        return VEML7700_ENABLED
+
+    @classmethod
+    def create(cls, i2c, address, tag):
+        sensor = VEML7700(i2c, address, VEML7700_IT, VEML7700_GAIN)
+        return cls(sensor, address, tag)
+
+    def collect(self, groups):
+        lux = self.device.read_lux() if VEML7700_ENABLED else None
+        return {self.channels[0][0]: lux}
+
+    def reinit(self):
+        self.device.init()
+
+class BatteryProbe(Probe):
+    """Battery voltage on the ADC pin (not an I2C device)"""
+    KIND = "Battery"
+    CHANNELS = (("battery", "Battery", "Battery", "V", "{:.2f}"),)
+
+    def collect(self, groups):
+        return {self.channels[0][0]: read_battery_voltage(self.device)}
+
+class SensorRegistry:
+    """The sensors found at boot.
+
+    I2C devices are matched against i2c.scan() by the addresses each driver
+    declares. The registry's channels define the log columns and the live
+    page, and read() samples the channel groups that are due with their
+    conversions overlapping. Groups that are not due keep their latest value.
+    """
+
+    DRIVERS = (BME680Probe, VEML7700Probe)
+
+    def __init__(self):
+        self.probes = []
+        self.bus = None  # I2CBus the devices were found on
+        self.failed = []  # (probe, groups) that failed in the current read
+        self.latest = {}  # Key: (value, time read)
+        self.sampled = None  # Time of the last sample
+        self.raw_keys = set()  # Keys of the raw channels, which have no bands or alerts
+        metrics["channel_reads"] = {}
+
+    def add(self, probe):
+        self.probes.append(probe)
+        for channel in probe.raw_channels:
+            self.raw_keys.add(channel[0])
+        print("Sensor {}: {}".format(probe.name(), ", ".join(c[1] for c in probe.channels)))
+
+    def discover(self, i2c, devices):
+        """Create a probe for each known device among the scanned addresses"""
+        self.bus = i2c
+        for driver in self.DRIVERS:
+            if not driver.enabled():
+                continue
+            for address in driver.ADDRESSES:
+                if address not in devices:
+                    continue
+                tag = ""
+                if self.device(driver.KIND) is not None:
+                    tag = SENSOR_TAGS.get(address, "{:02x}".format(address))
+                try:
+                    self.add(driver.create(i2c, address, tag))
+                except Exception as e:
+                    print("{} init failed at 0x{:02X}: {}".format(driver.KIND, address, e))
+
+    def device(self, kind):
+        """Driver of the first device of a kind (the untagged one), or None"""
+        for probe in self.probes:
+            if probe.KIND == kind:
+                return probe.device
+        return None
+
+    def devices(self, kind):
+        return [probe.device for probe in self.probes if probe.KIND == kind]
+
+    def channels(self):
+        """All channels as (key, log header, label, unit, format), in column order"""
+        channels = []
+        for probe in self.probes:
+            channels.extend(probe.channels)
+        return channels
+
+    def log_channels(self):
+        """The channels written to the log, in column order"""
+        channels = []
+        for probe in self.probes:
+            channels.extend(probe.logged())
+        return channels
+
+    def cal_markers(self):
+        """Calibration lines for the top of a new log"""
+        return "".join(probe.cal_marker() or "" for probe in self.probes)
+
+    def read(self, t=None):
+        """Sample the channel groups due at t (seconds), or all of them when t is
+        None. Returns the latest value of every channel (None for failed reads)
+        and the age channels. All conversions are started together and instant
+        reads are done while they run, so a sample takes as long as the slowest
+        sensor rather than the sum of them."""
+        everything = t is None
+        if everything:
+            t = time.time()
+        with sensor_lock:
+            start = time.ticks_ms()
+            heap = gc.mem_alloc()
+            longest = 0
+            converting = []
+            self.failed = []
+            for probe in self.probes:
+                groups = [g for g, keys in probe.groups if everything or probe.due(g, t)]
+                if not groups:
+                    continue
+                try:
+                    wait = probe.start(groups)
+                except Exception as e:
+                    print("Sensor start error ({}):".format(probe.name()), e)
+                    self._failed(probe, groups, t)
+                    continue
+                if wait:
+                    converting.append((probe, groups))
+                    longest = max(longest, wait)
+                else:
+                    self._collect(probe, groups, t)
+            remaining = time.ticks_diff(time.ticks_add(start, longest), time.ticks_ms())
+            if remaining > 0:
+                time.sleep_ms(remaining)
+            for probe, groups in converting:
+                self._collect(probe, groups, t)
+            self._recover(t)
+            metrics["sample_ms"] = time.ticks_diff(time.ticks_ms(), start)
+            # Heap bytes the sample allocated (unknown when a collection ran meanwhile)
+            heap = gc.mem_alloc() - heap
+            if heap >= 0:
+                metrics["sample_alloc_bytes"] = heap
+            metrics["conversions"] = metrics.get("conversions", 0) + 1
+            self.sampled = t
+        return self.snapshot(t)
+
+    def snapshot(self, t):
+        """The latest value of every channel, with ages relative to t, without
+        reading the sensors"""
+        readings = {}
+        for channel in self.channels():
+            key = channel[0]
+            if key.startswith("age_"):
+                latest = self.latest.get(key[4:])
+                readings[key] = None if latest is None or latest[0] is None else t - latest[1]
+            else:
+                readings[key] = self.latest.get(key, (None, 0))[0]
+        for probe in self.probes:
+            for channel in probe.raw_channels:
+                readings[channel[0]] = self.latest.get(channel[0], (None, 0))[0]
+        return readings
+
+    def _collect(self, probe, groups, t):
+        try:
+            values = probe.collect(groups)
         except Exception as e:
-            print("VEML7700 read error:", e)
+            print("Sensor read error ({}):".format(probe.name()), e)
+            self._failed(probe, groups, t)
+            return
+        for key, value in values.items():
+            self.latest[key] = (value, t)
+        counts = metrics["channel_reads"]
+        for group in groups:
+            probe.last_read[group] = t
+            counts[group] = counts.get(group, 0) + 1
+
+    def _failed(self, probe, groups, t):
+        """Failed reads are logged empty and retried at the next sample"""
+        self.failed.append((probe, groups))
+        for group, keys in probe.groups:
+            if group in groups:
+                for key in keys:
+                    self.latest[key] = (None, t)
+
+    def _recover(self, t):
+        """Recover the I2C bus after failed transactions and read the failed
+        devices again, so a transient fault doesn't cost the sample"""
+        bus = self.bus
+        if bus is None:
+            return
+        if bus.failing() and bus.recover(self.reinit):
+            failed = self.failed
+            self.failed = []
+            for probe, groups in failed:
+                try:
+                    time.sleep_ms(probe.start(groups))
+                except Exception as e:
+                    print("Sensor start error ({}):".format(probe.name()), e)
+                    self._failed(probe, groups, t)
+                    continue
+                self._collect(probe, groups, t)
+        metrics["i2c"] = bus.report()
+
+    def reinit(self, addresses):
+        """Set up the devices at addresses again; raises if one still fails"""
+        for probe in self.probes:
+            if probe.address in addresses:
+                probe.reinit()
+
+# --- Scheduling ---
+class Scheduler:
+    """Drift-free sample deadlines aligned to wall-clock multiples of the interval.
+
+    Deadlines advance by whole intervals on the ticks_ms clock, so time spent
+    reading, logging or reconnecting never accumulates, and nodes sharing an
+    interval sample on the same timestamps. Slots missed during a long stall
+    are skipped and counted instead of being sampled late in a rush.
+    """
+
+    IDLE_MS = 100  # Longest sleep between idle callbacks
+
+    def __init__(self, interval, immediate=True):
+        self.interval = interval
+        self.immediate = immediate  # First wait() returns at once
+        self.ticks = 0
+        self.skipped = 0
+        self.jitter_total = 0
+        self.max_jitter = 0
+        self.align()
+
+    def align(self):
+        """Re-align the next deadline to the wall clock, e.g. after the clock is set"""
+        interval_ms = self.interval * 1000
+        now = wall_ms()
+        ticks = time.ticks_ms()
+        next_slot = (now // interval_ms + 1) * interval_ms
+        self.slot = next_slot // 1000
+        self.deadline = time.ticks_add(ticks, int(next_slot - now))
+
+    def set_interval(self, interval):
+        """Change the interval; the next deadline is the next multiple of it"""
+        self.interval = interval
+        self.align()
+
+    def remaining_ms(self):
+        """Milliseconds until the next deadline"""
+        return time.ticks_diff(self.deadline, time.ticks_ms())
+
+    def wait(self, idle=None):
+        """Block until the next deadline and return its wall-clock time (seconds).
+        idle() is called repeatedly while waiting."""
+        if self.immediate:
+            self.immediate = False
+            return time.time()
+
+        while True:
+            remaining = time.ticks_diff(self.deadline, time.ticks_ms())
+            if remaining <= 0:
+                break
+            if idle is not None:
+                idle()
+                remaining = time.ticks_diff(self.deadline, time.ticks_ms())
+                if remaining <= 0:
+                    break
+            time.sleep_ms(min(remaining, self.IDLE_MS))
+
+        interval_ms = self.interval * 1000
+        late = -remaining
+        slot = self.slot
+        if late >= interval_ms:
+            missed = late // interval_ms
+            self.skipped += missed
+            slot += missed * self.interval
+            late -= missed * interval_ms
+            print("Scheduler: skipped {} slot(s) after a stall".format(missed))
+
+        self.ticks += 1
+        self.jitter_total += late
+        if late > self.max_jitter:
+            self.max_jitter = late
+        metrics["sched_ticks"] = self.ticks
+        metrics["sched_skipped_slots"] = self.skipped
+        metrics["sched_jitter_ms"] = late
+        metrics["sched_jitter_max_ms"] = self.max_jitter
+        metrics["sched_jitter_mean_ms"] = self.jitter_total / self.ticks
+
+        # Aim the next deadline at the (NTP disciplined) wall clock rather than
+        # adding an interval of ticks, so crystal drift doesn't accumulate
+        self.slot = slot + self.interval
+        self.deadline = time.ticks_add(time.ticks_ms(), int(self.slot * 1000 - wall_ms()))
+        return slot
+
+# --- Adaptive Sampling & Alerts ---
+class AdaptiveSampler:
+    """Sample interval that follows how fast the readings change, plus alerts.
+
+    While every channel stays within its ADAPTIVE_NOISE band of the reading
+    at the last change, the interval doubles every ADAPTIVE_STABLE_SAMPLES
+    samples up to ADAPTIVE_MAX_INTERVAL. A change beyond a band halves it, and
+    a new alert drops it straight to ADAPTIVE_MIN_INTERVAL. Alerts are raised
+    when a reading crosses an ALERT_THRESHOLDS limit or changes faster than
+    its ALERT_RATES rate, and are cleared once the reading is back inside the
+    limit by a noise band, or the rate has dropped.
+    """
+
+    def __init__(self, interval):
+        self.reference = {}  # Readings at the last change beyond the noise bands
+        self.last = {}
+        self.times = {}  # Key: time of the value in last
+        self.first_t = None
+        self.stable = 0
+        self.samples = 0
+        self.active = {}  # Alert id: raise event
+        self.events = []  # Recent raise and clear events, oldest first
+        self.lock = _thread.allocate_lock()
+        metrics["alerts_raised"] = 0
+        metrics["alerts_active"] = 0
+        self.reset(interval)
+
+    def reset(self, interval):
+        """Start again from interval, e.g. after the settings changed"""
+        if ADAPTIVE_ENABLED:
+            interval = min(max(interval, ADAPTIVE_MIN_INTERVAL), ADAPTIVE_MAX_INTERVAL)
+        self.interval = interval
+        self.stable = 0
+        metrics["adaptive_interval"] = interval
+
+    @staticmethod
+    def scale(key, value):
+        """Bands and rates of relative channels are fractions of the reading"""
+        if key.split("_", 1)[0] in ADAPTIVE_RELATIVE:
+            return abs(value)
+        return 1
+
+    def update(self, readings, t):
+        """Check one logged sample taken at t (seconds), returns the interval
+        to the next one"""
+        changed = alert = False
+        for key, value in readings.items():
+            if value is None or key.startswith("age_") or readings.get("age_" + key):
+                continue  # Missing, or a slower channel that was not read this time
+            if key in registry.raw_keys:
+                continue  # ADC words, the compensated channel stands for them
+            base = key.split("_", 1)[0]
+            band = 0
+            if base in ADAPTIVE_NOISE:
+                band = ADAPTIVE_NOISE[base] * self.scale(key, value)
+                reference = self.reference.setdefault(key, value)
+                if abs(value - reference) > band:
+                    changed = True
+
+            limits = ALERT_THRESHOLDS.get(key)
+            if limits is not None:
+                low, high = limits
+                if low is not None:
+                    alert |= self.check(key + "_low", value < low, value > low + band,
+                                        "{} below {}".format(key, low), value, t)
+                if high is not None:
+                    alert |= self.check(key + "_high", value > high, value < high - band,
+                                        "{} above {}".format(key, high), value, t)
+
+            rate = ALERT_RATES.get(base)
+            last = self.last.get(key)
+            dt = t - self.times.get(key, t)
+            if rate is not None and last is not None and dt:
+                scale = self.scale(key, last)
+                if scale:
+                    per_minute = (value - last) * 60 / dt / scale
+                    fast = per_minute > rate if rate > 0 else per_minute < rate
+                    alert |= self.check(key + "_rate", fast, not fast,
+                                        "{} changing {:+.2f}/min".format(key, per_minute), value, t)
+            self.last[key] = value
+            self.times[key] = t
+
+        if changed:
+            self.reference = dict(self.last)
+        if not ADAPTIVE_ENABLED:
+            self.interval = LOG_INTERVAL
+        elif alert:
+            self.interval = ADAPTIVE_MIN_INTERVAL
+            self.stable = 0
+        elif changed:
+            self.interval = max(self.interval // 2, ADAPTIVE_MIN_INTERVAL)
+            self.stable = 0
+        else:
+            self.stable += 1
+            if self.stable >= ADAPTIVE_STABLE_SAMPLES:
+                self.interval = min(self.interval * 2, ADAPTIVE_MAX_INTERVAL)
+                self.stable = 0
+
+        self.samples += 1
+        if self.first_t is None:
+            self.first_t = t
+        elapsed = t - self.first_t
+        metrics["adaptive_interval"] = self.interval
+        metrics["alerts_active"] = len(self.active)
+        if elapsed > 0:
+            # Averages since boot
+            metrics["samples_per_day"] = round((self.samples - 1) * 86400 / elapsed)
+            metrics["conversions_per_day"] = round(metrics.get("conversions", 0) * 86400 / elapsed)
+        return self.interval
+
+    def check(self, alert_id, raised, cleared, message, value, t):
+        """Raise or clear one alert, returns True when it is newly raised"""
+        with self.lock:
+            if alert_id in self.active:
+                if cleared:
+                    del self.active[alert_id]
+                    self.record({"id": alert_id, "state": "cleared", "value": value, "time": t})
+                    print("Alert cleared:", alert_id)
+                return False
+            if not raised:
+                return False
+            event = {"id": alert_id, "state": "raised", "message": message,
+                     "value": value, "time": t}
+            self.active[alert_id] = event
+            self.record(event)
+        metrics["alerts_raised"] += 1
+        print("ALERT:", message)
+        return True
+
+    def record(self, event):
+        self.events.append(event)
+        if len(self.events) > ALERT_HISTORY:
+            self.events.pop(0)
+
+    def as_dict(self):
+        with self.lock:
+            return {"adaptive": ADAPTIVE_ENABLED, "interval": self.interval,
+                    "active": list(self.active.values()), "recent": list(self.events)}
+
+# --- Burst Sampling ---
+class RunningStats:
+    """Streaming min/max/mean/standard deviation (Welford) in constant memory"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def summary(self):
+        return {"count": self.count, "min": self.min, "max": self.max,
+                "mean": self.mean, "std": self.std}
+
+class BurstSampler:
+    """Samples temperature, pressure and humidity at BURST_RATE with the gas heater
+    off, keeping per-interval statistics for each channel"""
+
+    CHANNELS = ("temperature", "pressure", "humidity")
+
+    def __init__(self, sensor, rate):
+        self.sensor = sensor
+        self.period_ms = int(1000 / rate)
+        self.stats = {}
+        for channel in self.CHANNELS:
+            self.stats[channel] = RunningStats()
+        self.last = None  # Summary of the last completed interval
+
+    def add(self, readings):
+        for channel in self.CHANNELS:
+            self.stats[channel].add(readings[channel])
+
+    def start(self):
+        """Start a burst interval: heater off, first sample straight away"""
+        with sensor_lock:
+            self.sensor.gas_enabled = False
+        self.next_sample = time.ticks_ms()
+
+    def poll(self):
+        """Take a burst sample if one is due, called while the scheduler waits"""
+        if time.ticks_diff(time.ticks_ms(), self.next_sample) < 0:
+            return
+        readings = read_sensor(self.sensor)
+        if readings:
+            self.add(readings)
+        self.next_sample = time.ticks_add(self.next_sample, self.period_ms)
+        if time.ticks_diff(time.ticks_ms(), self.next_sample) > 0:
+            self.next_sample = time.ticks_ms()  # Fell behind, don't bunch up samples
+
+    def stop(self):
+        """End the burst interval: heater back on for the logged reading"""
+        with sensor_lock:
+            self.sensor.gas_enabled = BME680_GAS_ENABLED
+
+    def finish(self, readings):
+        """Replace T/P/H in readings with the interval means and start a new interval"""
+        summary = {}
+        for channel in self.CHANNELS:
+            stats = self.stats[channel]
+            if stats.count:
+                summary[channel] = stats.summary()
+                readings[channel] = stats.mean
+            stats.reset()
+        self.last = summary
+        return readings
+
+def init_burst_sampler(sensor):
+    """Create the burst sampler when burst mode is enabled"""
+    if not BURST_ENABLED:
+        return None
+    sampler = BurstSampler(sensor, BURST_RATE)
+    print("Burst sampling at {} Hz (gas off between log rows)".format(BURST_RATE))
+    return sampler
+
+# --- Air Quality (IAQ) ---
+class IAQCalculator:
+    """Incremental IAQ index from humidity-compensated gas resistance.
+
+    The baseline follows the clean-air ceiling of the compensated gas
+    resistance: it rises quickly towards cleaner readings and only decays
+    slowly otherwise, so the state is a few numbers regardless of run time.
+    IAQ runs from 0 (clean) to 500 (heavily polluted).
+    """
+
+    HUM_REFERENCE = 40.0  # %RH considered ideal
+    HUM_WEIGHT = 0.25  # Share of the score driven by humidity
+    HUM_COEFF = 0.03  # Gas resistance sensitivity to humidity (per %RH)
+    RISE_ALPHA = 0.1  # Baseline step towards cleaner air
+    DECAY_ALPHA = 0.0005  # Baseline step towards dirtier air
+
+    def __init__(self, burn_in, warm_up):
+        self.baseline = None
+        self.seconds = 0  # Run time covered by the samples since (re)start
+        self.last_ticks = None
+        self.restored = False
+        self.burn_in = burn_in
+        self.warm_up = warm_up
+        self.iaq = None
+        self.saved = None  # Checkpoint time of a restored baseline
+
+    @property
+    def ready(self):
+        """True once the baseline can be trusted"""
+        needed = self.warm_up if self.restored else self.burn_in
+        return self.baseline is not None and self.seconds >= needed
+
+    def update(self, gas, humidity):
+        """Feed one gas/humidity sample, returns the IAQ index or None while calibrating"""
+        if gas is None or humidity is None or gas <= 0:
+            return self.iaq
+
+        comp_gas = gas * math.exp(self.HUM_COEFF * (humidity - self.HUM_REFERENCE))
+        if self.baseline is None:
+            self.baseline = comp_gas
+        elif comp_gas > self.baseline:
+            self.baseline += self.RISE_ALPHA * (comp_gas - self.baseline)
+        else:
+            self.baseline += self.DECAY_ALPHA * (comp_gas - self.baseline)
+        # Counted in time rather than samples, so interval changes don't shift the burn-in
+        now = time.ticks_ms()
+        if self.last_ticks is not None:
+            self.seconds += time.ticks_diff(now, self.last_ticks) / 1000
+        self.last_ticks = now
+
+        if not self.ready:
+            self.iaq = None
             return None
 
-def init_light_sensor(i2c):
-    """Initialize VEML7700 light sensor"""
-    if not VEML7700_ENABLED:
-        return None
+        gas_score = min(comp_gas / self.baseline, 1.0)
+        hum_offset = humidity - self.HUM_REFERENCE
+        if hum_offset > 0:
+            hum_score = (100 - self.HUM_REFERENCE - hum_offset) / (100 - self.HUM_REFERENCE)
+        else:
+            hum_score = (self.HUM_REFERENCE + hum_offset) / self.HUM_REFERENCE
+        hum_score = max(0.0, min(hum_score, 1.0))
+
+        score = hum_score * self.HUM_WEIGHT + gas_score * (1 - self.HUM_WEIGHT)
+        self.iaq = (1.0 - score) * 500
+        return self.iaq
+
+    def get_state(self):
+        return {"baseline": self.baseline}
+
+    def set_state(self, state):
+        self.baseline = float(state["baseline"])
+        self.seconds = 0
+        self.last_ticks = None
+        self.restored = True
+        self.saved = state.get("saved")
+
+    def reset(self):
+        """Forget the baseline and start burn-in again"""
+        self.baseline = None
+        self.seconds = 0
+        self.last_ticks = None
+        self.restored = False
+        self.saved = None
+        self.iaq = None
+
+def save_iaq_state(iaq):
+    """Checkpoint the IAQ baseline to flash (write-then-rename so a reset can't corrupt it)"""
+    if iaq is None or not iaq.ready:
+        return
+    try:
+        state = iaq.get_state()
+        state["saved"] = time.time() if rtc_valid() else None
+        tmp = IAQ_STATE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp, IAQ_STATE_FILE)
+        print("IAQ baseline saved: {:.0f}".format(iaq.baseline))
+    except Exception as e:
+        print("IAQ save error:", e)
+
+def load_iaq_state(iaq):
+    """Restore a previously checkpointed IAQ baseline, returns True on success"""
+    try:
+        with open(IAQ_STATE_FILE) as f:
+            state = json.load(f)
+    except OSError:
+        return False
+    except Exception as e:
+        print("IAQ state unreadable:", e)
+        return False
+
+    saved = state.get("saved")
+    if saved is not None and rtc_valid() and time.time() - saved > IAQ_STATE_MAX_AGE:
+        print("IAQ baseline too old, starting burn-in")
+        return False
+
     try:
-        # Check if sensor is present
-        i2c.writeto(VEML7700_ADDRESS, bytearray([0x00]))
-        sensor = VEML7700(i2c, VEML7700_ADDRESS)
-        print("VEML7700 light sensor initialized at 0x{:02X}".format(VEML7700_ADDRESS))
-        return sensor
+        iaq.set_state(state)
     except Exception as e:
-        print("VEML7700 init failed:", e)
-        return None
+        print("IAQ state invalid:", e)
+        return False
+    print("IAQ baseline restored: {:.0f}".format(iaq.baseline))
+    return True
 
-def read_light_sensor(light_sensor):
-    """Read light level in lux - thread safe"""
-    if light_sensor is None:
+def check_iaq_age(iaq):
+    """Start burn-in again if a baseline restored before the first NTP sync
+    turns out older than IAQ_STATE_MAX_AGE now that the clock is set"""
+    if iaq is None or not iaq.restored or iaq.saved is None:
+        return
+    if time.time() - iaq.saved > IAQ_STATE_MAX_AGE:
+        print("IAQ baseline too old, starting burn-in")
+        iaq.reset()
+    iaq.saved = None
+
+def init_iaq():
+    """Create the IAQ calculator and restore its baseline from flash"""
+    if not IAQ_ENABLED:
         return None
-    
-    with sensor_lock:
-        try:
-            return light_sensor.read_lux()
-        except Exception as e:
-            print("Light sensor read error:", e)
-            return None
+    iaq = IAQCalculator(IAQ_BURN_IN, IAQ_WARM_UP)
+    if not load_iaq_state(iaq):
+        print("IAQ burn-in started ({} s)".format(IAQ_BURN_IN))
+    return iaq
 
-# --- BME680 Sensor ---
-def init_sensor(i2c):
-    sensor = bme680.BME680_I2C(i2c=i2c, address=0x76)
-    return sensor
+def get_iaq_status(iaq_value):
+    """Get IAQ description and color"""
+    if iaq_value is None:
+        return "Calibrating", "#999"
+    elif iaq_value <= 50:
+        return "Excellent", "#28a745"
+    elif iaq_value <= 100:
+        return "Good", "#28a745"
+    elif iaq_value <= 150:
+        return "Lightly Polluted", "#ffc107"
+    elif iaq_value <= 200:
+        return "Moderately Polluted", "#ff9800"
+    elif iaq_value <= 300:
+        return "Heavily Polluted", "#dc3545"
+    else:
+        return "Severely Polluted", "#8b0000"
 
-def read_sensor(sensor):
-    """Thread-safe sensor reading"""
-    with sensor_lock:
-        try:
-            return {
-                "temperature": sensor.temperature,
-                "pressure": sensor.pressure,
-                "humidity": sensor.humidity,
-                "gas": sensor.gas
-            }
-        except Exception as e:
-            print("Sensor read error:", e)
-            return None
+# --- History ---
+class History:
+    """Fixed-size ring buffer of recent samples.
+
+    Each channel is one typed array of scaled integers, so the memory use is
+    fixed when the buffer is created and no per-sample objects are kept.
+    Samples closer than step seconds to the last stored one are skipped, so
+    the buffer covers at least capacity * step seconds whatever the interval.
+    """
+
+    # (reading key, array typecode, scale factor)
+    CHANNELS = (
+        ("temperature", "h", 100),
+        ("pressure", "h", 10),
+        ("humidity", "h", 100),
+        ("gas", "l", 1),
+        ("light", "l", 10),
+        ("battery", "h", 1000),
+        ("iaq", "h", 1),
+    )
+    MISSING = {"h": -32768, "l": -2147483648}
+
+    def __init__(self, capacity, step):
+        self.capacity = capacity
+        self.step = step
+        self.times = array("l", [0] * capacity)
+        self.columns = []
+        for key, typecode, scale in self.CHANNELS:
+            self.columns.append(array(typecode, [self.MISSING[typecode]] * capacity))
+        self.count = 0
+        self.head = 0  # Next slot to write
+        self.lock = _thread.allocate_lock()
+
+    @property
+    def size_bytes(self):
+        size = len(self.times) * self.times.itemsize
+        for column in self.columns:
+            size += len(column) * column.itemsize
+        return size
+
+    def append(self, t, readings):
+        """Store one sample, readings maps channel keys to values (None if missing)"""
+        with self.lock:
+            i = self.head
+            if self.count and 0 <= t - self.times[(i - 1) % self.capacity] < self.step:
+                return
+            self.times[i] = t
+            for (key, typecode, scale), column in zip(self.CHANNELS, self.columns):
+                value = readings.get(key)
+                if value is None:
+                    column[i] = self.MISSING[typecode]
+                else:
+                    column[i] = int(round(value * scale))
+            self.head = (i + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def query(self, since, step):
+        """Yield (t, values) for samples newer than since, at least step seconds apart"""
+        with self.lock:
+            count = self.count
+            start = (self.head - count) % self.capacity
+        last = None
+        for n in range(count):
+            i = (start + n) % self.capacity
+            with self.lock:
+                t = self.times[i]
+                if t < since or (last is not None and t - last < step):
+                    continue
+                values = []
+                for (key, typecode, scale), column in zip(self.CHANNELS, self.columns):
+                    raw = column[i]
+                    if raw == self.MISSING[typecode]:
+                        values.append(None)
+                    else:
+                        values.append(raw if scale == 1 else raw / scale)
+            last = t
+            yield t, values
+
+def init_history():
+    """Allocate the history ring buffer for HISTORY_HOURS of samples, one per
+    boot LOG_INTERVAL at most"""
+    capacity = max(1, HISTORY_HOURS * 3600 // LOG_INTERVAL)
+    buf = History(capacity, LOG_INTERVAL)
+    print("History buffer: {} samples, {} bytes".format(capacity, buf.size_bytes))
+    return buf
 
 # --- Logging ---
-def rotate_logs(max_files):
-    """Remove old log files beyond max_files limit"""
+# Each record ends with ", XX": the XOR of every byte before the separator
+# (as in NMEA). A torn or corrupt record fails the check and is skipped by
+# readers. Files written this way end their header with a "Chk" column.
+def record_checksum(text):
+    """8-bit XOR checksum of a record"""
+    checksum = 0
+    for b in text.encode():
+        checksum ^= b
+    return checksum
+
+def frame_record(parts):
+    """Join record fields into a checksummed log line"""
+    body = ", ".join(parts)
+    return "{}, {:02X}\n".format(body, record_checksum(body))
+
+def check_record(line):
+    """Return the fields of a checksummed log line, or None if it is torn or corrupt"""
+    line = line.rstrip("\r\n")
+    i = line.rfind(", ")
+    if i < 0 or len(line) - i != 4:
+        return None
+    try:
+        checksum = int(line[i + 2:], 16)
+    except ValueError:
+        return None
+    if record_checksum(line[:i]) != checksum:
+        return None
+    return [v.strip() for v in line[:i].split(",")]
+
+def read_log_header(f):
+    """Read a log header line, returns (column names, framed) where framed
+    means the records carry checksums"""
+    header = [h.strip() for h in f.readline().split(",")]
+    if header[-1] == "Chk":
+        return header[:-1], True
+    return header, False
+
+def parse_log_line(line, framed):
+    """Split a log line into fields, None for a torn or corrupt framed record"""
+    if framed:
+        return check_record(line)
+    return [v.strip() for v in line.split(",")]
+
+def upgrade_log(filename):
+    """Rewrite a daily log started before records carried checksums with a "Chk"
+    header and framed rows, so that framed rows can be appended to it. A row
+    that doesn't fill the header (torn by a power cut) is copied unframed, so
+    readers skip it. Returns the column names."""
+    tmp = filename + ".tmp"
+    with open(filename) as src, open(tmp, "w") as dst:
+        header = read_log_header(src)[0]
+        dst.write(", ".join(header + ["Chk"]) + "\n")
+        for line in src:
+            fields = parse_log_line(line, False)
+            if line.startswith("#") or len(fields) != len(header):
+                dst.write(line.rstrip("\r\n") + "\n")
+            else:
+                dst.write(frame_record(fields))
+    os.rename(tmp, filename)
+    print("Added checksums to", filename)
+    return header
+
+def recover_log():
+    """Repair a torn record at the end of the newest daily log.
+
+    Only the last RECOVERY_WINDOW bytes are read, so this takes the same time
+    whatever the file size. A partial record left by a power cut is terminated
+    with a newline so it stands alone, fails its checksum and is skipped by
+    readers, and the next record starts on a clean line. A log written before
+    records carried checksums is converted (see upgrade_log) before the uplink
+    starts, as its byte offsets change."""
     try:
         files = [f for f in os.listdir() if f.endswith(".log")]
+        if not files:
+            return
+        files.sort()
+        filename = files[-1]
+        size = os.stat(filename)[6]
+        if size == 0:
+            return
+        with open(filename, "rb") as f:
+            framed = f.readline().rstrip().endswith(b"Chk")
+            f.seek(max(0, size - RECOVERY_WINDOW))
+            tail = f.read()
+        if not framed:
+            upgrade_log(filename)
+            return
+        if not tail.endswith(b"\n"):
+            with open(filename, "a") as f:
+                f.write("\n")
+            print("Repaired torn record at end of", filename)
+        elif framed:
+            last = tail[:-1].split(b"\n")[-1].decode()
+            if not last.startswith(("Time", "#")) and check_record(last) is None:
+                print("Last record of {} is corrupt, readers will skip it".format(filename))
+    except Exception as e:
+        print("Log recovery error:", e)
+
+def flash_usage():
+    """Fraction of the filesystem in use"""
+    st = os.statvfs("/")
+    return 1.0 - st[3] / st[2]  # f_bfree / f_blocks
+
+SUMMARY_HEADER = ["Date", "Hour", "Samples", "Temp(C)", "Pressure(hPa)", "Humidity(%)",
+                  "Gas(Ohm)", "Light(lux)", "Battery(V)"]
+RAW_HEADERS = ("Temp(adc)", "Pressure(adc)", "Humidity(adc)", "Gas(adc)", "GasRange(adc)")
+
+def parse_cal_marker(line):
+    """Coefficients of a "#cal" line, in the form of the driver's calibration"""
+    names = {"T": "temperature", "P": "pressure", "H": "humidity"}
+    cal = {}
+    for field in line.split(",")[2:]:
+        name, _, value = field.strip().partition("=")
+        if name == "sw_err":
+            cal[name] = float(value)
+        elif name in names:
+            cal[names[name]] = [float(v) for v in value.split("|")]
+    return cal
+
+def compensate_fields(names, fields, cal):
+    """(column, value) pairs of the compensated BME680 channels of a raw log row"""
+    words = []
+    for header in RAW_HEADERS:
+        if header not in names or not fields[names.index(header)]:
+            words.append(None)
+        else:
+            words.append(int(fields[names.index(header)]))
+    if None in words[:3]:
+        return []
+    temperature, pressure, humidity, gas = bme680.compensate(cal, *words)
+    pairs = [("Temp(C)", temperature), ("Pressure(hPa)", pressure), ("Humidity(%)", humidity)]
+    if gas is not None:
+        pairs.append(("Gas(Ohm)", gas))
+    return pairs
+
+def summary_tail(summary_file):
+    """("Date, Hour" of the last complete row, True if the file ends mid-row) of a
+    summary file, or (None, False) if there is none"""
+    try:
+        with open(summary_file, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(max(0, size - 256))
+            tail = f.read()
+    except OSError:
+        return None, False
+    lines = tail.split(b"\n")
+    complete = lines[1:-1] if size > 256 else lines[:-1]  # Drop cut-off ends
+    for line in reversed(complete):
+        if line and not line.startswith(b"Date"):
+            return line[:14].decode(), not tail.endswith(b"\n")
+    return "", not tail.endswith(b"\n")
+
+def compact_log(filename):
+    """Append hourly means of a daily log to its monthly summary file (YYYY-MM.sum).
+    Hours already in the summary are skipped, so compacting a day again after
+    a reset between the append and the log's removal adds nothing twice."""
+    day = filename[:-4]
+    summary_file = "{}.sum".format(day[:7])
+    columns = SUMMARY_HEADER[3:]
+    sums = None
+    counts = None
+    hour = None
+    rows = []
+
+    def flush():
+        samples = max(counts)
+        if samples:
+            parts = [day, "{:02d}".format(hour), str(samples)]
+            for column, total, n in zip(columns, sums, counts):
+                if not n:
+                    parts.append("")
+                elif column == "Gas(Ohm)":
+                    parts.append("{:.0f}".format(total / n))
+                else:
+                    parts.append("{:.2f}".format(total / n))
+            rows.append(", ".join(parts))
+
+    cal = None  # Coefficients of the untagged BME680 of a raw log
+    with open(filename) as f:
+        header, framed = read_log_header(f)
+        for line in f:
+            if line.startswith("#cal, tag=,"):
+                cal = parse_cal_marker(line)
+                continue
+            fields = parse_log_line(line, framed)
+            if fields is None:
+                continue
+            # Optional columns can only be trusted when the row is complete
+            names = header if len(fields) == len(header) else header[:5]
+            try:
+                row_hour = int(fields[0][:2])
+            except (ValueError, IndexError):
+                continue
+            if row_hour != hour:
+                if hour is not None:
+                    flush()
+                hour = row_hour
+                sums = [0.0] * len(columns)
+                counts = [0] * len(columns)
+            values = list(zip(names[1:], fields[1:]))
+            if cal is not None:
+                try:
+                    values += compensate_fields(names, fields, cal)
+                except (ValueError, ZeroDivisionError):
+                    pass
+            for name, value in values:
+                if name in columns and value != "":
+                    try:
+                        sums[columns.index(name)] += float(value)
+                        counts[columns.index(name)] += 1
+                    except ValueError:
+                        pass
+    if hour is not None:
+        flush()
+
+    last, partial = summary_tail(summary_file)
+    if last:
+        rows = [row for row in rows if row[:14] > last]
+    with open(summary_file, "a") as f:
+        if last is None:
+            f.write(", ".join(SUMMARY_HEADER) + "\n")
+        elif partial:
+            f.write("\n")  # End a row cut short by a reset; it is written again below
+        for row in rows:
+            f.write(row + "\n")
+    gc.collect()
+
+def rotate_logs(max_files):
+    """Compact the oldest daily logs into hourly summaries and remove them while
+    flash use is above FLASH_HIGH_WATER or more than max_files exist. The current
+    day's log and the current month's summary are never removed."""
+    try:
+        current_log = "{}.log".format(date_str())
+        files = [f for f in os.listdir() if f.endswith(".log") and f != current_log]
         files.sort()
-        while len(files) > max_files:
+        while files and (len(files) + 1 > max_files or flash_usage() > FLASH_HIGH_WATER):
             oldest = files.pop(0)
+            try:
+                compact_log(oldest)
+            except Exception as e:
+                # Keep the log and try again at the next rotation
+                print("Compaction error, {} kept:".format(oldest), e)
+                break
+            os.remove(oldest)
+            print("Compacted old log:", oldest)
+
+        # The current month's summary is still being filled and is never removed
+        current_summary = "{}.sum".format(date_str()[:7])
+        summaries = [f for f in os.listdir() if f.endswith(".sum")]
+        summaries.sort()
+        while summaries and summaries[0] < current_summary and (
+                len(summaries) > SUMMARY_MAX_MONTHS or flash_usage() > FLASH_HIGH_WATER):
+            oldest = summaries.pop(0)
             os.remove(oldest)
-            print("Deleted old log:", oldest)
+            print("Deleted old summary:", oldest)
     except Exception as e:
         print("Rotation error:", e)
     gc.collect()
 
-def log_reading(readings, battery_voltage, light_lux, max_files):
-    """Log sensor reading to daily file"""
-    filename = "{}.log".format(date_str())
-    
-    # Build log line with available data
-    line_parts = [
-        timestamp(),
-        "{:.2f}".format(readings["temperature"]),
-        "{:.2f}".format(readings["pressure"]),
-        "{:.2f}".format(readings["humidity"]),
-        "{}".format(readings["gas"])
-    ]
-    
-    if light_lux is not None:
-        line_parts.append("{:.2f}".format(light_lux))
-    
-    if battery_voltage is not None:
-        line_parts.append("{:.2f}".format(battery_voltage))
-    
-    line = ", ".join(line_parts) + "\n"
+class DeadbandFilter:
+    """Picks the samples written in dead-band logging mode.
+
+    A row is written when a channel is more than its DEADBAND away from the
+    last written row, a value appears or goes missing, DEADBAND_HEARTBEAT
+    seconds have passed, or a new daily file starts. A "#deadband" line in the
+    file marks where the mode starts ("#deadband, off" where it ends), and
+    readers hold each row's values until the next row. For every sample the
+    gap between the reading and the held value is tracked, which is the
+    reconstruction error against the full-rate series.
+    """
+
+    def __init__(self):
+        self.written = None  # Values of the last written row
+        self.written_t = 0
+        self.file = None
+        self.marked = None  # (file, enabled) of the last marker
+        self.errors = {}  # Key: [max, sum of squares, samples]
+        metrics["deadband_rows_written"] = 0
+        metrics["deadband_rows_skipped"] = 0
+
+    @staticmethod
+    def band(key, value):
+        return DEADBAND.get(key.split("_", 1)[0], 0) * AdaptiveSampler.scale(key, value)
+
+    def keep(self, values, t, filename):
+        """True if the sample ({key: value} of the logged columns) is written"""
+        if not DEADBAND_ENABLED:
+            self.written = None
+            return True
+        held = self.written
+        write = held is None or filename != self.file or t - self.written_t >= DEADBAND_HEARTBEAT
+        if not write:
+            for key, value in values.items():
+                last = held.get(key)
+                if (value is None) != (last is None) or (
+                        value is not None and abs(value - last) > self.band(key, last)):
+                    write = True
+                    break
+
+        if held is not None:
+            for key, value in values.items():
+                last = held.get(key)
+                if value is None or last is None:
+                    continue
+                error = 0.0 if write else abs(value - last)
+                stats = self.errors.get(key)
+                if stats is None:
+                    stats = self.errors[key] = [0.0, 0.0, 0]
+                stats[0] = max(stats[0], error)
+                stats[1] += error * error
+                stats[2] += 1
+            metrics["deadband_error"] = dict(
+                (key, {"max": round(e[0], 4), "rms": round(math.sqrt(e[1] / e[2]), 4)})
+                for key, e in self.errors.items())
+
+        if write:
+            self.written = values
+            self.written_t = t
+            self.file = filename
+            metrics["deadband_rows_written"] += 1
+        else:
+            metrics["deadband_rows_skipped"] += 1
+        return write
+
+    def marker(self, filename, channels):
+        """Marker line to write before the next row of filename when the mode
+        changed, or None. channels are (column, key) pairs."""
+        state = (filename, DEADBAND_ENABLED)
+        if state == self.marked:
+            return None
+        same_file = self.marked is not None and self.marked[0] == filename
+        self.marked = state
+        if not DEADBAND_ENABLED:
+            return "#deadband, off\n" if same_file else None
+        parts = ["#deadband", "heartbeat={}".format(DEADBAND_HEARTBEAT)]
+        for column, key in channels:
+            band = DEADBAND.get(key.split("_", 1)[0], 0)
+            if key.split("_", 1)[0] in ADAPTIVE_RELATIVE:
+                parts.append("{}={:g}%".format(column, band * 100))
+            else:
+                parts.append("{}={:g}".format(column, band))
+        return ", ".join(parts) + "\n"
+
+def log_reading(readings, max_files, t=None):
+    """Log sensor readings to the daily file, t is the sample time (default: now).
+
+    New files get a column for every registry channel. Appending to a file
+    started before a sensor was added or removed keeps that file's columns.
+    In dead-band mode, samples close to the last written row are not written."""
+    global log_columns
+    if t is None:
+        t = time.time()
+    filename = "{}.log".format(date_str(t))
     
     try:
         # Check if this is a new file
@@ -307,35 +2247,335 @@ def log_reading(readings, battery_voltage, light_lux, max_files):
         except OSError:
             new_file = True
         
-        # Write to log file
-        with open(filename, "a") as f:
-            if new_file:
-                header_parts = ["Time", "Temp(C)", "Pressure(hPa)", "Humidity(%)", "Gas(Ohm)"]
-                if light_lux is not None:
-                    header_parts.append("Light(lux)")
-                if battery_voltage is not None:
-                    header_parts.append("Battery(V)")
-                f.write(", ".join(header_parts) + "\n")
-            f.write(line)
+        # Raw columns stay readable whatever BME680_RAW is, a restart may continue a raw day file
+        formats = {}
+        compensated = {}  # Raw key: compensated channel the dead-band checks instead, or None
+        for probe in registry.probes:
+            for key, header, label, unit, fmt in probe.channels + probe.raw_channels:
+                formats[header] = (key, fmt)
+            for i, channel in enumerate(probe.raw_channels):
+                compensated[channel[0]] = probe.channels[i] if i < len(probe.CHANNELS) else None
+        if new_file:
+            columns = [channel[1] for channel in registry.log_channels()]
+        elif log_columns is not None and log_columns[0] == filename:
+            columns = log_columns[1]
+        else:
+            with open(filename) as f:
+                columns, framed = read_log_header(f)
+            if not framed:
+                columns = upgrade_log(filename)
+            columns = columns[1:]
+        log_columns = (filename, columns)
         
-        print("Logged:", line.strip())
+        # Build log line; failed reads leave an empty field so every row matches the header
+        line_parts = [timestamp(t)]
+        values = {}
+        channels = []
+        for column in columns:
+            key, fmt = formats.get(column, (None, None))
+            value = readings.get(key)
+            line_parts.append("" if value is None else fmt.format(value))
+            if key is None or key.startswith("age_"):
+                continue  # Ages change every sample, the dead-band ignores them
+            if key in compensated:
+                # ADC words have no band, the compensated value decides for them
+                if compensated[key] is None:
+                    continue
+                key, column = compensated[key][0], compensated[key][1]
+                value = readings.get(key)
+            values[key] = value
+            channels.append((column, key))
         
-        # Only rotate when creating a new file
-        if new_file:
-            rotate_logs(max_files)
+        if deadband is None or deadband.keep(values, t, filename):
+            line = frame_record(line_parts)
+            marker = None if deadband is None else deadband.marker(filename, channels)
+            
+            # Write to log file
+            with open(filename, "a") as f:
+                if new_file:
+                    f.write(", ".join(["Time"] + columns + ["Chk"]) + "\n")
+                    f.write(registry.cal_markers())
+                if marker:
+                    f.write(marker)
+                f.write(line)
+            metrics["log_bytes"] = metrics.get("log_bytes", 0) + len(line) + len(marker or "")
+            
+            print("Logged:", line.strip())
+            
+            # Rotate when starting a new day or when flash is filling up
+            if new_file or flash_usage() > FLASH_HIGH_WATER:
+                rotate_logs(max_files)
             
     except Exception as e:
         print("Log error:", e)
     
-    gc.collect()
+    # Keep the sample in the RAM history as well
+    if history is not None:
+        samples = {}
+        for channel in History.CHANNELS:
+            samples[channel[0]] = readings.get(channel[0])
+        history.append(t, samples)
+
+class PresyncBuffer:
+    """Holds samples taken before the RTC has a real date.
+
+    Until the first NTP sync after a power cycle the RTC counts from its
+    default date, and rows written then would land in a daily file of that
+    date. Samples are appended to a file on flash instead, each with its
+    monotonic time in ms since boot, and logged with their real time once the
+    clock is set. Only a full flash (FLASH_HIGH_WATER) drops samples. A file
+    left by an earlier boot can't be dated, as its monotonic times restarted;
+    it is moved to "<file>.old" and not logged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.held = 0
+        self.elapsed = 0  # ms since boot, kept past the ticks_ms wrap
+        self.ticks = time.ticks_ms()
+        self.waiting = True  # Until the first flush
+        metrics["presync_held"] = 0
+        metrics["presync_dropped"] = 0
+        try:
+            os.stat(self.path)
+        except OSError:
+            return
+        try:
+            os.remove(self.path + ".old")
+        except OSError:
+            pass
+        os.rename(self.path, self.path + ".old")
+        print("Presync samples of an earlier boot kept undated in", self.path + ".old")
+
+    def now_ms(self):
+        """Monotonic ms since boot"""
+        ticks = time.ticks_ms()
+        self.elapsed += time.ticks_diff(ticks, self.ticks)
+        self.ticks = ticks
+        return self.elapsed
+
+    def hold(self, readings):
+        if flash_usage() > FLASH_HIGH_WATER:
+            metrics["presync_dropped"] += 1
+            return
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps([self.now_ms(), readings]) + "\n")
+            self.held += 1
+        except Exception as e:
+            metrics["presync_dropped"] += 1
+            print("Presync write error:", e)
+        metrics["presync_held"] = self.held
+
+    def flush(self, max_files):
+        """Log the held samples, dated back from now by their age"""
+        now = time.time()
+        now_ms = self.now_ms()
+        logged = 0
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        sample_ms, readings = json.loads(line)
+                    except ValueError:
+                        continue  # Cut short by a reset
+                    log_reading(readings, max_files, now - (now_ms - sample_ms) // 1000)
+                    logged += 1
+            os.remove(self.path)
+        except OSError:
+            pass
+        if logged:
+            print("Logged {} sample(s) held until the clock was set".format(logged))
+        self.held = 0
+        self.waiting = False
+        metrics["presync_held"] = 0
+
+# --- Uplink ---
+def http_post(url, body, timeout):
+    """POST a JSON body to an http:// URL, returns the HTTP status code"""
+    host, _, path = url[7:].partition("/")
+    host, _, port = host.partition(":")
+    addr = socket.getaddrinfo(host, int(port) if port else 80)[0][-1]
+    s = socket.socket()
+    s.settimeout(timeout)
+    try:
+        s.connect(addr)
+        s.send("POST /{} HTTP/1.0\r\nHost: {}\r\nContent-Type: application/json\r\n"
+               "Content-Length: {}\r\n\r\n".format(path, host, len(body)).encode())
+        s.send(body)
+        status = s.recv(64).decode().split(" ")
+        return int(status[1]) if len(status) > 1 else 0
+    finally:
+        s.close()
+
+class Uplink:
+    """Store-and-forward push of logged records to a collector.
+
+    The daily log files are the durable queue. The cursor (file, byte offset)
+    just past the last acknowledged record is saved in UPLINK_STATE_FILE, so
+    nothing is lost across WiFi drops or resets. A record is only sent again
+    if its acknowledgement was lost, and each batch carries its file and
+    offset so collectors can drop such repeats. Batches grow while the link is
+    fast and shrink when pushes fail or are slow.
+    """
+
+    def __init__(self):
+        self.file = None
+        self.offset = 0
+        self.batch = UPLINK_BATCH_MIN
+        self.retry = UPLINK_TIMEOUT
+        self.interval = UPLINK_INTERVAL  # Lengthened while adaptive sampling is slow
+        self.next_push = time.ticks_ms()
+        self.mqtt = None
+        metrics["uplink_batches"] = 0
+        metrics["uplink_records"] = 0
+        metrics["uplink_failures"] = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(UPLINK_STATE_FILE) as f:
+                state = json.load(f)
+            self.file = state["file"]
+            self.offset = state["offset"]
+            print("Uplink resuming at {} +{}".format(self.file, self.offset))
+        except OSError:
+            pass
+        except Exception as e:
+            print("Uplink state unreadable:", e)
+
+    def save(self):
+        tmp = UPLINK_STATE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"file": self.file, "offset": self.offset}, f)
+        os.rename(tmp, UPLINK_STATE_FILE)
+
+    def poll(self, online, remaining_ms):
+        """Push one batch if due and there is time before the next sample"""
+        now = time.ticks_ms()
+        if not online or time.ticks_diff(now, self.next_push) < 0:
+            return
+        if remaining_ms < UPLINK_TIMEOUT * 1000 + 500:
+            return
+
+        batch = self.read_batch()
+        if batch is None:
+            self.next_push = time.ticks_add(now, self.interval * 1000)
+            return
+        filename, start, end, header, cal, rows, records = batch
+        body = json.dumps({"node": NODE_NAME, "file": filename, "offset": start,
+                           "header": header, "cal": cal, "rows": rows})
+        try:
+            self.send(body)
+        except Exception as e:
+            self.mqtt = None
+            self.batch = max(self.batch // 2, UPLINK_BATCH_MIN)
+            metrics["uplink_failures"] += 1
+            print("Uplink push failed ({}), retry in {} s".format(e, self.retry))
+            self.next_push = time.ticks_add(now, self.retry * 1000)
+            self.retry = min(self.retry * 2, self.interval)
+            return
+
+        self.file, self.offset = filename, end
+        self.save()
+        # Grow batches while pushes are quick, shrink them when the link is slow
+        if time.ticks_diff(time.ticks_ms(), now) < UPLINK_TIMEOUT * 250:
+            self.batch = min(self.batch * 2, UPLINK_BATCH_MAX)
+        else:
+            self.batch = max(self.batch // 2, UPLINK_BATCH_MIN)
+        self.retry = UPLINK_TIMEOUT
+        self.next_push = now  # Keep going until the backlog is sent
+        metrics["uplink_batches"] += 1
+        metrics["uplink_records"] += records
+        metrics["uplink_batch_size"] = self.batch
+
+    def push_now(self):
+        """Push at the next poll, e.g. to get an alert to the collector quickly"""
+        self.next_push = time.ticks_ms()
+
+    def send(self, body):
+        if UPLINK_MQTT_BROKER:
+            if self.mqtt is None:
+                from umqtt.simple import MQTTClient
+                mqtt = MQTTClient(NODE_NAME, UPLINK_MQTT_BROKER, keepalive=UPLINK_MQTT_KEEPALIVE)
+                mqtt.connect(timeout=UPLINK_TIMEOUT)
+                mqtt.sock.settimeout(UPLINK_TIMEOUT)  # Also bounds the wait for a PUBACK
+                self.mqtt = mqtt
+            self.mqtt.publish(UPLINK_MQTT_TOPIC, body, qos=1)
+        else:
+            status = http_post(UPLINK_URL, body.encode(), UPLINK_TIMEOUT)
+            if not 200 <= status < 300:
+                raise OSError("HTTP {}".format(status))
+
+    def read_batch(self):
+        """Read up to self.batch complete records after the cursor.
+        Returns (file, start offset, end offset, header, #cal lines, rows,
+        record count) or None. Mode markers such as #deadband stay in rows
+        in file order, and the file's #cal lines go with every batch."""
+        files = [f for f in os.listdir() if f.endswith(".log")]
+        files.sort()
+        # Resume in the cursor file, or in the next one if it has been removed
+        for filename in files:
+            if self.file is not None and filename < self.file:
+                continue
+            offset = self.offset if filename == self.file else 0
+            rows = []
+            cal = []
+            records = 0
+            with open(filename, "rb") as f:
+                header_line = f.readline()
+                header = [h.strip() for h in header_line.decode().split(",")]
+                framed = header[-1] == "Chk"
+                top = len(header_line)
+                # The #cal block follows the header
+                while True:
+                    line = f.readline()
+                    if not line.startswith(b"#cal") or not line.endswith(b"\n"):
+                        break
+                    cal.append(line.decode().rstrip("\r\n"))
+                    top += len(line)
+                if offset < top:
+                    offset = top
+                f.seek(offset)
+                start = offset
+                while records < self.batch:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # End of file
+                    offset += len(line)
+                    text = line.decode().rstrip("\r\n")
+                    if text.startswith("#"):
+                        rows.append(text)
+                    elif text and parse_log_line(text, framed) is not None:
+                        rows.append(text)
+                        records += 1
+            if rows:
+                return filename, start, offset, header, cal, rows, records
+            if filename != files[-1]:
+                # Nothing left in this file, move the cursor on
+                self.file, self.offset = filename, offset
+        return None
+
+def init_uplink():
+    """Create the uplink when enabled"""
+    if not UPLINK_ENABLED:
+        return None
+    print("Uplink enabled: {}".format(
+        "MQTT " + UPLINK_MQTT_BROKER if UPLINK_MQTT_BROKER else UPLINK_URL))
+    return Uplink()
 
 # --- Web Server ---
+def is_data_file(filename):
+    """True for daily logs and hourly summaries that may be served or deleted"""
+    return (filename.endswith('.log') or filename.endswith('.sum')) and \
+        '/' not in filename and '..' not in filename
+
 def get_log_files():
-    """Get list of log files with sizes"""
+    """Get list of log and summary files with sizes"""
     try:
         files = []
         for f in os.listdir():
-            if f.endswith(".log"):
+            if is_data_file(f):
                 try:
                     stat = os.stat(f)
                     size_kb = stat[6] / 1024  # Size in KB
@@ -369,7 +2609,6 @@ def serve_log_file(cl, filename):
                 if not chunk:
                     break
                 cl.send(chunk)
-                gc.collect()  # Free memory after each chunk
         
         print("Sent file: {} ({} bytes)".format(filename, file_size))
         
@@ -385,7 +2624,7 @@ def delete_log_file(filename):
     """Safely delete a log file"""
     try:
         # Security check
-        if not filename.endswith('.log') or '/' in filename or '..' in filename:
+        if not is_data_file(filename):
             return False, "Invalid filename"
         
         # Don't allow deleting today's log file (optional protection)
@@ -409,6 +2648,276 @@ def delete_log_file(filename):
         print("Error deleting file:", e)
         return False, str(e)
 
+def parse_query(path):
+    """Split a request path into (path, dict of query parameters)"""
+    params = {}
+    if '?' in path:
+        path, query = path.split('?', 1)
+        for pair in query.split('&'):
+            if '=' in pair:
+                key, value = pair.split('=', 1)
+                params[key] = value
+            elif pair:
+                params[pair] = ""
+    return path, params
+
+def read_body(cl, request, max_length=2048):
+    """Return the body of a request, receiving the rest of it up to Content-Length"""
+    head, _, body = request.partition('\r\n\r\n')
+    length = 0
+    for line in head.split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    if length > max_length:
+        raise ValueError("body too large")
+    while len(body) < length:
+        chunk = cl.recv(length - len(body))
+        if not chunk:
+            break
+        body += chunk.decode('utf-8')
+    return body
+
+def send_json(cl, data, status="200 OK"):
+    """Send a JSON response"""
+    cl.send("HTTP/1.1 {}\r\nContent-Type: application/json\r\nConnection: close\r\n\r\n".format(status))
+    cl.send(json.dumps(data))
+
+def serve_history(cl, params):
+    """Stream /api/history as JSON straight from the RAM buffer"""
+    try:
+        hours = float(params.get("hours", HISTORY_HOURS))
+        step = int(params.get("step", 0))
+    except ValueError:
+        send_json(cl, {"error": "hours and step must be numbers"}, "400 Bad Request")
+        return
+    if history is None:
+        send_json(cl, {"error": "History not available"}, "503 Service Unavailable")
+        return
+
+    now = time.time()
+    cl.send("HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n\r\n")
+    cl.send('{{"now": {}, "channels": {}, "rows": ['.format(
+        now, json.dumps(["time"] + [c[0] for c in History.CHANNELS])))
+
+    # Send rows in small batches to keep memory flat
+    chunk = []
+    first = True
+    for t, values in history.query(now - int(hours * 3600), step):
+        chunk.append(json.dumps([t] + values))
+        if len(chunk) >= 20:
+            cl.send(("" if first else ",") + ",".join(chunk))
+            first = False
+            chunk = []
+    if chunk:
+        cl.send(("" if first else ",") + ",".join(chunk))
+    cl.send("]}")
+
+EXPORT_CHUNK = 1024  # Bytes per chunk of an /export response
+
+def valid_date(text):
+    """True for a YYYY-MM-DD date"""
+    return (len(text) == 10 and text[4] == "-" and text[7] == "-"
+            and (text[:4] + text[5:7] + text[8:]).isdigit())
+
+def send_chunk(cl, data):
+    """Send one chunk of a chunked HTTP/1.1 response"""
+    data = data.encode()
+    cl.send("{:X}\r\n".format(len(data)))
+    cl.send(data)
+    cl.send("\r\n")
+
+def export_row(day, columns, fields):
+    """One JSON line for a log row; numbers are kept as written in the log"""
+    parts = ['"Date": "{}"'.format(day)]
+    for name, value in zip(columns, fields):
+        if name == "Time":
+            value = json.dumps(value)
+        else:
+            try:
+                float(value)
+                if "n" in value.lower():
+                    value = "null"  # nan and inf are not JSON
+            except ValueError:
+                value = "null"
+        parts.append("{}: {}".format(json.dumps(name), value))
+    return "{" + ", ".join(parts) + "}\n"
+
+def serve_export(cl, params):
+    """Stream the daily logs from..to (inclusive) as one CSV or JSON-lines download.
+
+    Each row gets its date and loses its checksum (rows that fail it are
+    skipped). The CSV header is only repeated when a file's columns differ
+    from the previous file's. Files are read line by line and sent as chunks,
+    so memory use is the same for one day or a year."""
+    fmt = params.get("format", "csv")
+    start = params.get("from", "")
+    end = params.get("to", "9999-12-31")
+    if fmt not in ("csv", "jsonl") or not all(
+            valid_date(params[key]) for key in ("from", "to") if key in params):
+        send_json(cl, {"error": "use from=YYYY-MM-DD&to=YYYY-MM-DD&format=csv|jsonl"},
+                  "400 Bad Request")
+        return
+
+    files = [f for f in os.listdir() if f.endswith(".log") and start <= f[:10] <= end]
+    files.sort()
+    name = "{}_{}_{}.{}".format(NODE_NAME, files[0][:10] if files else start,
+                                files[-1][:10] if files else end, fmt)
+    cl.send("HTTP/1.1 200 OK\r\n")
+    cl.send("Content-Type: {}\r\n".format("text/csv" if fmt == "csv" else "application/x-ndjson"))
+    cl.send("Content-Disposition: attachment; filename=\"{}\"\r\n".format(name))
+    cl.send("Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+
+    header = None
+    rows = 0
+    buf = []
+    size = 0
+    for filename in files:
+        day = filename[:10]
+        try:
+            with open(filename) as f:
+                columns, framed = read_log_header(f)
+                if fmt == "csv" and columns != header:
+                    buf.append("Date, " + ", ".join(columns) + "\n")
+                header = columns
+                for line in f:
+                    if line.startswith("#"):
+                        # Mode markers such as #deadband stay with their rows
+                        if fmt == "csv":
+                            out = line
+                        else:
+                            out = '{{"Date": "{}", "marker": {}}}\n'.format(day, json.dumps(line.strip()))
+                    else:
+                        fields = parse_log_line(line, framed)
+                        if not fields or not fields[0]:
+                            continue
+                        if fmt == "csv":
+                            out = day + ", " + ", ".join(fields) + "\n"
+                        else:
+                            out = export_row(day, columns, fields)
+                        rows += 1
+                    buf.append(out)
+                    size += len(out)
+                    if size >= EXPORT_CHUNK:
+                        send_chunk(cl, "".join(buf))
+                        buf = []
+                        size = 0
+        except Exception as e:
+            print("Export error in {}:".format(filename), e)
+        gc.collect()
+    if buf:
+        send_chunk(cl, "".join(buf))
+    cl.send("0\r\n\r\n")
+    print("Exported {} rows from {} files".format(rows, len(files)))
+
+TAIL_BLOCK = 512  # Bytes read per step when reading a log backwards
+TAIL_MAX = 200  # Most records /logs/<file>/tail returns
+
+def tail_records(filename, n):
+    """Last n complete records of a log file, oldest first.
+
+    The file is read backwards from the end in TAIL_BLOCK steps until n
+    records are found, so time and memory depend on n, not on the file size.
+    A record still being written (no newline yet), markers and records that
+    fail their checksum are skipped. Returns (columns, rows, bytes read, size)."""
+    size = os.stat(filename)[6]
+    with open(filename) as f:
+        columns, framed = read_log_header(f)
+    rows = []
+    pos = size
+    rest = None  # None until the end of the last complete record is found
+    with open(filename, "rb") as f:
+        while pos > 0 and len(rows) < n:
+            step = min(TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            if rest is None:
+                end = block.rfind(b"\n")
+                if end < 0:
+                    continue  # Still inside the unfinished record
+                block, rest = block[:end], b""
+            lines = (block + rest).split(b"\n")
+            # The first line may continue in the previous block
+            rest = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                line = line.decode()
+                if not line or line.startswith(("Time", "#")):
+                    continue
+                fields = parse_log_line(line, framed)
+                if fields and fields[0]:
+                    rows.append(fields)
+                    if len(rows) >= n:
+                        break
+    rows.reverse()
+    return columns, rows, size - pos, size
+
+def tail_value(value):
+    """A log field as a JSON number, None when empty or not a number"""
+    try:
+        value = float(value)
+    except ValueError:
+        return None
+    return value if value == value and abs(value) != float("inf") else None
+
+def serve_tail(cl, filename, params):
+    """Serve /logs/<file>/tail?n=N as an HTML table, or JSON with format=json"""
+    fmt = params.get("format", "html")
+    try:
+        n = max(1, min(int(params.get("n", 20)), TAIL_MAX))
+    except ValueError:
+        n = 0
+    if not n or fmt not in ("html", "json"):
+        send_json(cl, {"error": "use n=1..{}&format=html|json".format(TAIL_MAX)}, "400 Bad Request")
+        return
+    try:
+        columns, rows, read, size = tail_records(filename, n)
+    except OSError:
+        send_json(cl, {"error": "File not found"}, "404 Not Found")
+        return
+
+    if fmt == "json":
+        send_json(cl, {"file": filename, "size": size, "bytes_read": read, "columns": columns,
+                       "rows": [[r[0]] + [tail_value(v) for v in r[1:]] for r in rows]})
+        return
+
+    cl.send("""\
+HTTP/1.1 200 OK
+Content-Type: text/html; charset=UTF-8
+Connection: close
+
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>BreadBoard - {fname}</title>
+<style>
+  body {{ font-family: Arial, sans-serif; font-size: 16px; margin: 10px; background: #f5f5f5; }}
+  table {{ border-collapse: collapse; background: white; }}
+  th, td {{ padding: 4px 8px; text-align: right; border-bottom: 1px solid #ddd; white-space: nowrap; }}
+  th {{ background-color: #0066cc; color: white; }}
+  a {{ color: #0066cc; font-weight: bold; margin-right: 12px; }}
+  .info {{ color: #666; margin: 10px 0; }}
+</style>
+</head>
+<body>
+<h3>{fname} - last {count} records</h3>
+<div class="info">Read {read} of {size} bytes</div>
+<div><a href="/logs">&larr; Logs</a><a href="?n={n}">&#8635; Refresh</a><a href="?n={more}">More</a><a href="?n={n}&format=json">JSON</a></div>
+<div style="overflow-x: auto;"><table>
+<tr><th>{header}</th></tr>
+""".format(fname=filename, count=len(rows), read=read, size=size, n=n,
+           more=min(n * 2, TAIL_MAX), header="</th><th>".join(columns)))
+    # Newest first, sent in small batches to keep memory flat
+    chunk = []
+    for fields in reversed(rows):
+        chunk.append("<tr><td>" + "</td><td>".join(fields) + "</td></tr>\n")
+        if len(chunk) >= 20:
+            cl.send("".join(chunk))
+            chunk = []
+    cl.send("".join(chunk) + "</table></div>\n</body>\n</html>\n")
+
 def get_battery_status(voltage):
     """Get battery status string and color"""
     if voltage is None:
@@ -422,6 +2931,9 @@ def get_battery_status(voltage):
     else:
         return "Low", "#dc3545"
 
+# Units shown on the live page where they differ from the log header
+DISPLAY_UNITS = {"C": "°C", "Ohm": "Ω"}
+
 def get_light_status(lux):
     """Get light level description"""
     if lux is None:
@@ -437,8 +2949,15 @@ def get_light_status(lux):
     else:
         return "Very Bright", "#ff5722"
 
-def start_server(sensor, light_sensor, adc, wlan):
-    """Web server thread for displaying current readings"""
+def start_server(wifi, iaq, burst):
+    """Web server thread, serves while the Wi-Fi link is up"""
+    while True:
+        if wifi.connected:
+            serve_http(wifi, iaq, burst)
+        time.sleep(1)
+
+def serve_http(wifi, iaq, burst):
+    """Listen on port 80 until the Wi-Fi link goes down"""
     addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
     s = socket.socket()
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -446,16 +2965,20 @@ def start_server(sensor, light_sensor, adc, wlan):
     try:
         s.bind(addr)
         s.listen(1)
+        s.settimeout(1)  # Wake up regularly to check the link
         print("Web server listening on port 80")
 
-        while True:
+        while wifi.connected:
             try:
-                cl, addr = s.accept()
+                try:
+                    cl, addr = s.accept()
+                except OSError:
+                    continue  # Accept timed out
+                cl.settimeout(10)
                 print("Client connected from", addr)
                 
                 try:
                     request = cl.recv(1024).decode('utf-8')
-                    gc.collect()
                     
                     # Parse the request
                     request_lines = request.split('\r\n')
@@ -464,6 +2987,7 @@ def start_server(sensor, light_sensor, adc, wlan):
                     path = request_line.split(' ')[1] if len(request_line.split(' ')) > 1 else '/'
                     
                     print("Request: {} {}".format(method, path))
+                    path, params = parse_query(path)
                     
                     # Handle DELETE requests
                     if method == 'DELETE' and path.startswith('/delete/'):
@@ -489,20 +3013,89 @@ def start_server(sensor, light_sensor, adc, wlan):
                     # Handle file download requests
                     if path.startswith('/download/'):
                         filename = path.replace('/download/', '')
-                        if filename.endswith('.log') and not '/' in filename and not '..' in filename:
+                        if is_data_file(filename):
                             serve_log_file(cl, filename)
                             cl.close()
                             gc.collect()
                             continue
                     
+                    # Handle tail of a log file (reads backwards from the end)
+                    if path.startswith('/logs/') and path.endswith('/tail'):
+                        filename = path[6:-5]
+                        if is_data_file(filename):
+                            serve_tail(cl, filename, params)
+                            cl.close()
+                            gc.collect()
+                            continue
+                    
+                    # Handle config API: GET the settings, POST changes or a profile
+                    if path == '/api/config':
+                        if method == 'POST':
+                            try:
+                                changes = json.loads(read_body(cl, request))
+                                if not isinstance(changes, dict):
+                                    raise ValueError("expected a JSON object")
+                                errors = config.update(changes)
+                            except ValueError as e:
+                                errors = ["invalid request: {}".format(e)]
+                            if errors:
+                                send_json(cl, {"errors": errors}, "400 Bad Request")
+                                cl.close()
+                                gc.collect()
+                                continue
+                        result = config.as_dict()
+                        # Sensors disabled at boot are only initialized after a restart
+                        result["restart_needed"] = config.restart_needed()
+                        send_json(cl, result)
+                        cl.close()
+                        gc.collect()
+                        continue
+                    
+                    # Handle log listing API (exact sizes for collectors)
+                    if path == '/api/logs':
+                        files = []
+                        for filename in os.listdir():
+                            if is_data_file(filename):
+                                files.append({"name": filename, "size": os.stat(filename)[6]})
+                        send_json(cl, {"node": NODE_NAME, "current": "{}.log".format(date_str()),
+                                       "files": files})
+                        cl.close()
+                        gc.collect()
+                        continue
+                    
+                    # Handle alerts API
+                    if path == '/api/alerts':
+                        send_json(cl, adaptive.as_dict())
+                        cl.close()
+                        gc.collect()
+                        continue
+                    
+                    # Handle metrics API
+                    if path == '/api/metrics':
+                        send_json(cl, metrics)
+                        cl.close()
+                        gc.collect()
+                        continue
+                    
+                    # Handle history API
+                    if path == '/api/history':
+                        serve_history(cl, params)
+                        cl.close()
+                        gc.collect()
+                        continue
+                    
+                    # Handle multi-day export (one chunked download)
+                    if path == '/export':
+                        serve_export(cl, params)
+                        cl.close()
+                        gc.collect()
+                        continue
+                    
                     # Handle logs page
                     if path == '/logs':
                         log_files = get_log_files()
                         
-                        if wlan.isconnected():
-                            ip_address = wlan.ifconfig()[0]
-                        else:
-                            ip_address = "Disconnected"
+                        ip_address = wifi.ip()
                         
                         current_log = "{}.log".format(date_str())
                         
@@ -534,6 +3127,8 @@ Connection: close
   .btn-delete:hover {{ background: #c82333; }}
   .btn-delete:disabled {{ background: #ccc; cursor: not-allowed; }}
   .actions {{ display: flex; gap: 10px; align-items: center; }}
+  .export {{ background: white; padding: 12px; margin: 20px 0; font-size: 18px; }}
+  .export input, .export select, .export button {{ font-size: 16px; margin: 0 6px; }}
   .current-badge {{ background: #28a745; color: white; padding: 2px 8px; border-radius: 3px; 
                     font-size: 14px; font-weight: bold; }}
 </style>
@@ -579,7 +3174,16 @@ function deleteFile(filename) {{
 <div class="nav">
 <a href="/">← Back to Live Readings</a>
 </div>
-""".format(ip=ip_address, count=len(log_files), current=current_log)
+<form class="export" action="/export">
+<strong>Export:</strong>
+from <input type="date" name="from" value="{first}">
+to <input type="date" name="to" value="{last}">
+<select name="format"><option value="csv">CSV</option><option value="jsonl">JSON lines</option></select>
+<button type="submit">⬇ Download</button>
+</form>
+""".format(ip=ip_address, count=len(log_files), current=current_log,
+           first=min([f[:10] for f, size in log_files if f.endswith(".log")] or [current_log[:10]]),
+           last=current_log[:10])
 
                         if log_files:
                             response += """
@@ -603,12 +3207,13 @@ function deleteFile(filename) {{
 <td>{size:.1f} KB</td>
 <td>
 <div class="actions">
+<a href="/logs/{fname}/tail?n=20">👁 Tail</a>
 <a href="/download/{fname}">⬇ Download</a>
 {delete_btn}
 </div>
 </td>
 </tr>
-""".format(date=filename.replace('.log', ''), fname=filename, size=size_kb, 
+""".format(date=filename[:-4], fname=filename, size=size_kb, 
            badge=current_badge, delete_btn=delete_btn)
                             
                             response += "</table>"
@@ -620,7 +3225,8 @@ function deleteFile(filename) {{
 <a href="/">← Back to Live Readings</a>
 </div>
 <div style="margin-top: 30px; padding: 15px; background: #fff3cd; border-left: 4px solid #ffc107;">
-<p style="margin: 0; font-size: 16px;"><strong>Note:</strong> The current day's log file cannot be deleted (protected).</p>
+<p style="margin: 0; font-size: 16px;"><strong>Note:</strong> The current day's log file cannot be deleted (protected).
+Older days are rolled into monthly <code>.sum</code> files of hourly averages before they are removed.</p>
 </div>
 </body>
 </html>
@@ -630,39 +3236,65 @@ function deleteFile(filename) {{
                         gc.collect()
                         continue
 
-                    # Default: show live readings
-                    readings = read_sensor(sensor)
-                    battery_voltage = read_battery_voltage(adc)
-                    light_lux = read_light_sensor(light_sensor)
+                    # Default: show the last scheduled sample. Reading the sensors from
+                    # here would reset their cadence and start conversions mid-sample.
+                    with sensor_lock:
+                        sampled = registry.sampled
+                        readings = registry.snapshot(sampled or time.time())
                     
                     # Get current IP (may change if reconnected)
-                    if wlan.isconnected():
-                        ip_address = wlan.ifconfig()[0]
-                    else:
-                        ip_address = "Disconnected"
+                    ip_address = wifi.ip()
 
-                    now = time.localtime(time.time() + UTC_OFFSET)
+                    now = time.localtime((sampled or time.time()) + UTC_OFFSET)
                     ts = "{:02d}:{:02d}:{:02d} {:02d}/{:02d}/{}".format(
                         now[3], now[4], now[5],
                         now[2], now[1], now[0]
                     )
 
-                    if readings:
-                        # Battery status
-                        battery_status, battery_color = get_battery_status(battery_voltage)
-                        battery_display = ""
-                        if battery_voltage is not None:
-                            battery_display = """
-<p>Battery: <span class="value" style="color: {color};">{voltage:.2f}V ({status})</span></p>
-""".format(voltage=battery_voltage, status=battery_status, color=battery_color)
+                    if any(value is not None for value in readings.values()):
+                        # One line per registry channel (N/A when missing), air quality after the gas reading
+                        sensor_display = ""
+                        for key, header, label, unit, fmt in registry.channels():
+                            if key.startswith("age_"):
+                                continue
+                            value = readings.get(key)
+                            color = "#0066cc"
+                            if value is None:
+                                text = "N/A"
+                            else:
+                                text = fmt.format(value) + " " + DISPLAY_UNITS.get(unit, unit)
+                                if unit == "lux":
+                                    status, color = get_light_status(value)
+                                    text += " ({})".format(status)
+                                elif unit == "V":
+                                    status, color = get_battery_status(value)
+                                    text += " ({})".format(status)
+                            sensor_display += """<p>{label}: <span class="value" style="color: {color};">{text}</span></p>
+""".format(label=label, color=color, text=text)
+                            if key == "gas" and iaq is not None:
+                                iaq_status, iaq_color = get_iaq_status(iaq.iaq)
+                                iaq_value = "--" if iaq.iaq is None else "{:.0f}".format(iaq.iaq)
+                                sensor_display += """<p>Air Quality (IAQ): <span class="value" style="color: {color};">{value} ({status})</span></p>
+""".format(value=iaq_value, status=iaq_status, color=iaq_color)
                         
-                        # Light status
-                        light_status, light_color = get_light_status(light_lux)
-                        light_display = ""
-                        if light_lux is not None:
-                            light_display = """
-<p>Light Level: <span class="value" style="color: {color};">{lux:.1f} lux ({status})</span></p>
-""".format(lux=light_lux, status=light_status, color=light_color)
+                        # Active alerts and the current sample interval
+                        alert_display = ""
+                        state = adaptive.as_dict()
+                        for event in state["active"]:
+                            alert_display += """<p style="color: #dc3545;">⚠ <strong>{}</strong></p>
+""".format(event["message"])
+                        alert_display += "<p>Sampling every <span class=\"value\">{} s</span>{}</p>\n".format(
+                            state["interval"], " (adaptive)" if state["adaptive"] else "")
+                        
+                        # Last burst interval statistics
+                        burst_display = ""
+                        if burst is not None and burst.last:
+                            burst_display = "<hr>\n<p>Last interval (min / mean / max, &sigma;):</p>\n"
+                            for channel, unit in (("temperature", "°C"), ("pressure", "hPa"), ("humidity", "%")):
+                                stats = burst.last.get(channel)
+                                if stats:
+                                    burst_display += """<p>{name}: <span class="value">{min:.2f} / {mean:.2f} / {max:.2f} {unit}, &sigma; {std:.3f}</span> ({count} samples)</p>
+""".format(name=channel.capitalize(), unit=unit, **stats)
                         
                         response = """\
 HTTP/1.1 200 OK
@@ -693,12 +3325,10 @@ Connection: close
 <p>Sensor IP: <span class="value">{ip}</span></p>
 <p>Timestamp: <span class="value">{ts}</span></p>
 <hr>
-<p>Temperature: <span class="value">{temp:.2f} °C</span></p>
-<p>Pressure: <span class="value">{press:.2f} hPa</span></p>
-<p>Humidity: <span class="value">{hum:.2f} %</span></p>
-<p>Gas Resistance: <span class="value">{gas} Ω</span></p>
-{light}
-{battery}
+{sensors}
+<hr>
+{alerts}
+{burst}
 <hr>
 <p>This page will automatically refresh every 60 seconds</p>
 </div>
@@ -709,12 +3339,9 @@ Connection: close
 </html>
 """.format(ip=ip_address,
            ts=ts,
-           temp=float(readings["temperature"]),
-           press=float(readings["pressure"]),
-           hum=float(readings["humidity"]),
-           gas=readings["gas"],
-           light=light_display,
-           battery=battery_display)
+           sensors=sensor_display,
+           alerts=alert_display,
+           burst=burst_display)
                     else:
                         response = """\
 HTTP/1.1 503 Service Unavailable
@@ -760,101 +3387,172 @@ Connection: close
 # --- Main Program ---
 
 print("\n=== ESP32-C3 BME680 + VEML7700 Datalogger Starting ===\n")
+boot_phase("startup")
+
+# Saved settings override the defaults above before anything is initialized
+config = ConfigStore(CONFIG_FILE)
+config.load()
+boot_phase("config")
+
+# Start connecting to WiFi in the background; the sensors are set up while it
+# associates and logging doesn't wait for it
+wifi = WifiManager(SSID, PASSWORD)
+wifi.poll()
 
-# Connect to WiFi
-wlan = connect_wifi(SSID, PASSWORD)
-if wlan is None:
-    print("ERROR: Cannot start without WiFi connection")
-    print("Resetting in 60 seconds...")
-    time.sleep(60)
-    machine.reset()
+# Time is synced with NTP in the background once WiFi is up
+clock = ClockService(NTP_HOST, NTP_PORT)
+boot_phase("wifi_start")
 
-# Sync time
-sync_time()
+# Repair a record torn by a power cut during the last append
+recover_log()
+boot_phase("recover_log")
 
-# Initialize I2C bus (shared by both sensors)
+# Initialize I2C bus (shared by all sensors)
 print("Initializing I2C bus...")
-i2c = I2C(0, scl=Pin(21), sda=Pin(20), freq=100000)
+i2c = I2CBus(0, I2C_SCL_PIN, I2C_SDA_PIN, I2C_FREQ)
 
-# Scan I2C bus
-print("Scanning I2C bus...")
+# Scan I2C bus; the registry creates a driver for each known device found
 devices = i2c.scan()
 if devices:
     print("Found I2C devices at:", [hex(addr) for addr in devices])
 else:
     print("WARNING: No I2C devices found!")
+boot_phase("i2c")
+
+# Find the sensors (the BME680 driver waits for the chip itself, and each
+# reading polls for the end of its conversion)
+registry = SensorRegistry()
+registry.discover(i2c, devices)
 
 # Initialize battery monitor
-print("Initializing battery monitor...")
 adc = init_battery_monitor()
 if adc:
-    test_voltage = read_battery_voltage(adc)
-    if test_voltage:
-        print("Battery voltage: {:.2f}V".format(test_voltage))
-    else:
-        print("Battery monitoring disabled or not available")
-
-# Initialize BME680 sensor
-print("Initializing BME680 sensor...")
-sensor = init_sensor(i2c)
-time.sleep(2)  # Allow sensor to stabilize
-
-# Test BME680
-print("Testing BME680...")
-test_reading = read_sensor(sensor)
-if test_reading:
-    print("BME680 OK:", test_reading)
-else:
-    print("WARNING: BME680 test failed, but continuing...")
-
-# Initialize VEML7700 light sensor
-print("Initializing VEML7700 light sensor...")
-light_sensor = init_light_sensor(i2c)
-if light_sensor:
-    test_light = read_light_sensor(light_sensor)
-    if test_light is not None:
-        print("VEML7700 OK: {:.1f} lux".format(test_light))
-    else:
-        print("WARNING: VEML7700 read failed")
-else:
-    print("VEML7700 not available, continuing without light sensor")
+    registry.add(BatteryProbe(adc))
+
+# The first BME680 feeds burst sampling and IAQ
+sensor = registry.device("BME680")
+if sensor is None:
+    print("WARNING: No BME680 found, but continuing...")
+
+# Test all sensors with one concurrent read
+if not FAST_BOOT:
+    print("Testing sensors...")
+    print("Sensors OK:", registry.read())
+boot_phase("sensors")
+
+# Allocate the sample history buffer
+history = init_history()
+
+# Initialize IAQ calculator (restores the gas baseline from flash)
+print("Initializing IAQ calculator...")
+iaq = init_iaq()
+boot_phase("state")
 
 # Start web server in background thread
 print("Starting web server thread...")
-_thread.start_new_thread(start_server, (sensor, light_sensor, adc, wlan))
-time.sleep(1)
+burst = init_burst_sampler(sensor) if sensor is not None else None
+_thread.start_new_thread(start_server, (wifi, iaq, burst))
+boot_phase("server")
 
 print("\n=== System ready, starting logging loop ===")
-print("=== Web interface: http://{} ===\n".format(wlan.ifconfig()[0]))
+print("=== Web interface: http://breadboard.local once WiFi is up ===\n")
+
+# The sample path hardly allocates, so instead of a full collection after every
+# sample the heap is collected whenever a quarter of the free memory is used up
+gc.collect()
+gc.threshold(gc.mem_free() // 4)
 
 # Main logging loop
-last_wifi_check = time.time()
-WIFI_CHECK_INTERVAL = 300  # Check WiFi every 5 minutes
+last_iaq_save = time.time()
+adaptive = AdaptiveSampler(LOG_INTERVAL)
+deadband = DeadbandFilter()
+presync = PresyncBuffer(PRESYNC_FILE)
+scheduler = Scheduler(adaptive.interval)
+clock.on_step = scheduler.align
+uplink = init_uplink()
+
+def apply_config():
+    """Apply settings changed through /api/config to the globals and drivers"""
+    changes = config.take_pending()
+    if not changes:
+        return
+    globals().update(changes)
+    with sensor_lock:
+        try:
+            for bme in registry.devices("BME680"):
+                configure_sensor(bme)
+            if burst is not None:
+                sensor.gas_enabled = False  # Heater stays off until the next logged reading
+            for veml in registry.devices("VEML7700"):
+                veml.configure(VEML7700_IT, VEML7700_GAIN)
+        except Exception as e:
+            print("Config apply error:", e)
+    if any(key == "LOG_INTERVAL" or key.startswith("ADAPTIVE_") for key in changes):
+        adaptive.reset(LOG_INTERVAL)
+        scheduler.set_interval(adaptive.interval)
+    print("Config applied:", changes)
+
+def idle():
+    """Background work done while waiting for the next sample"""
+    apply_config()
+    wifi.poll()
+    clock.poll(wifi.connected)
+    if uplink is not None:
+        uplink.poll(wifi.connected, scheduler.remaining_ms())
+    if burst is not None:
+        burst.poll()
 
 while True:
     try:
-        # Periodic WiFi reconnection check
-        if time.time() - last_wifi_check > WIFI_CHECK_INTERVAL:
-            check_wifi_reconnect(wlan, SSID, PASSWORD)
-            last_wifi_check = time.time()
+        # Sleep until the next aligned slot (the first sample is taken at once)
+        slot = scheduler.wait(idle)
         
-        # Read sensor data
-        readings = read_sensor(sensor)
+        # Read every sensor in the registry, conversions overlapping
+        if burst is not None:
+            burst.stop()
+        readings = registry.read(slot)
         
-        # Read battery voltage
-        battery_voltage = read_battery_voltage(adc)
+        # In burst mode log the interval means of T/P/H
+        if burst is not None and readings["temperature"] is not None:
+            burst.add(readings)
+            burst.finish(readings)
         
-        # Read light level
-        light_lux = read_light_sensor(light_sensor)
+        # Update air quality and checkpoint its baseline
+        if iaq is not None and readings.get("humidity") is not None and not readings.get("age_gas"):
+            readings["iaq"] = iaq.update(readings["gas"], readings["humidity"])
+            if time.time() - last_iaq_save > IAQ_SAVE_INTERVAL:
+                save_iaq_state(iaq)
+                last_iaq_save = time.time()
         
         # Log data
-        if readings:
-            log_reading(readings, battery_voltage, light_lux, MAX_LOG_FILES)
+        if any(value is not None for value in readings.values()):
+            if not rtc_valid():
+                presync.hold(readings)  # Logged once NTP has set the date
+            else:
+                if presync.waiting:
+                    presync.flush(MAX_LOG_FILES)
+                    check_iaq_age(iaq)
+                log_reading(readings, MAX_LOG_FILES, slot)
+            
+            # Check alerts and pick the next interval from the rate of change
+            raised = metrics["alerts_raised"]
+            interval = adaptive.update(readings, slot)
+            if interval != scheduler.interval:
+                print("Sample interval {} s -> {} s".format(scheduler.interval, interval))
+                scheduler.set_interval(interval)
+            if uplink is not None:
+                # Each radio wake-up carries at least a minimum batch, alerts go out at once
+                uplink.interval = max(UPLINK_INTERVAL, interval * UPLINK_BATCH_MIN)
+                if metrics["alerts_raised"] != raised:
+                    uplink.push_now()
+            if "boot_first_sample_ms" not in metrics:
+                metrics["boot_first_sample_ms"] = time.ticks_ms()
+                print("First sample logged {} ms after reset".format(metrics["boot_first_sample_ms"]))
         else:
             print("Skipping log - no sensor data")
         
-        gc.collect()
-        time.sleep(LOG_INTERVAL)
+        if burst is not None:
+            burst.start()
         
     except KeyboardInterrupt:
         print("\nStopping datalogger...")
@@ -862,5 +3560,3 @@ while True:
     except Exception as e:
         print("Main loop error:", e)
         gc.collect()
-
-        time.sleep(LOG_INTERVAL)
@@ -52,8 +52,11 @@ _BME680_BME680_COEFF_ADDR1 = const(0x89)
 _BME680_BME680_COEFF_ADDR2 = const(0xE1)
 _BME680_BME680_RES_HEAT_0 = const(0x5A)
 _BME680_BME680_GAS_WAIT_0 = const(0x64)
+_BME680_HEATER_SLOTS = const(10)
 
 _BME680_REG_SOFTRESET = const(0xE0)
+_BME680_RESET_TIMEOUT = const(10)  # ms to wait for the chip ID after a soft reset
+_BME680_REG_CTRL_GAS_0 = const(0x70)
 _BME680_REG_CTRL_GAS = const(0x71)
 _BME680_REG_CTRL_HUM = const(0x72)
 _BME280_REG_STATUS = const(0xF3)
@@ -70,6 +73,12 @@ _BME680_SAMPLERATES = (0, 1, 2, 4, 8, 16)
 _BME680_FILTERSIZES = (0, 1, 3, 7, 15, 31, 63, 127)
 
 _BME680_RUNGAS = const(0x10)
+_BME680_HEAT_OFF = const(0x08)
+
+# Rough supply figures used to estimate the energy of one measurement
+_SUPPLY_VOLTAGE = 3.3  # V
+_TPH_CURRENT_MA = 0.9  # mA while converting temperature/pressure/humidity
+_HEATER_CURRENT_MA = 12.0  # mA while the gas heater holds its set point
 
 _LOOKUP_TABLE_1 = (2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0,
                    2126008810.0, 2147483647.0, 2130303777.0, 2147483647.0, 2147483647.0,
@@ -81,37 +90,119 @@ _LOOKUP_TABLE_2 = (4096000000.0, 2048000000.0, 1024000000.0, 512000000.0, 255744
                    500000.0, 250000.0, 125000.0)
 
 
-def _read24(arr):
-    """Parse an unsigned 24-bit value as a floating point and return it."""
-    ret = 0.0
-    #print([hex(i) for i in arr])
-    for b in arr:
-        ret *= 256.0
-        ret += float(b & 0xFF)
-    return ret
+# Compensation formulas, shared by the driver and by code that compensates logged ADC
+# words with saved coefficients (see ``compensate``)
+def _calc_t_fine(adc_temp, temp_calibration):
+    var1 = (adc_temp / 8) - (temp_calibration[0] * 2)
+    var2 = (var1 * temp_calibration[1]) / 2048
+    var3 = ((var1 / 2) * (var1 / 2)) / 4096
+    var3 = (var3 * temp_calibration[2] * 16) / 16384
+    return int(var2 + var3)
+
+
+def _calc_pressure(adc_pres, t_fine, pressure_calibration):
+    var1 = (t_fine / 2) - 64000
+    var2 = ((var1 / 4) * (var1 / 4)) / 2048
+    var2 = (var2 * pressure_calibration[5]) / 4
+    var2 = var2 + (var1 * pressure_calibration[4] * 2)
+    var2 = (var2 / 4) + (pressure_calibration[3] * 65536)
+    var1 = (((((var1 / 4) * (var1 / 4)) / 8192) *
+            (pressure_calibration[2] * 32) / 8) +
+            ((pressure_calibration[1] * var1) / 2))
+    var1 = var1 / 262144
+    var1 = ((32768 + var1) * pressure_calibration[0]) / 32768
+    calc_pres = 1048576 - adc_pres
+    calc_pres = (calc_pres - (var2 / 4096)) * 3125
+    calc_pres = (calc_pres / var1) * 2
+    var1 = (pressure_calibration[8] * (((calc_pres / 8) * (calc_pres / 8)) / 8192)) / 4096
+    var2 = ((calc_pres / 4) * pressure_calibration[7]) / 8192
+    var3 = (((calc_pres / 256) ** 3) * pressure_calibration[9]) / 131072
+    calc_pres += ((var1 + var2 + var3 + (pressure_calibration[6] * 128)) / 16)
+    return calc_pres/100
+
+
+def _calc_humidity(adc_hum, t_fine, humidity_calibration):
+    temp_scaled = ((t_fine * 5) + 128) / 256
+    var1 = ((adc_hum - (humidity_calibration[0] * 16)) -
+            ((temp_scaled * humidity_calibration[2]) / 200))
+    var2 = (humidity_calibration[1] *
+            (((temp_scaled * humidity_calibration[3]) / 100) +
+             (((temp_scaled * ((temp_scaled * humidity_calibration[4]) / 100)) /
+               64) / 100) + 16384)) / 1024
+    var3 = var1 * var2
+    var4 = humidity_calibration[5] * 128
+    var4 = (var4 + ((temp_scaled * humidity_calibration[6]) / 100)) / 16
+    var5 = ((var3 / 16384) * (var3 / 16384)) / 1024
+    var6 = (var4 * var5) / 2
+    calc_hum = (((var3 + var6) / 1024) * 1000) / 4096
+    calc_hum /= 1000  # get back to RH
+
+    if calc_hum > 100:
+        calc_hum = 100
+    if calc_hum < 0:
+        calc_hum = 0
+    return calc_hum
+
+
+def _calc_gas(adc_gas, gas_range, sw_err):
+    var1 = ((1340 + (5 * sw_err)) * (_LOOKUP_TABLE_1[gas_range])) / 65536
+    var2 = ((adc_gas * 32768) - 16777216) + var1
+    var3 = (_LOOKUP_TABLE_2[gas_range] * var1) / 512
+    calc_gas_res = (var3 + (var2 / 2)) / var2
+    return int(calc_gas_res)
+
+
+def compensate(calibration, adc_temp, adc_pres, adc_hum, adc_gas=None, gas_range=None):
+    """Compensate ADC words (see ``raw``) with coefficients saved from ``calibration``.
+       Returns (temperature, pressure, humidity, gas), gas None without gas words."""
+    t_fine = _calc_t_fine(adc_temp, calibration["temperature"])
+    gas = None
+    if adc_gas is not None and gas_range is not None:
+        gas = _calc_gas(adc_gas, gas_range, calibration["sw_err"])
+    return ((((t_fine * 5) + 128) / 256) / 100,
+            _calc_pressure(adc_pres, t_fine, calibration["pressure"]),
+            _calc_humidity(adc_hum, t_fine, calibration["humidity"]),
+            gas)
 
 
 class Adafruit_BME680:
     """Driver from BME680 air quality sensor
 
        :param int refresh_rate: Maximum number of readings per second. Faster property reads
-         will be from the previous reading."""
-    def __init__(self, *, refresh_rate=10):
+         will be from the previous reading.
+       :param dict calibration: Coefficients saved from ``calibration`` of an earlier run. They
+         are used instead of reading the calibration registers if they match this chip."""
+    def __init__(self, *, refresh_rate=10, calibration=None):
         """Check the BME680 was found, read the coefficients and enable the sensor for continuous
            reads."""
-        self._write(_BME680_REG_SOFTRESET, [0xB6])
-        time.sleep(0.005)
-
-        # Check device ID.
-        chip_id = self._read_byte(_BME680_REG_CHIPID)
-        if chip_id != _BME680_CHIPID:
-            raise RuntimeError('Failed to find BME680! Chip ID 0x%x' % chip_id)
-
-        self._read_calibration()
-
-        # set up heater
-        self._write(_BME680_BME680_RES_HEAT_0, [0x73])
-        self._write(_BME680_BME680_GAS_WAIT_0, [0x65])
+        # Reused for register I/O, so a reading allocates no buffers
+        self._byte = bytearray(1)
+        self._data = bytearray(15)
+
+        self._write_byte(_BME680_REG_SOFTRESET, 0xB6)
+
+        # Check device ID, polling until the chip is back from reset (2 ms typical)
+        start = time.ticks_ms()
+        while True:
+            try:
+                chip_id = self._read_byte(_BME680_REG_CHIPID)
+            except OSError:
+                chip_id = None
+            if chip_id == _BME680_CHIPID:
+                break
+            if time.ticks_diff(time.ticks_ms(), start) > _BME680_RESET_TIMEOUT:
+                raise RuntimeError('Failed to find BME680! Chip ID %s' % chip_id)
+            time.sleep_ms(1)
+
+        self.calibration_cached = False
+        """True if the coefficients came from ``calibration`` instead of the chip."""
+        fingerprint = hex(self._read(_BME680_BME680_COEFF_ADDR2, 16)).decode()
+        if calibration and calibration.get("fingerprint") == fingerprint:
+            self.calibration = calibration
+            self.calibration_cached = True
+        else:
+            self._read_calibration()
+            self._fingerprint = fingerprint
 
         self.sea_level_pressure = 1013.25
         """Pressure in hectoPascals at sea level. Used to calibrate ``altitude``."""
@@ -132,6 +223,42 @@ class Adafruit_BME680:
         self._last_reading = time.ticks_ms()
         self._min_refresh_time = 1000 // refresh_rate
 
+        # set up heater: 320C for 150ms in slot 0, the Bosch default
+        self._heater_profile = []
+        self._res_heat = []  # Heater resistance register value of each profile step
+        self.ambient_temperature = 25
+        self._gas_enabled = True
+        self._heater_step = 0
+        self._last_heater_step = None
+        self._pending_step = None
+        self.set_heater(320, 150)
+
+    @property
+    def calibration(self):
+        """The parsed calibration coefficients, to be saved and passed back as ``calibration``
+           on the next start. ``fingerprint`` identifies the chip they belong to."""
+        return {
+            "fingerprint": self._fingerprint,
+            "temperature": self._temp_calibration,
+            "pressure": self._pressure_calibration,
+            "humidity": self._humidity_calibration,
+            "gas": self._gas_calibration,
+            "heat_range": self._heat_range,
+            "heat_val": self._heat_val,
+            "sw_err": self._sw_err,
+        }
+
+    @calibration.setter
+    def calibration(self, values):
+        self._fingerprint = values["fingerprint"]
+        self._temp_calibration = values["temperature"]
+        self._pressure_calibration = values["pressure"]
+        self._humidity_calibration = values["humidity"]
+        self._gas_calibration = values["gas"]
+        self._heat_range = values["heat_range"]
+        self._heat_val = values["heat_val"]
+        self._sw_err = values["sw_err"]
+
     @property
     def pressure_oversample(self):
         """The oversampling for pressure sensor"""
@@ -176,10 +303,135 @@ class Adafruit_BME680:
     @filter_size.setter
     def filter_size(self, size):
         if size in _BME680_FILTERSIZES:
-            self._filter = _BME680_FILTERSIZES[size]
+            self._filter = _BME680_FILTERSIZES.index(size)
         else:
             raise RuntimeError("Invalid size")
 
+    @property
+    def gas_enabled(self):
+        """Whether readings run the gas heater. When False the heater stays off, ``gas``
+           returns None and each reading only takes the T/P/H conversion time."""
+        return self._gas_enabled
+
+    @gas_enabled.setter
+    def gas_enabled(self, enabled):
+        self._gas_enabled = bool(enabled)
+        self._write_byte(_BME680_REG_CTRL_GAS_0, 0 if self._gas_enabled else _BME680_HEAT_OFF)
+
+    def set_heater(self, temperature, duration):
+        """Use a single heater step: target ``temperature`` in degrees C (200-400) held for
+           ``duration`` ms (1-4032)."""
+        self.set_heater_profile([(temperature, duration)])
+
+    def set_heater_profile(self, steps):
+        """Program the heater profile slots from a list of up to 10 ``(temperature,
+           duration)`` steps. Each reading runs the next step, so consecutive gas readings
+           cycle through the profile; ``heater_step`` tells which step produced ``gas``."""
+        if not 1 <= len(steps) <= _BME680_HEATER_SLOTS:
+            raise RuntimeError("Invalid heater profile")
+        profile = []
+        res_heats = []
+        for slot, (temperature, duration) in enumerate(steps):
+            temperature = min(max(temperature, 200), 400)
+            if not 1 <= duration <= 4032:
+                raise RuntimeError("Invalid heater duration")
+            res_heat = self._calc_res_heat(temperature)
+            self._write_byte(_BME680_BME680_RES_HEAT_0 + slot, res_heat)
+            self._write_byte(_BME680_BME680_GAS_WAIT_0 + slot, self._calc_gas_wait(duration))
+            profile.append((temperature, duration))
+            res_heats.append(res_heat)
+        self._heater_profile = profile
+        self._res_heat = res_heats
+        self._heater_step = 0
+
+    @property
+    def ambient_temperature(self):
+        """Ambient temperature in degrees C used to compute the heater resistance. Updated
+           from each reading; the heater resistance of each profile step is derived again
+           and written when its register value changes."""
+        return self._ambient_temperature
+
+    @ambient_temperature.setter
+    def ambient_temperature(self, temperature):
+        self._ambient_temperature = temperature
+        for slot, (target, duration) in enumerate(self._heater_profile):
+            res_heat = self._calc_res_heat(target)
+            if res_heat != self._res_heat[slot]:
+                self._write_byte(_BME680_BME680_RES_HEAT_0 + slot, res_heat)
+                self._res_heat[slot] = res_heat
+
+    @property
+    def heater_profile(self):
+        """The programmed ``(temperature, duration)`` heater steps"""
+        return list(self._heater_profile)
+
+    @property
+    def heater_step(self):
+        """The heater profile step used by the last gas reading, or None"""
+        return self._last_heater_step
+
+    def measurement_time(self, step=None):
+        """Duration in ms of one forced measurement using heater ``step`` (default: the next
+           one), or of a gas-off measurement when gas is disabled or ``step`` is -1."""
+        cycles = (_BME680_SAMPLERATES[self._temp_oversample] +
+                  _BME680_SAMPLERATES[self._pressure_oversample] +
+                  _BME680_SAMPLERATES[self._humidity_oversample])
+        # Bosch bme68x_get_meas_dur: 1963us per conversion cycle, TPH switching, gas
+        # measurement and 1ms wake-up, rounded up to whole ms
+        duration = (cycles * 1963 + 477 * 4 + 477 * 5 + 1000 + 999) // 1000
+        heat = self._heat_duration(step)
+        return duration + heat
+
+    def measurement_energy(self, step=None):
+        """Estimated energy in mJ of one forced measurement, see ``measurement_time``"""
+        heat = self._heat_duration(step)
+        tph = self.measurement_time(step) - heat
+        return _SUPPLY_VOLTAGE * (_TPH_CURRENT_MA * tph + _HEATER_CURRENT_MA * heat) / 1000
+
+    def profile_costs(self):
+        """Time (ms) and energy (mJ) per measurement for each heater step and for gas-off,
+           as a list of dicts."""
+        costs = []
+        for step, (temperature, duration) in enumerate(self._heater_profile):
+            costs.append({"step": step, "temperature": temperature, "duration": duration,
+                          "time_ms": self.measurement_time(step),
+                          "energy_mj": self.measurement_energy(step)})
+        costs.append({"step": None, "temperature": None, "duration": 0,
+                      "time_ms": self.measurement_time(-1),
+                      "energy_mj": self.measurement_energy(-1)})
+        return costs
+
+    def _heat_duration(self, step):
+        if step is None:
+            if not self._gas_enabled:
+                return 0
+            step = self._heater_step
+        if step < 0:
+            return 0
+        return self._heater_profile[step][1]
+
+    def _calc_res_heat(self, temperature):
+        """Heater resistance register value for a target temperature (Bosch float formula)"""
+        var1 = (self._gas_calibration[0] / 16.0) + 49.0
+        var2 = ((self._gas_calibration[1] / 32768.0) * 0.0005) + 0.00235
+        var3 = self._gas_calibration[2] / 1024.0
+        var4 = var1 * (1.0 + (var2 * temperature))
+        var5 = var4 + (var3 * self._ambient_temperature)
+        res_heat = 3.4 * ((var5 * (4.0 / (4.0 + self._heat_range)) *
+                           (1.0 / (1.0 + (self._heat_val * 0.002)))) - 25)
+        return min(max(int(res_heat), 0), 0xFF)
+
+    @staticmethod
+    def _calc_gas_wait(duration):
+        """Gas wait register value for a heater duration in ms (6 bit value, 2 bit x4 factor)"""
+        if duration >= 0xFC0:
+            return 0xFF
+        factor = 0
+        while duration > 0x3F:
+            duration //= 4
+            factor += 1
+        return duration + (factor * 64)
+
     @property
     def temperature(self):
         """The compensated temperature in degrees celsius."""
@@ -191,49 +443,13 @@ class Adafruit_BME680:
     def pressure(self):
         """The barometric pressure in hectoPascals"""
         self._perform_reading()
-        var1 = (self._t_fine / 2) - 64000
-        var2 = ((var1 / 4) * (var1 / 4)) / 2048
-        var2 = (var2 * self._pressure_calibration[5]) / 4
-        var2 = var2 + (var1 * self._pressure_calibration[4] * 2)
-        var2 = (var2 / 4) + (self._pressure_calibration[3] * 65536)
-        var1 = (((((var1 / 4) * (var1 / 4)) / 8192) *
-                (self._pressure_calibration[2] * 32) / 8) +
-                ((self._pressure_calibration[1] * var1) / 2))
-        var1 = var1 / 262144
-        var1 = ((32768 + var1) * self._pressure_calibration[0]) / 32768
-        calc_pres = 1048576 - self._adc_pres
-        calc_pres = (calc_pres - (var2 / 4096)) * 3125
-        calc_pres = (calc_pres / var1) * 2
-        var1 = (self._pressure_calibration[8] * (((calc_pres / 8) * (calc_pres / 8)) / 8192)) / 4096
-        var2 = ((calc_pres / 4) * self._pressure_calibration[7]) / 8192
-        var3 = (((calc_pres / 256) ** 3) * self._pressure_calibration[9]) / 131072
-        calc_pres += ((var1 + var2 + var3 + (self._pressure_calibration[6] * 128)) / 16)
-        return calc_pres/100
+        return _calc_pressure(self._adc_pres, self._t_fine, self._pressure_calibration)
 
     @property
     def humidity(self):
         """The relative humidity in RH %"""
         self._perform_reading()
-        temp_scaled = ((self._t_fine * 5) + 128) / 256
-        var1 = ((self._adc_hum - (self._humidity_calibration[0] * 16)) -
-                ((temp_scaled * self._humidity_calibration[2]) / 200))
-        var2 = (self._humidity_calibration[1] *
-                (((temp_scaled * self._humidity_calibration[3]) / 100) +
-                 (((temp_scaled * ((temp_scaled * self._humidity_calibration[4]) / 100)) /
-                   64) / 100) + 16384)) / 1024
-        var3 = var1 * var2
-        var4 = self._humidity_calibration[5] * 128
-        var4 = (var4 + ((temp_scaled * self._humidity_calibration[6]) / 100)) / 16
-        var5 = ((var3 / 16384) * (var3 / 16384)) / 1024
-        var6 = (var4 * var5) / 2
-        calc_hum = (((var3 + var6) / 1024) * 1000) / 4096
-        calc_hum /= 1000  # get back to RH
-
-        if calc_hum > 100:
-            calc_hum = 100
-        if calc_hum < 0:
-            calc_hum = 0
-        return calc_hum
+        return _calc_humidity(self._adc_hum, self._t_fine, self._humidity_calibration)
 
     @property
     def altitude(self):
@@ -244,60 +460,89 @@ class Adafruit_BME680:
 
     @property
     def gas(self):
-        """The gas resistance in ohms"""
+        """The gas resistance in ohms, or None when gas measurements are disabled"""
         self._perform_reading()
-        var1 = ((1340 + (5 * self._sw_err)) * (_LOOKUP_TABLE_1[self._gas_range])) / 65536
-        var2 = ((self._adc_gas * 32768) - 16777216) + var1
-        var3 = (_LOOKUP_TABLE_2[self._gas_range] * var1) / 512
-        calc_gas_res = (var3 + (var2 / 2)) / var2
-        return int(calc_gas_res)
+        if self._last_heater_step is None:
+            return None
+        return _calc_gas(self._adc_gas, self._gas_range, self._sw_err)
+
+    @property
+    def raw(self):
+        """The uncompensated ADC words as (temperature, pressure, humidity, gas, gas range).
+           Gas and gas range are None when gas measurements are disabled. Compensate them
+           with the coefficients in ``calibration``."""
+        self._perform_reading()
+        if self._last_heater_step is None:
+            gas = gas_range = None
+        else:
+            gas, gas_range = self._adc_gas, self._gas_range
+        return int(self._adc_temp), int(self._adc_pres), self._adc_hum, gas, gas_range
 
     def _perform_reading(self):
         """Perform a single-shot reading from the sensor and fill internal data structure for
-           calculations"""
-        expired = time.ticks_diff(self._last_reading, time.ticks_ms()) * time.ticks_diff(0, 1)
-        if 0 <= expired < self._min_refresh_time:
-            time.sleep_ms(self._min_refresh_time - expired)
-
+           calculations. Reads within ``1/refresh_rate`` of the last one reuse its data."""
+        if self._t_fine is not None:
+            if time.ticks_diff(time.ticks_ms(), self._last_reading) < self._min_refresh_time:
+                return
+        # sleep through the expected conversion time, then poll for completion
+        time.sleep_ms(self.start_measurement())
+        self.finish_measurement()
+
+    def start_measurement(self):
+        """Start a single-shot measurement without waiting for it, and return the expected
+           conversion time in ms. Call ``finish_measurement`` once it has passed; this lets
+           several sensors convert at the same time."""
         # set filter
-        self._write(_BME680_REG_CONFIG, [self._filter << 2])
+        self._write_byte(_BME680_REG_CONFIG, self._filter << 2)
         # turn on temp oversample & pressure oversample
-        self._write(_BME680_REG_CTRL_MEAS,
-                    [(self._temp_oversample << 5)|(self._pressure_oversample << 2)])
+        self._write_byte(_BME680_REG_CTRL_MEAS,
+                         (self._temp_oversample << 5)|(self._pressure_oversample << 2))
         # turn on humidity oversample
-        self._write(_BME680_REG_CTRL_HUM, [self._humidity_oversample])
-        # gas measurements enabled
-        self._write(_BME680_REG_CTRL_GAS, [_BME680_RUNGAS])
+        self._write_byte(_BME680_REG_CTRL_HUM, self._humidity_oversample)
+        # gas measurements enabled, run the next heater profile step
+        if self._gas_enabled:
+            step = self._heater_step
+            self._write_byte(_BME680_REG_CTRL_GAS, _BME680_RUNGAS | step)
+            self._heater_step = (step + 1) % len(self._heater_profile)
+        else:
+            step = None
+            self._write_byte(_BME680_REG_CTRL_GAS, 0)
 
         ctrl = self._read_byte(_BME680_REG_CTRL_MEAS)
         ctrl = (ctrl & 0xFC) | 0x01  # enable single shot!
-        self._write(_BME680_REG_CTRL_MEAS, [ctrl])
-        new_data = False
-        while not new_data:
-            data = self._read(_BME680_REG_MEAS_STATUS, 15)
-            new_data = data[0] & 0x80 != 0
-            time.sleep(0.005)
+        self._write_byte(_BME680_REG_CTRL_MEAS, ctrl)
+        self._pending_step = step
+        return self.measurement_time(-1 if step is None else step)
+
+    def finish_measurement(self):
+        """Wait for the measurement begun by ``start_measurement`` and load its results.
+           Later property reads (within ``1/refresh_rate``) return them."""
+        data = self._data
+        while True:
+            self._read_into(_BME680_REG_MEAS_STATUS, data)
+            if data[0] & 0x80:
+                break
+            time.sleep_ms(1)
         self._last_reading = time.ticks_ms()
-
-        self._adc_pres = _read24(data[2:5]) / 16
-        self._adc_temp = _read24(data[5:8]) / 16
-        self._adc_hum = struct.unpack('>H', bytes(data[8:10]))[0]
-        self._adc_gas = int(struct.unpack('>H', bytes(data[13:15]))[0] / 64)
+        self._last_heater_step = self._pending_step
+
+        # Words are assembled from the fixed offsets of the status block in place,
+        # without slices or struct tuples
+        self._adc_pres = ((data[2] << 16) | (data[3] << 8) | data[4]) / 16
+        self._adc_temp = ((data[5] << 16) | (data[6] << 8) | data[7]) / 16
+        self._adc_hum = (data[8] << 8) | data[9]
+        self._adc_gas = ((data[13] << 8) | data[14]) >> 6
         self._gas_range = data[14] & 0x0F
 
-        var1 = (self._adc_temp / 8) - (self._temp_calibration[0] * 2)
-        var2 = (var1 * self._temp_calibration[1]) / 2048
-        var3 = ((var1 / 2) * (var1 / 2)) / 4096
-        var3 = (var3 * self._temp_calibration[2] * 16) / 16384
-
-        self._t_fine = int(var2 + var3)
+        self._t_fine = _calc_t_fine(self._adc_temp, self._temp_calibration)
+        self.ambient_temperature = (((self._t_fine * 5) + 128) / 256) / 100
 
     def _read_calibration(self):
         """Read & save the calibration coefficients"""
         coeff = self._read(_BME680_BME680_COEFF_ADDR1, 25)
         coeff += self._read(_BME680_BME680_COEFF_ADDR2, 16)
 
-        coeff = list(struct.unpack('<hbBHhbBhhbbHhhBBBHbbbBbHhbb', bytes(coeff[1:39])))
+        coeff = list(struct.unpack_from('<hbBHhbBhhbbHhhBBBHbbbBbHhbb', coeff, 1))
         # print("\n\n",coeff)
         coeff = [float(i) for i in coeff]
         self._temp_calibration = [coeff[x] for x in [23, 0, 1]]
@@ -312,18 +557,32 @@ class Adafruit_BME680:
 
         self._heat_range = (self._read_byte(0x02) & 0x30) / 16
         self._heat_val = self._read_byte(0x00)
+        if self._heat_val > 127:
+            self._heat_val -= 256  # res_heat_val is signed
         self._sw_err = (self._read_byte(0x04) & 0xF0) / 16
 
     def _read_byte(self, register):
         """Read a byte register value and return it"""
-        return self._read(register, 1)[0]
+        self._read_into(register, self._byte)
+        return self._byte[0]
 
     def _read(self, register, length):
+        """Returns a new bytearray of 'length' bytes from the 'register'"""
+        result = bytearray(length)
+        self._read_into(register, result)
+        return result
+
+    def _read_into(self, register, buf):
+        """Fill 'buf' with the bytes from the 'register' on"""
         raise NotImplementedError()
 
     def _write(self, register, values):
         raise NotImplementedError()
 
+    def _write_byte(self, register, value):
+        """Write one byte without allocating"""
+        raise NotImplementedError()
+
 class BME680_I2C(Adafruit_BME680):
     """Driver for I2C connected BME680.
 
@@ -332,29 +591,33 @@ class BME680_I2C(Adafruit_BME680):
         :param bool debug: Print debug statements when True.
         :param int refresh_rate: Maximum number of readings per second. Faster property reads
           will be from the previous reading."""
-    def __init__(self, i2c, address=0x77, debug=False, *, refresh_rate=10):
+    def __init__(self, i2c, address=0x77, debug=False, *, refresh_rate=10, calibration=None):
         """Initialize the I2C device at the 'address' given"""
         self._i2c = i2c
         self._address = address
         self._debug = debug
-        super().__init__(refresh_rate=refresh_rate)
+        super().__init__(refresh_rate=refresh_rate, calibration=calibration)
 
-    def _read(self, register, length):
-        """Returns an array of 'length' bytes from the 'register'"""
-        result = bytearray(length)
-        self._i2c.readfrom_mem_into(self._address, register & 0xff, result)
+    def _read_into(self, register, buf):
+        """Fills 'buf' with the bytes from the 'register' on"""
+        self._i2c.readfrom_mem_into(self._address, register & 0xff, buf)
         if self._debug:
-            print("\t${:x} read ".format(register), " ".join(["{:02x}".format(i) for i in result]))
-        return result
+            print("\t${:x} read ".format(register), " ".join(["{:02x}".format(i) for i in buf]))
 
     def _write(self, register, values):
         """Writes an array of 'length' bytes to the 'register'"""
-        if self._debug:
-            print("\t${:x} write".format(register), " ".join(["{:02x}".format(i) for i in values]))
         for value in values:
-            self._i2c.writeto_mem(self._address, register, bytearray([value & 0xFF]))
+            self._write_byte(register, value)
             register += 1
 
+    def _write_byte(self, register, value):
+        """Writes one byte to the 'register' from the reused buffer"""
+        buf = self._byte
+        buf[0] = value & 0xFF
+        if self._debug:
+            print("\t${:x} write {:02x}".format(register, buf[0]))
+        self._i2c.writeto_mem(self._address, register, buf)
+
 
 class BME680_SPI(Adafruit_BME680):
     """Driver for SPI connected BME680.
@@ -366,56 +629,68 @@ class BME680_SPI(Adafruit_BME680):
           will be from the previous reading.
       """
 
-    def __init__(self, spi, cs, debug=False, *, refresh_rate=10):
+    def __init__(self, spi, cs, debug=False, *, refresh_rate=10, calibration=None):
         self._spi = spi
         self._cs = cs
         self._debug = debug
+        self._spi_mem_page = None  # Unknown until the first page select
+        self._command = bytearray(1)  # Register byte of a read
+        self._pair = bytearray(2)  # Register and value of a one-byte write
         self._cs(1)
-        super().__init__(refresh_rate=refresh_rate)
+        super().__init__(refresh_rate=refresh_rate, calibration=calibration)
 
-    def _read(self, register, length):
-        if register != _BME680_REG_PAGE_SELECT:
-            # _BME680_REG_PAGE_SELECT exists in both SPI memory pages
-            # For all other registers, we must set the correct memory page
-            self._set_spi_mem_page(register)
+    def _read_into(self, register, buf):
+        self._set_spi_mem_page(register)
         register = (register | 0x80) & 0xFF  # Read single, bit 7 high.
+        self._command[0] = register
 
         try:
             self._cs(0)
-            self._spi.write(bytearray([register]))  # pylint: disable=no-member
-            result = bytearray(length)
-            self._spi.readinto(result)  # pylint: disable=no-member
-            if self._debug:
-                print("\t${:x} read ".format(register), " ".join(["{:02x}".format(i) for i in result]))
-        except Exception as e:
-            print (e)
-            result = None
+            self._spi.write(self._command)  # pylint: disable=no-member
+            self._spi.readinto(buf)  # pylint: disable=no-member
         finally:
             self._cs(1)
-        return result
+        if self._debug:
+            print("\t${:x} read ".format(register), " ".join(["{:02x}".format(i) for i in buf]))
 
     def _write(self, register, values):
-        if register != _BME680_REG_PAGE_SELECT:
-            # _BME680_REG_PAGE_SELECT exists in both SPI memory pages
-            # For all other registers, we must set the correct memory page
-            self._set_spi_mem_page(register)
-        register &= 0x7F  # Write, bit 7 low.
+        self._set_spi_mem_page(register)
+        buffer = bytearray(2 * len(values))
+        for i, value in enumerate(values):
+            buffer[2 * i] = (register + i) & 0x7F  # Write, bit 7 low.
+            buffer[2 * i + 1] = value & 0xFF
+        self._transfer(register, buffer)
+
+    def _write_byte(self, register, value):
+        self._set_spi_mem_page(register)  # Before the shared buffer is filled
+        buffer = self._pair
+        buffer[0] = register & 0x7F  # Write, bit 7 low.
+        buffer[1] = value & 0xFF
+        self._transfer(register, buffer)
+
+    def _transfer(self, register, buffer):
+        """Send (register, value) pairs starting at 'register'"""
         try:
             self._cs(0)
-            buffer = bytearray(2 * len(values))
-            for i, value in enumerate(values):
-                buffer[2 * i] = register + i
-                buffer[2 * i + 1] = value & 0xFF
             self._spi.write(buffer)  # pylint: disable=no-member
-            if self._debug:
-                print("\t${:x} write".format(register), " ".join(["{:02x}".format(i) for i in values]))
-        except Exception as e:
-            print (e)
+        except:
+            self._spi_mem_page = None  # A failed page select leaves the page unknown
+            raise
         finally:
             self._cs(1)
+        if register == _BME680_REG_SOFTRESET:
+            self._spi_mem_page = None  # A reset selects page 0 again
+        if self._debug:
+            print("\t${:x} write".format(register & 0x7F),
+                  " ".join(["{:02x}".format(i) for i in buffer[1::2]]))
 
     def _set_spi_mem_page(self, register):
+        """Select the memory page of register, skipped when it is already selected"""
+        if register == _BME680_REG_PAGE_SELECT:
+            return  # _BME680_REG_PAGE_SELECT exists in both SPI memory pages
         spi_mem_page = 0x00
         if register < 0x80:
             spi_mem_page = 0x10
-        self._write(_BME680_REG_PAGE_SELECT, [spi_mem_page])
+        if spi_mem_page != self._spi_mem_page:
+            self._write_byte(_BME680_REG_PAGE_SELECT, spi_mem_page)
+            self._spi_mem_page = spi_mem_page
@@ -0,0 +1,199 @@
+"""
+`bme680_raw` - Compensation of raw BME680 logs on the host
+==========================================================
+
+Host-side tool (CPython 3.8+, NumPy). With ``BME680_RAW = True`` the firmware
+logs the uncompensated ADC words of each BME680 (``Temp(adc)``,
+``Pressure(adc)``, ``Humidity(adc)``, ``Gas(adc)`` and ``GasRange(adc)``)
+instead of the compensated values, and writes the calibration coefficients
+once per file in a line after the header::
+
+    #cal, tag=, T=9317.0|26457.0|3.0, P=35875.0|..., H=..., sw_err=0.0
+
+``compensate()`` runs the formulas of the ``bme680`` driver on whole arrays at
+once, in the same order of operations and in double precision, so the results
+are those of the device without its single-precision floats and log rounding.
+Logs can be compensated again whenever the formulas change.
+
+Usage::
+
+    import logloader, bme680_raw
+    data = logloader.load_file("2025-12-27.log")
+    cal = bme680_raw.calibration("2025-12-27.log")
+    data.update(bme680_raw.compensate(data, cal[""]))   # temperature, pressure, ...
+
+    python bme680_raw.py 2025-12-*.log --out compensated
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import logloader
+
+RAW_KEYS = ("adc_temperature", "adc_pressure", "adc_humidity", "adc_gas", "gas_range")
+
+# Gas range lookup tables of the driver
+LOOKUP_TABLE_1 = np.array((2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0, 2147483647.0,
+                           2126008810.0, 2147483647.0, 2130303777.0, 2147483647.0, 2147483647.0,
+                           2143188679.0, 2136746228.0, 2147483647.0, 2126008810.0, 2147483647.0,
+                           2147483647.0))
+LOOKUP_TABLE_2 = np.array((4096000000.0, 2048000000.0, 1024000000.0, 512000000.0, 255744255.0,
+                           127110228.0, 64000000.0, 32258064.0, 16016016.0, 8000000.0, 4000000.0,
+                           2000000.0, 1000000.0, 500000.0, 250000.0, 125000.0))
+
+
+def calibration(path):
+    """Coefficients from the ``#cal`` lines of a log as {tag: {"T": [...], "P": [...],
+    "H": [...], "sw_err": value}}, "" being the tag of the first BME680"""
+    result = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.startswith(b"#cal"):
+                continue
+            cal = {}
+            for field in line.decode().split(",")[1:]:
+                name, _, value = field.strip().partition("=")
+                if name == "tag":
+                    tag = value
+                elif name == "sw_err":
+                    cal[name] = float(value)
+                else:
+                    cal[name] = [float(v) for v in value.split("|")]
+            result[tag] = cal
+    return result
+
+
+def t_fine(adc_temp, cal):
+    """Fine temperature the other channels are compensated with"""
+    T = cal["T"]
+    var1 = (adc_temp / 8) - (T[0] * 2)
+    var2 = (var1 * T[1]) / 2048
+    var3 = ((var1 / 2) * (var1 / 2)) / 4096
+    var3 = (var3 * T[2] * 16) / 16384
+    return np.trunc(var2 + var3)
+
+
+def temperature(fine):
+    """Temperature in degrees C"""
+    return (((fine * 5) + 128) / 256) / 100
+
+
+def pressure(adc_pres, fine, cal):
+    """Pressure in hPa"""
+    P = cal["P"]
+    var1 = (fine / 2) - 64000
+    var2 = ((var1 / 4) * (var1 / 4)) / 2048
+    var2 = (var2 * P[5]) / 4
+    var2 = var2 + (var1 * P[4] * 2)
+    var2 = (var2 / 4) + (P[3] * 65536)
+    var1 = (((((var1 / 4) * (var1 / 4)) / 8192) * (P[2] * 32) / 8) + ((P[1] * var1) / 2))
+    var1 = var1 / 262144
+    var1 = ((32768 + var1) * P[0]) / 32768
+    calc_pres = 1048576 - adc_pres
+    calc_pres = (calc_pres - (var2 / 4096)) * 3125
+    calc_pres = (calc_pres / var1) * 2
+    var1 = (P[8] * (((calc_pres / 8) * (calc_pres / 8)) / 8192)) / 4096
+    var2 = ((calc_pres / 4) * P[7]) / 8192
+    var3 = (((calc_pres / 256) ** 3) * P[9]) / 131072
+    calc_pres = calc_pres + ((var1 + var2 + var3 + (P[6] * 128)) / 16)
+    return calc_pres / 100
+
+
+def humidity(adc_hum, fine, cal):
+    """Relative humidity in %, limited to 0-100 like the driver"""
+    H = cal["H"]
+    temp_scaled = ((fine * 5) + 128) / 256
+    var1 = ((adc_hum - (H[0] * 16)) - ((temp_scaled * H[2]) / 200))
+    var2 = (H[1] * (((temp_scaled * H[3]) / 100) +
+                    (((temp_scaled * ((temp_scaled * H[4]) / 100)) / 64) / 100) + 16384)) / 1024
+    var3 = var1 * var2
+    var4 = H[5] * 128
+    var4 = (var4 + ((temp_scaled * H[6]) / 100)) / 16
+    var5 = ((var3 / 16384) * (var3 / 16384)) / 1024
+    var6 = (var4 * var5) / 2
+    calc_hum = (((var3 + var6) / 1024) * 1000) / 4096
+    return np.clip(calc_hum / 1000, 0, 100)
+
+
+def gas(adc_gas, gas_range, cal):
+    """Gas resistance in ohms, NaN where gas was not read"""
+    known = ~np.isnan(gas_range)
+    index = np.where(known, gas_range, 0).astype(int)
+    var1 = ((1340 + (5 * cal["sw_err"])) * LOOKUP_TABLE_1[index]) / 65536
+    var2 = ((adc_gas * 32768) - 16777216) + var1
+    var3 = (LOOKUP_TABLE_2[index] * var1) / 512
+    return np.where(known, np.trunc((var3 + (var2 / 2)) / var2), np.nan)
+
+
+def compensate(data, cal, tag=""):
+    """Compensated {temperature, pressure, humidity, gas} arrays (keys with the
+    tag appended for a tagged sensor) from the raw columns of loaded log data"""
+    suffix = "_" + tag if tag else ""
+    raw = {key: np.asarray(data[key + suffix], dtype=np.float64) for key in RAW_KEYS}
+    fine = t_fine(raw["adc_temperature"], cal)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "temperature" + suffix: temperature(fine),
+            "pressure" + suffix: pressure(raw["adc_pressure"], fine, cal),
+            "humidity" + suffix: humidity(raw["adc_humidity"], fine, cal),
+            "gas" + suffix: gas(raw["adc_gas"], raw["gas_range"], cal),
+        }
+
+
+def compensate_file(path, out_dir):
+    """Write a copy of a raw log with compensated BME680 columns, returns its path"""
+    with open(path) as f:
+        header = [h.strip() for h in f.readline().split(",")]
+    if header[-1] == "Chk":
+        header = header[:-1]
+    data = logloader.load_file(path)
+    for tag, cal in calibration(path).items():
+        data.update(compensate(data, cal, tag))
+
+    columns = []  # (header name, key, format)
+    for name in header[1:]:
+        key = logloader.column_key(name)
+        raw = [k for k in RAW_KEYS if key == k or key.startswith(k + "_")]
+        if not raw:
+            columns.append((name, key, "{:g}"))
+        elif raw[0] == "adc_temperature":
+            # The compensated columns take the place of the raw ones
+            tag = key[len(raw[0]):]
+            columns += [("Temp{}(C)".format(tag), "temperature" + tag, "{:.4f}"),
+                        ("Pressure{}(hPa)".format(tag), "pressure" + tag, "{:.4f}"),
+                        ("Humidity{}(%)".format(tag), "humidity" + tag, "{:.4f}"),
+                        ("Gas{}(Ohm)".format(tag), "gas" + tag, "{:.0f}")]
+
+    os.makedirs(out_dir, exist_ok=True)
+    out = os.path.join(out_dir, os.path.basename(path))
+    with open(out, "w") as f:
+        f.write(", ".join(["Time"] + [c[0] for c in columns]) + "\n")
+        for i, t in enumerate(data["time"]):
+            parts = [time.strftime("%H:%M:%S", time.gmtime(t))]
+            for name, key, fmt in columns:
+                value = data[key][i]
+                parts.append("" if np.isnan(value) else fmt.format(value))
+            f.write(", ".join(parts) + "\n")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compensate raw BME680 datalogger logs")
+    parser.add_argument("logs", nargs="+", help="daily .log files written with BME680_RAW")
+    parser.add_argument("--out", default="compensated", help="output directory")
+    args = parser.parse_args()
+
+    for path in args.logs:
+        if not calibration(path):
+            print("{}: no #cal line, not a raw log".format(path))
+            continue
+        start = time.perf_counter()
+        out = compensate_file(path, args.out)
+        print("{} -> {} ({:.3f} s)".format(path, out, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
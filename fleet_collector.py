@@ -0,0 +1,308 @@
+"""
+`fleet_collector` - Concurrent log collector for many datalogger nodes
+======================================================================
+
+Host-side tool (CPython 3.10+, standard library only). It polls every node in a
+node list at the same time and downloads only the daily files that are new or
+have grown since the last sweep. Files are stored as ``<out>/<node>/<file>``.
+
+Each node is handled by its own task. The node's web server handles one client
+at a time, so requests to the same node run in sequence, while a global
+semaphore limits the number of open connections across the fleet. Each request
+has its own timeout and is retried with backoff. A sweep therefore takes about
+as long as the slowest node, not the sum over all nodes.
+
+Node list format, one node per line (``#`` starts a comment)::
+
+    kitchen   192.168.1.31
+    duct      192.168.1.32:8080
+    192.168.1.33
+
+With ``--from``/``--to`` each node is asked for one ``/export`` download of
+all its daily logs in that date range (firmware with the export endpoint),
+stored as ``<out>/<node>/<from>_<to>.csv``, instead of one request per file.
+
+Usage::
+
+    python fleet_collector.py nodes.txt --out collected
+    python fleet_collector.py nodes.txt --from 2025-12-01 --to 2025-12-07
+    python fleet_collector.py --simulate 50     # demo against simulated nodes
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+DEFAULT_PORT = 80
+
+
+def read_node_list(path):
+    """Parse a node list file into (name, host, port) tuples"""
+    nodes = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            address = parts[-1]
+            name = parts[0] if len(parts) > 1 else address
+            host, _, port = address.partition(":")
+            nodes.append((name, host, int(port) if port else DEFAULT_PORT))
+    return nodes
+
+
+def dechunk(body):
+    """Decode a chunked transfer-encoded body"""
+    out = []
+    pos = 0
+    while True:
+        end = body.index(b"\r\n", pos)
+        size = int(body[pos:end].split(b";")[0], 16)
+        if size == 0:
+            return b"".join(out)
+        out.append(body[end + 2:end + 2 + size])
+        pos = end + 4 + size
+
+
+async def http_get(host, port, path):
+    """Minimal HTTP GET, returns (status, body bytes)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write("GET {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n".format(
+            path, host).encode())
+        await writer.drain()
+        data = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    status = head.split(b" ", 2)
+    if b"transfer-encoding: chunked" in head.lower():
+        try:
+            body = dechunk(body)
+        except ValueError:
+            raise OSError("Truncated chunked response for {}".format(path))
+    return (int(status[1]) if len(status) > 1 else 0), body
+
+
+class Collector:
+    """Sweeps a fleet of nodes with bounded parallelism, timeouts and retries"""
+
+    def __init__(self, out_dir, parallel=16, timeout=10.0, retries=3, export=None):
+        self.out_dir = out_dir
+        self.export = export  # (from, to) dates: one /export request per node
+        self.connections = asyncio.Semaphore(parallel)
+        self.timeout = timeout
+        self.retries = retries
+
+    async def request(self, host, port, path):
+        """GET with timeout and retries, raises the last error when all attempts fail"""
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.connections:
+                    status, body = await asyncio.wait_for(
+                        http_get(host, port, path), self.timeout)
+                if status == 200:
+                    return body
+                error = OSError("HTTP {} for {}".format(status, path))
+            except (OSError, asyncio.TimeoutError) as e:
+                error = e
+            if attempt < self.retries:
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay *= 2
+        raise error
+
+    async def list_files(self, host, port):
+        """Return ({filename: size in bytes}, exact) from /api/logs, falling back to
+        the /logs page (sizes rounded to 0.1 KB, exact False) for older firmware"""
+        try:
+            listing = json.loads(await self.request(host, port, "/api/logs"))
+            return {f["name"]: f["size"] for f in listing["files"]}, True
+        except (OSError, asyncio.TimeoutError, ValueError, KeyError):
+            page = (await self.request(host, port, "/logs")).decode("utf-8", "replace")
+            files = {}
+            for name, size_kb in re.findall(
+                    r"<td>([\w-]+\.(?:log|sum))</td>\s*<td>([\d.]+) KB</td>", page):
+                files[name] = round(float(size_kb) * 1024)
+            return files, False
+
+    @staticmethod
+    def needs_download(path, size, exact):
+        """A file is fetched when it is missing locally or its size differs"""
+        try:
+            local = os.path.getsize(path)
+        except OSError:
+            return True
+        if exact:
+            return local != size
+        # Sizes from the HTML listing are only accurate to 0.1 KB
+        return abs(local - size) > 51
+
+    async def collect_node(self, name, host, port):
+        """Bring one node's files up to date, returns a result dict"""
+        start = time.monotonic()
+        result = {"node": name, "downloaded": 0, "bytes": 0, "error": None}
+        node_dir = os.path.join(self.out_dir, name)
+        try:
+            if self.export:
+                start_date, end_date = self.export
+                body = await self.request(host, port, "/export?from={}&to={}&format=csv".format(
+                    start_date, end_date))
+                os.makedirs(node_dir, exist_ok=True)
+                path = os.path.join(node_dir, "{}_{}.csv".format(start_date, end_date))
+                with open(path + ".part", "wb") as f:
+                    f.write(body)
+                os.replace(path + ".part", path)
+                result["downloaded"] = 1
+                result["bytes"] = len(body)
+                result["seconds"] = time.monotonic() - start
+                return result
+            files, exact = await self.list_files(host, port)
+            os.makedirs(node_dir, exist_ok=True)
+            for filename in sorted(files):
+                path = os.path.join(node_dir, filename)
+                if not self.needs_download(path, files[filename], exact):
+                    continue
+                body = await self.request(host, port, "/download/" + filename)
+                tmp = path + ".part"
+                with open(tmp, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, path)
+                result["downloaded"] += 1
+                result["bytes"] += len(body)
+        except Exception as e:
+            result["error"] = "{}: {}".format(type(e).__name__, e)
+        result["seconds"] = time.monotonic() - start
+        return result
+
+    async def sweep(self, nodes):
+        """Collect from all nodes concurrently, returns one result per node"""
+        return await asyncio.gather(
+            *(self.collect_node(name, host, port) for name, host, port in nodes))
+
+
+def print_report(results, elapsed):
+    failed = [r for r in results if r["error"]]
+    slowest = max((r["seconds"] for r in results), default=0)
+    total = sum(r["seconds"] for r in results)
+    print("{} nodes in {:.2f} s (slowest node {:.2f} s, sum of nodes {:.2f} s)".format(
+        len(results), elapsed, slowest, total))
+    print("{} files, {} bytes downloaded, {} nodes failed".format(
+        sum(r["downloaded"] for r in results), sum(r["bytes"] for r in results), len(failed)))
+    for r in failed:
+        print("  {}: {}".format(r["node"], r["error"]))
+
+
+# --- Simulated nodes ---
+def _framed(body):
+    """A log record with its ", XX" XOR checksum, as the firmware's frame_record writes it"""
+    checksum = 0
+    for b in body.encode():
+        checksum ^= b
+    return "{}, {:02X}\n".format(body, checksum)
+
+
+class SimulatedNode:
+    """A fake datalogger serving /api/logs and /download/ with a given latency.
+    Like the real firmware it serves one client at a time."""
+
+    def __init__(self, name, latency, days=7, rows=1440):
+        self.name = name
+        self.latency = latency
+        self.lock = asyncio.Lock()
+        self.files = {}
+        row = _framed("12:00:00, 22.45, 1013.25, 45.30, 125000, 450.50, 3.85")
+        for day in range(days):
+            filename = "2025-12-{:02d}.log".format(day + 1)
+            self.files[filename] = ("Time, Temp(C), Pressure(hPa), Humidity(%), Gas(Ohm), "
+                                    "Light(lux), Battery(V), Chk\n" + row * rows).encode()
+
+    def append_rows(self, count):
+        """Grow the newest file, like a node that kept logging"""
+        newest = max(self.files)
+        row = _framed("12:01:00, 22.46, 1013.24, 45.31, 125100, 451.00, 3.85")
+        self.files[newest] += row.encode() * count
+
+    async def handle(self, reader, writer):
+        async with self.lock:
+            request = await reader.readuntil(b"\r\n\r\n")
+            path = request.split(b" ")[1].decode()
+            await asyncio.sleep(self.latency)
+            if path == "/api/logs":
+                body = json.dumps({"node": self.name, "files": [
+                    {"name": n, "size": len(d)} for n, d in self.files.items()]}).encode()
+                status = "200 OK"
+            elif path.startswith("/download/") and path[10:] in self.files:
+                body = self.files[path[10:]]
+                status = "200 OK"
+            else:
+                body = b"Not found"
+                status = "404 Not Found"
+            writer.write("HTTP/1.1 {}\r\nConnection: close\r\n\r\n".format(status).encode() + body)
+            await writer.drain()
+            writer.close()
+
+
+async def simulate(count, out_dir, parallel, timeout, retries):
+    """Run two sweeps against simulated nodes with random latencies"""
+    sims = [SimulatedNode("node{:03d}".format(i), random.uniform(0.01, 0.2))
+            for i in range(count)]
+    servers = []
+    nodes = []
+    for sim in sims:
+        server = await asyncio.start_server(sim.handle, "127.0.0.1", 0)
+        servers.append(server)
+        nodes.append((sim.name, "127.0.0.1", server.sockets[0].getsockname()[1]))
+
+    collector = Collector(out_dir, parallel, timeout, retries)
+    for label in ("Initial sweep", "Repeat sweep (nothing new)", "Sweep after new rows"):
+        if label.startswith("Sweep after"):
+            for sim in sims:
+                sim.append_rows(10)
+        start = time.monotonic()
+        results = await collector.sweep(nodes)
+        print(label + ":")
+        print_report(results, time.monotonic() - start)
+
+    for server in servers:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect daily logs from datalogger nodes")
+    parser.add_argument("nodes", nargs="?", help="node list file")
+    parser.add_argument("--out", default="collected", help="output directory")
+    parser.add_argument("--parallel", type=int, default=16, help="max open connections")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds per request")
+    parser.add_argument("--retries", type=int, default=3, help="retries per request")
+    parser.add_argument("--from", dest="start", metavar="YYYY-MM-DD",
+                        help="export this date range in one request per node (with --to)")
+    parser.add_argument("--to", dest="end", metavar="YYYY-MM-DD")
+    parser.add_argument("--simulate", type=int, metavar="N",
+                        help="demo against N simulated nodes instead of a node list")
+    args = parser.parse_args()
+
+    if args.simulate:
+        asyncio.run(simulate(args.simulate, args.out, args.parallel, args.timeout, args.retries))
+        return
+    if not args.nodes:
+        parser.error("a node list file or --simulate is required")
+
+    if bool(args.start) != bool(args.end):
+        parser.error("--from and --to go together")
+    export = (args.start, args.end) if args.start else None
+
+    nodes = read_node_list(args.nodes)
+    start = time.monotonic()
+    results = asyncio.run(Collector(args.out, args.parallel, args.timeout, args.retries, export)
+                          .sweep(nodes))
+    print_report(results, time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    main()
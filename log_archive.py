@@ -0,0 +1,342 @@
+"""
+`log_archive` - Memory-mapped columnar archive of collected logs
+================================================================
+
+Host-side tool (CPython 3.8+, NumPy). Ingests daily ``.log`` files (parsed with
+``logloader``) into fixed-dtype column files, one directory per node and month::
+
+    archive/<node>/<YYYY-MM>/manifest.json
+    archive/<node>/<YYYY-MM>/time.i8          # epoch seconds (UTC), sorted
+    archive/<node>/<YYYY-MM>/temperature.f4   # one file per channel, NaN = missing
+    archive/<node>/<YYYY-MM>/time.2.i8        # the same, after the month's 2nd rewrite
+    archive/<node>/sources.json               # bytes ingested from each .log file
+
+Column files are raw little-endian arrays with no header, so they can be opened
+with ``numpy.memmap`` and sliced without copying. The manifest holds the row
+count and is rewritten atomically after the columns, so a crash during ingest
+leaves extra bytes that the next ingest cuts off. Rows newer than the month's
+last row are appended; older rows (a node's backlog arriving late) cause that
+month to be rewritten in time order, into a new generation of column files
+named in the manifest; replacing the manifest switches to it, and the old files
+are then deleted. Time-range queries use a binary search on the time column.
+
+Usage::
+
+    python log_archive.py ingest collected --archive archive --utc-offset 3600
+    python log_archive.py info --archive archive
+    python log_archive.py query kitchen temperature --from 2025-01-01 --to 2025-01-08
+
+    import log_archive
+    archive = log_archive.Archive("archive")
+    t, temp = archive.query("kitchen", "temperature", start, end)
+    month = archive.month_channel("2025-01", "temperature")   # {node: (t, values)}
+"""
+
+import argparse
+import calendar
+import json
+import os
+import time
+
+import numpy as np
+
+import logloader
+
+TIME_DTYPE = np.dtype("<i8")
+VALUE_DTYPE = np.dtype("<f4")
+EXTENSIONS = {TIME_DTYPE: "i8", VALUE_DTYPE: "f4"}
+
+
+def month_key(t):
+    """YYYY-MM of an epoch time in seconds (UTC)"""
+    tm = time.gmtime(t)
+    return "{:04d}-{:02d}".format(tm[0], tm[1])
+
+
+def parse_date(text):
+    """Epoch seconds for YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS] (UTC)"""
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return calendar.timegm(time.strptime(text, fmt))
+        except ValueError:
+            pass
+    raise ValueError("Bad date: {}".format(text))
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return default
+
+
+class Month:
+    """Column files of one node and month"""
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = _read_json(os.path.join(path, "manifest.json"),
+                                   {"rows": 0, "columns": {}, "first": None, "last": None})
+        self.manifest.setdefault("generation", 0)
+
+    @property
+    def rows(self):
+        return self.manifest["rows"]
+
+    @property
+    def channels(self):
+        return [c for c in self.manifest["columns"] if c != "time"]
+
+    def _file(self, column, generation=None):
+        if generation is None:
+            generation = self.manifest["generation"]
+        dtype = np.dtype(self.manifest["columns"][column])
+        name = column if generation == 0 else "{}.{}".format(column, generation)
+        return os.path.join(self.path, "{}.{}".format(name, EXTENSIONS[dtype])), dtype
+
+    def column(self, name):
+        """Read-only memmap of a column (empty array when there are no rows)"""
+        path, dtype = self._file(name)
+        if self.rows == 0:
+            return np.empty(0, dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(self.rows,))
+
+    def slice(self, start, end):
+        """Row range [i, j) with start <= time < end, found by binary search"""
+        t = self.column("time")
+        return int(np.searchsorted(t, start, "left")), int(np.searchsorted(t, end, "left"))
+
+    def append(self, data):
+        """Append rows that are all newer than the last row"""
+        os.makedirs(self.path, exist_ok=True)
+        n = len(data["time"])
+        columns = self.manifest["columns"]
+        for name in data:
+            if name not in columns:
+                columns[name] = (TIME_DTYPE if name == "time" else VALUE_DTYPE).str
+                # A channel seen for the first time is missing in earlier rows
+                path, dtype = self._file(name)
+                with open(path, "wb") as f:
+                    np.full(self.rows, np.nan, dtype).tofile(f)
+        for name in columns:
+            path, dtype = self._file(name)
+            values = data.get(name)
+            if values is None:
+                values = np.full(n, np.nan)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.truncate(self.rows * dtype.itemsize)  # Drop leftovers of a failed ingest
+                f.seek(self.rows * dtype.itemsize)
+                np.asarray(values).astype(dtype).tofile(f)
+        self._commit(self.rows + n, data["time"])
+
+    def rewrite(self, data):
+        """Merge rows into the month in time order, dropping duplicate times.
+        The merged columns go to the next generation of files, and the manifest
+        replace is the only step that switches to them, so a crash leaves either
+        the old month or the new one."""
+        merged = {name: np.array(self.column(name)) for name in self.manifest["columns"]}
+        n = len(data["time"])
+        for name in set(merged) | set(data):
+            old = merged.get(name, np.full(self.rows, np.nan))
+            new = data.get(name, np.full(n, np.nan))
+            merged[name] = np.concatenate([old.astype(np.float64) if name != "time" else old,
+                                           np.asarray(new)])
+        order = np.argsort(merged["time"], kind="stable")
+        t = merged["time"][order]
+        keep = np.concatenate(([True], t[1:] != t[:-1]))
+        columns = self.manifest["columns"]
+        generation = self.manifest["generation"] + 1
+        for name, values in merged.items():
+            if name not in columns:
+                columns[name] = (TIME_DTYPE if name == "time" else VALUE_DTYPE).str
+            path, dtype = self._file(name, generation)
+            with open(path, "wb") as f:
+                values[order][keep].astype(dtype).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        self.manifest["generation"] = generation
+        self._commit(int(keep.sum()), t[keep])
+        self._remove_stale()
+
+    def _remove_stale(self):
+        """Delete column files that the manifest does not name, i.e. earlier
+        generations and those of a rewrite that crashed"""
+        current = {os.path.basename(self._file(name)[0]) for name in self.manifest["columns"]}
+        current.add("manifest.json")
+        for name in os.listdir(self.path):
+            if name not in current:
+                os.remove(os.path.join(self.path, name))
+
+    def _commit(self, rows, times):
+        manifest = self.manifest
+        manifest["rows"] = rows
+        if len(times):
+            first = int(times[0])
+            manifest["first"] = first if manifest["first"] is None else min(manifest["first"], first)
+            manifest["last"] = int(times[-1])
+        _write_json(os.path.join(self.path, "manifest.json"), manifest)
+
+
+class Archive:
+    """Per-node, per-month columnar archive"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def nodes(self):
+        try:
+            return sorted(n for n in os.listdir(self.root)
+                          if os.path.isdir(os.path.join(self.root, n)))
+        except OSError:
+            return []
+
+    def months(self, node):
+        node_dir = os.path.join(self.root, node)
+        return sorted(m for m in os.listdir(node_dir)
+                      if os.path.exists(os.path.join(node_dir, m, "manifest.json")))
+
+    def month(self, node, month):
+        return Month(os.path.join(self.root, node, month))
+
+    # --- Ingest ---
+    def ingest(self, node, data):
+        """Add rows ({"time": epoch seconds, channel: values}) for a node, returns
+        the number of new rows"""
+        t = np.asarray(data["time"])
+        if len(t) == 0:
+            return 0
+        order = np.argsort(t, kind="stable")
+        data = {name: np.asarray(values)[order] for name, values in data.items()}
+        data["time"] = data["time"].astype(TIME_DTYPE)
+        months = data["time"].astype("datetime64[s]").astype("datetime64[M]").astype(str)
+        added = 0
+        for key in np.unique(months):
+            part = months == key
+            rows = {name: values[part] for name, values in data.items()}
+            month = self.month(node, key)
+            last = month.manifest["last"]
+            if last is None or rows["time"][0] > last:
+                month.append(rows)
+                added += len(rows["time"])
+            else:
+                new = rows["time"] > last
+                old = ~new & ~np.isin(rows["time"], month.column("time"))
+                if old.any():
+                    before = month.rows
+                    month.rewrite({name: values[old | new] for name, values in rows.items()})
+                    added += month.rows - before
+                elif new.any():
+                    month.append({name: values[new] for name, values in rows.items()})
+                    added += int(new.sum())
+        return added
+
+    def ingest_files(self, node, paths, utc_offset=0):
+        """Ingest new or grown .log files of a node, returns (files, rows)"""
+        sources_path = os.path.join(self.root, node, "sources.json")
+        sources = _read_json(sources_path, {})
+        files = rows = 0
+        for path in sorted(paths):
+            name = os.path.basename(path)
+            size = os.path.getsize(path)
+            if sources.get(name) == size:
+                continue
+            rows += self.ingest(node, logloader.load_file(path, utc_offset))
+            files += 1
+            sources[name] = size
+            _write_json(sources_path, sources)
+        return files, rows
+
+    def ingest_collected(self, collected, utc_offset=0):
+        """Ingest a fleet_collector output directory, returns {node: (files, rows)}"""
+        results = {}
+        for node in sorted(os.listdir(collected)):
+            node_dir = os.path.join(collected, node)
+            if not os.path.isdir(node_dir):
+                continue
+            paths = [os.path.join(node_dir, f) for f in os.listdir(node_dir) if f.endswith(".log")]
+            os.makedirs(os.path.join(self.root, node), exist_ok=True)
+            results[node] = self.ingest_files(node, paths, utc_offset)
+        return results
+
+    # --- Queries ---
+    def query(self, node, channel, start, end):
+        """(time, values) of one channel with start <= time < end. A range inside a
+        single month returns memmap views without copying."""
+        first, last = month_key(start), month_key(max(start, end - 1))
+        parts = []
+        for key in self.months(node):
+            if first <= key <= last:
+                month = self.month(node, key)
+                if channel not in month.manifest["columns"]:
+                    continue
+                i, j = month.slice(start, end)
+                if j > i:
+                    parts.append((month.column("time")[i:j], month.column(channel)[i:j]))
+        if not parts:
+            return np.empty(0, TIME_DTYPE), np.empty(0, VALUE_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def month_channel(self, month, channel, nodes=None):
+        """{node: (time, values)} memmaps of one channel for one month"""
+        result = {}
+        for node in nodes or self.nodes():
+            m = self.month(node, month)
+            if channel in m.manifest["columns"] and m.rows:
+                result[node] = (m.column("time"), m.column(channel))
+        return result
+
+
+def print_info(archive):
+    for node in archive.nodes():
+        for key in archive.months(node):
+            month = archive.month(node, key)
+            print("{:16s} {}  {:7d} rows  {}".format(
+                node, key, month.rows, ", ".join(month.channels)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar archive of datalogger logs")
+    parser.add_argument("--archive", default="archive", help="archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="ingest a fleet_collector directory")
+    ingest.add_argument("collected", help="directory of <node>/<YYYY-MM-DD>.log files")
+    ingest.add_argument("--utc-offset", type=int, default=0,
+                        help="node UTC_OFFSET in seconds (rows are local time)")
+    commands.add_parser("info", help="list nodes, months and channels")
+    query = commands.add_parser("query", help="print one channel for a time range")
+    query.add_argument("node")
+    query.add_argument("channel")
+    query.add_argument("--from", dest="start", required=True, help="YYYY-MM-DD[THH:MM[:SS]] UTC")
+    query.add_argument("--to", dest="end", required=True, help="YYYY-MM-DD[THH:MM[:SS]] UTC")
+    args = parser.parse_args()
+
+    archive = Archive(args.archive)
+    if args.command == "ingest":
+        start = time.perf_counter()
+        results = archive.ingest_collected(args.collected, args.utc_offset)
+        for node, (files, rows) in results.items():
+            print("{}: {} files, {} new rows".format(node, files, rows))
+        print("Ingested in {:.2f} s".format(time.perf_counter() - start))
+    elif args.command == "info":
+        print_info(archive)
+    else:
+        t, values = archive.query(args.node, args.channel,
+                                  parse_date(args.start), parse_date(args.end))
+        for ti, v in zip(t, values):
+            print("{}, {:.2f}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ti)), v))
+
+
+if __name__ == "__main__":
+    main()
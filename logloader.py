@@ -0,0 +1,478 @@
+"""
+`logloader` - Vectorized loader for datalogger ``.log`` files
+=============================================================
+
+Host-side tool (CPython 3.8+, NumPy). Reads the daily CSV logs written by the
+firmware into NumPy arrays with full epoch timestamps.
+
+The fast path works on whole files at once. It finds line boundaries, field
+counts and record checksums with array operations, and converts all complete
+rows in a single ``numpy.fromstring`` call. Lines that need care take a slow
+per-line path. These are rows that lost an optional column (older firmware
+dropped ``Light(lux)`` or ``Battery(V)`` when a read failed), rows with empty
+fields, and rows that fail their checksum.
+
+Each file is read with its own header, so files with and without the optional
+columns load side by side, and missing values are NaN. Timestamps come from
+the date in the file name plus the time of day in each row. Rows are in the
+node's local time, so pass the node's ``UTC_OFFSET`` to get UTC epochs.
+
+Files logged in dead-band mode carry ``#deadband`` marker lines and only hold a
+row when a channel moved out of its band (or at a heartbeat). Each row's values
+hold until the next row; ``hold()`` rebuilds that step-wise series at any
+times. ``--deadband`` replays full-rate logs through the firmware's dead-band
+filter and reports the rows kept and the reconstruction error.
+
+Usage::
+
+    import logloader
+    data = logloader.load_files(["2025-12-26.log", "2025-12-27.log"])
+    data["time"], data["temperature"]
+
+    nodes = logloader.load_collected("collected")   # fleet_collector layout
+    temp = logloader.hold(data, grid)["temperature"]  # dead-band logs on a grid
+    python logloader.py --bench --workers 4         # throughput benchmark
+    python logloader.py --deadband 2025-12-*.log    # dead-band savings and error
+"""
+
+import argparse
+import calendar
+import glob
+import os
+import re
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Header name -> channel key
+CHANNELS = {
+    "Temp(C)": "temperature",
+    "Pressure(hPa)": "pressure",
+    "Humidity(%)": "humidity",
+    "Gas(Ohm)": "gas",
+    "Light(lux)": "light",
+    "Battery(V)": "battery",
+    # Uncompensated BME680 words logged with BME680_RAW (see bme680_raw.py)
+    "Temp(adc)": "adc_temperature",
+    "Pressure(adc)": "adc_pressure",
+    "Humidity(adc)": "adc_humidity",
+    "Gas(adc)": "adc_gas",
+    "GasRange(adc)": "gas_range",
+}
+# Firmware default dead-bands; RELATIVE channels are fractions of the reading
+DEADBAND = {"temperature": 0.05, "pressure": 0.1, "humidity": 0.2, "gas": 0.02,
+            "light": 2.0, "battery": 0.01}
+DEADBAND_HEARTBEAT = 900
+RELATIVE = ("gas",)
+OPTIONAL = ("light", "battery")  # Columns older firmware dropped from a row on a failed read
+BATTERY_RANGE = (2.0, 5.0)  # Plausible battery voltages, used to place ragged values
+
+_FILENAME_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})\.log$")
+
+# Byte translation for the fast path: ':' separates fields, and each line end
+# becomes a separator (plain files) or blank space (the ", XX" checksum field
+# already ends the record with a comma)
+_SEPARATORS = np.arange(256, dtype=np.uint8)
+_SEPARATORS[ord(":")] = ord(",")
+_SEPARATORS[ord("\n")] = ord(",")
+_SEPARATORS[ord("\r")] = ord(" ")
+_FRAMED_SEPARATORS = _SEPARATORS.copy()
+_FRAMED_SEPARATORS[ord("\n")] = ord(" ")
+
+# Hex digit values for checksum fields (255 = not a hex digit)
+_HEX = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX[_c] = _i
+for _i, _c in enumerate(b"abcdef"):
+    _HEX[_c] = 10 + _i
+
+
+def day_epoch(path):
+    """Epoch seconds of local midnight for a YYYY-MM-DD.log file name"""
+    match = _FILENAME_DATE.search(os.path.basename(path))
+    if not match:
+        raise ValueError("No date in log file name: {}".format(path))
+    year, month, day = (int(v) for v in match.groups())
+    return calendar.timegm((year, month, day, 0, 0, 0))
+
+
+_TAGGED_COLUMN = re.compile(r"^(\w+?)_(\w+)(\(.*\))$")
+_AGE_COLUMN = re.compile(r"^Age_(\w+)\(s\)$")
+
+
+def column_key(name):
+    """Channel key for a header column. Extra sensors of a kind have a tag in
+    the name, e.g. "Temp_duct(C)" is "temperature_duct". Channels read less
+    often than every row have an age column, e.g. "Age_gas(s)" is "age_gas"."""
+    if name in CHANNELS:
+        return CHANNELS[name]
+    match = _AGE_COLUMN.match(name)
+    if match:
+        return "age_" + match.group(1)
+    match = _TAGGED_COLUMN.match(name)
+    if match and match.group(1) + match.group(3) in CHANNELS:
+        return "{}_{}".format(CHANNELS[match.group(1) + match.group(3)], match.group(2))
+    return name
+
+
+def _column_keys(header):
+    return [column_key(name) for name in header[1:]]
+
+
+def _parse_slow(body, keys):
+    """Parse one awkward record body, returns {key: value} or None to drop it"""
+    fields = [v.strip() for v in body.decode("utf-8", "replace").split(",")]
+    try:
+        h, m, s = (int(v) for v in fields[0].split(":"))
+    except ValueError:
+        return None
+    values = fields[1:]
+    names = list(keys)
+    if len(values) < len(names):
+        # Older firmware dropped a failed optional column from the row. With one
+        # value for two optional columns, guess from the value which one it is.
+        missing = len(names) - len(values)
+        present = [k for k in names if k in OPTIONAL]
+        if missing == 1 and len(present) == 2 and values:
+            try:
+                last = float(values[-1])
+            except ValueError:
+                last = None
+            if last is not None and BATTERY_RANGE[0] <= last <= BATTERY_RANGE[1]:
+                names.remove("light")
+            else:
+                names.remove("battery")
+        else:
+            names = names[:len(values)]
+    row = {"time": h * 3600 + m * 60 + s}
+    for key, value in zip(names, values):
+        try:
+            row[key] = float(value) if value else np.nan
+        except ValueError:
+            row[key] = np.nan
+    return row
+
+
+def load_file(path, utc_offset=0, verify=True):
+    """Load one daily log into {"time": epoch seconds, channel: values} arrays.
+
+    Torn or corrupt records (failed checksum, or no trailing newline) are dropped
+    when the file carries checksums and ``verify`` is set."""
+    with open(path, "rb") as f:
+        data = f.read()
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == 10)  # A last line without a newline is torn
+    if len(ends) == 0:
+        return {"time": np.empty(0)}
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    header = [h.strip() for h in data[:ends[0]].decode().split(",")]
+    framed = header[-1] == "Chk"
+    if framed:
+        header = header[:-1]
+    keys = _column_keys(header)
+    starts, ends = starts[1:], ends[1:]
+    if len(starts) == 0:
+        return {"time": np.empty(0), **{k: np.empty(0) for k in keys}}
+
+    # Line end without a trailing \r
+    stops = ends - (buf[ends - 1] == 13)
+    first = buf[starts]
+    fast = (first >= ord("0")) & (first <= ord("9")) & (stops - starts > 8)
+
+    # Body of each record: up to the ", XX" checksum field or the line end
+    if framed:
+        sep = stops - 4  # The ',' before the checksum ends the record
+        fast &= (buf[sep] == 44) & (buf[sep + 1] == 32)
+        if verify:
+            prefix = np.concatenate(([0], np.bitwise_xor.accumulate(buf)))
+            stored = (_HEX[buf[stops - 2]].astype(np.int32) << 4) | _HEX[buf[stops - 1]]
+            fast &= (prefix[sep] ^ prefix[starts]) == stored
+    else:
+        sep = stops
+    valid = fast.copy()
+
+    # Rows with the full field count and no empty fields take the fast path. A
+    # field is empty when a comma is followed (after a space) by another comma
+    # or the line end.
+    commas = np.flatnonzero(buf == 44)
+    fast &= np.searchsorted(commas, sep) - np.searchsorted(commas, starts) == len(header) - 1
+    following = buf[np.minimum(commas + 1 + (buf[np.minimum(commas + 1, len(buf) - 1)] == 32),
+                               len(buf) - 1)]
+    empties = commas[(following == 44) | (following == 10) | (following == 13)]
+    fast &= np.searchsorted(empties, sep) == np.searchsorted(empties, starts)
+
+    day = day_epoch(path) - utc_offset
+    columns = len(header) + 2  # Time splits into hours, minutes, seconds
+    result_time = []
+    result = {k: [] for k in keys}
+
+    # Translate the data lines into one comma-separated run of numbers. Lines
+    # that do not take the fast path are blanked out, as are checksum digits.
+    values = None
+    if fast.any():
+        base = starts[0]
+        text = (_FRAMED_SEPARATORS if framed else _SEPARATORS)[buf[base:ends[-1] + 1]]
+        if framed:
+            text[stops[fast] - 2 - base] = 32
+            text[stops[fast] - 1 - base] = 32
+        for i in np.flatnonzero(~fast):
+            text[starts[i] - base:ends[i] + 1 - base] = 32
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(text.tobytes().rstrip(b" ,"), sep=",")
+        if len(values) != np.count_nonzero(fast) * columns:
+            # Something unparsable slipped through, read those rows one by one
+            values = None
+            fast[:] = False
+    if values is not None:
+        values = values.reshape(-1, columns)
+        result_time.append(day + values[:, 0] * 3600 + values[:, 1] * 60 + values[:, 2])
+        for i, key in enumerate(keys):
+            result[key].append(values[:, 3 + i])
+
+    slow = np.flatnonzero(valid & ~fast)
+    if len(slow):
+        rows = [_parse_slow(data[starts[i]:sep[i]], keys) for i in slow]
+        rows = [r for r in rows if r is not None]
+        result_time.append(day + np.array([r["time"] for r in rows], dtype=np.float64))
+        for key in keys:
+            result[key].append(np.array([r.get(key, np.nan) for r in rows], dtype=np.float64))
+
+    out = {"time": np.concatenate(result_time) if result_time else np.empty(0)}
+    for key in keys:
+        out[key] = np.concatenate(result[key]) if result[key] else np.empty(0)
+    if len(slow) and values is not None:
+        order = np.argsort(out["time"], kind="stable")
+        out = {k: v[order] for k, v in out.items()}
+    return out
+
+
+def load_files(paths, utc_offset=0, verify=True):
+    """Load and concatenate many daily logs, sorted by time. Channels missing from
+    some files are NaN for their rows."""
+    parts = [load_file(p, utc_offset, verify) for p in sorted(paths)]
+    keys = []
+    for part in parts:
+        keys += [k for k in part if k not in keys]
+    out = {}
+    for key in keys:
+        out[key] = np.concatenate(
+            [part.get(key, np.full(len(part["time"]), np.nan)) for part in parts]) \
+            if parts else np.empty(0)
+    if "time" in out:
+        order = np.argsort(out["time"], kind="stable")
+        out = {k: v[order] for k, v in out.items()}
+    return out
+
+
+def load_collected(root, utc_offset=0, verify=True, workers=None):
+    """Load a fleet_collector output directory into {node: arrays}. With
+    ``workers`` set, nodes are loaded in that many processes."""
+    jobs = {}
+    for node in sorted(os.listdir(root)):
+        paths = glob.glob(os.path.join(root, node, "*.log"))
+        if paths:
+            jobs[node] = paths
+    if not workers:
+        return {node: load_files(paths, utc_offset, verify) for node, paths in jobs.items()}
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {node: pool.submit(load_files, paths, utc_offset, verify)
+                   for node, paths in jobs.items()}
+        return {node: future.result() for node, future in futures.items()}
+
+
+# --- Dead-band logs ---
+def deadband_settings(path):
+    """Settings of the last ``#deadband`` marker in a file as {"heartbeat": s,
+    "bands": {key: band}, "relative": [keys]}, or None if the file has none or
+    it was switched off"""
+    settings = None
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.startswith(b"#deadband"):
+                continue
+            fields = [v.strip() for v in line.decode().split(",")[1:]]
+            if fields == ["off"]:
+                settings = None
+                continue
+            settings = {"heartbeat": None, "bands": {}, "relative": []}
+            for field in fields:
+                name, _, value = field.partition("=")
+                if name == "heartbeat":
+                    settings["heartbeat"] = int(value)
+                    continue
+                key = column_key(name)
+                if value.endswith("%"):
+                    settings["relative"].append(key)
+                    value = float(value[:-1]) / 100
+                settings["bands"][key] = float(value)
+    return settings
+
+
+def hold(data, times):
+    """Values of a dead-band logged series at ``times``. Each row's values hold
+    until the next row; times before the first row are NaN."""
+    times = np.asarray(times)
+    index = np.searchsorted(data["time"], times, "right") - 1
+    out = {"time": times}
+    for key, values in data.items():
+        if key != "time":
+            held = values[np.maximum(index, 0)] if len(values) else np.full(len(times), np.nan)
+            out[key] = np.where(index >= 0, held, np.nan)
+    return out
+
+
+def deadband(data, bands=None, heartbeat=DEADBAND_HEARTBEAT, relative=RELATIVE, utc_offset=0):
+    """Replay a full-rate series through the firmware's dead-band filter,
+    returns a boolean mask of the rows it would write. utc_offset is the node's
+    UTC_OFFSET, as daily files (which always start with a row) begin at local
+    midnight."""
+    bands = DEADBAND if bands is None else bands
+    t = data["time"]
+    keys = [k for k in data if k != "time" and not k.startswith("age_")]
+    base = {k: k.split("_", 1)[0] for k in keys}
+    keep = np.zeros(len(t), dtype=bool)
+    last = None
+    last_t = None
+    day = None
+    for i in range(len(t)):
+        row_day = (t[i] + utc_offset) // 86400
+        write = last is None or row_day != day or t[i] - last_t >= heartbeat
+        if not write:
+            for k in keys:
+                value, held = data[k][i], last[k]
+                if np.isnan(value) != np.isnan(held):
+                    write = True
+                    break
+                band = bands.get(base[k], 0) * (abs(held) if base[k] in relative else 1)
+                if abs(value - held) > band:
+                    write = True
+                    break
+        if write:
+            keep[i] = True
+            last = {k: data[k][i] for k in keys}
+            last_t = t[i]
+            day = row_day
+    return keep
+
+
+def deadband_report(data, utc_offset=0):
+    """Print rows kept and reconstruction error of dead-band logging"""
+    keep = deadband(data, utc_offset=utc_offset)
+    kept = {k: v[keep] for k, v in data.items()}
+    rebuilt = hold(kept, data["time"])
+    print("Dead-band: {} of {} rows kept ({:.1f}%)".format(
+        int(keep.sum()), len(keep), 100 * keep.mean() if len(keep) else 0))
+    for key, values in data.items():
+        if key == "time" or not len(values):
+            continue
+        error = np.abs(rebuilt[key] - values)
+        if np.isnan(error).all():
+            continue
+        print("  {:12s} max error {:10.4f}  rms {:10.4f}".format(
+            key, np.nanmax(error), np.sqrt(np.nanmean(error ** 2))))
+
+
+# --- Benchmark ---
+def _checksum(text):
+    value = 0
+    for b in text.encode():
+        value ^= b
+    return value
+
+
+def write_synthetic(root, nodes, days, interval=60):
+    """Write synthetic daily logs like a fleet_collector sweep would store them"""
+    header = "Time, Temp(C), Pressure(hPa), Humidity(%), Gas(Ohm), Light(lux), Battery(V), Chk\n"
+    rng = np.random.default_rng(1)
+    for n in range(nodes):
+        node_dir = os.path.join(root, "node{:03d}".format(n))
+        os.makedirs(node_dir, exist_ok=True)
+        for d in range(days):
+            tm = time.gmtime(calendar.timegm((2025, 1, 1, 0, 0, 0)) + d * 86400)
+            lines = [header]
+            temps = 21 + rng.standard_normal(86400 // interval)
+            for i, t in enumerate(range(0, 86400, interval)):
+                body = "{:02d}:{:02d}:{:02d}, {:.2f}, 1013.25, 45.30, {}, 450.50, 3.85".format(
+                    t // 3600, t // 60 % 60, t % 60, temps[i], 120000 + i)
+                lines.append("{}, {:02X}\n".format(body, _checksum(body)))
+            name = "{:04d}-{:02d}-{:02d}.log".format(tm[0], tm[1], tm[2])
+            with open(os.path.join(node_dir, name), "w") as f:
+                f.writelines(lines)
+
+
+def _load_line_by_line(paths):
+    """Reference per-line Python loader (checksums, floats, arrays) used as the
+    benchmark baseline"""
+    rows = []
+    for path in paths:
+        day = day_epoch(path)
+        with open(path) as f:
+            f.readline()
+            for line in f:
+                body, _, chk = line.rstrip("\r\n").rpartition(", ")
+                if _checksum(body) != int(chk, 16):
+                    continue
+                fields = [v.strip() for v in body.split(",")]
+                h, m, s = (int(v) for v in fields[0].split(":"))
+                rows.append([day + h * 3600 + m * 60 + s] +
+                            [float(v) if v else np.nan for v in fields[1:]])
+    return len(np.array(rows))
+
+
+def benchmark(nodes, days, workers=None):
+    with tempfile.TemporaryDirectory() as root:
+        print("Writing {} nodes x {} days of 1-minute logs...".format(nodes, days))
+        write_synthetic(root, nodes, days)
+        paths = glob.glob(os.path.join(root, "*", "*.log"))
+        size = sum(os.path.getsize(p) for p in paths)
+
+        start = time.perf_counter()
+        loaded = load_collected(root, workers=workers)
+        elapsed = time.perf_counter() - start
+        rows = sum(len(v["time"]) for v in loaded.values())
+        print("Vectorized: {} rows, {:.1f} MB in {:.2f} s ({:.0f} rows/s, {:.0f} MB/s)".format(
+            rows, size / 1e6, elapsed, rows / elapsed, size / 1e6 / elapsed))
+
+        subset = paths[:max(1, len(paths) // 10)]
+        start = time.perf_counter()
+        base_rows = _load_line_by_line(subset)
+        base = time.perf_counter() - start
+        print("Line-by-line baseline: {:.0f} rows/s ({:.1f}x slower)".format(
+            base_rows / base, (rows / elapsed) / (base_rows / base)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load datalogger .log files with NumPy")
+    parser.add_argument("paths", nargs="*", help="log files to load")
+    parser.add_argument("--utc-offset", type=int, default=0,
+                        help="node UTC_OFFSET in seconds (rows are local time)")
+    parser.add_argument("--bench", action="store_true", help="run the throughput benchmark")
+    parser.add_argument("--nodes", type=int, default=10, help="benchmark nodes")
+    parser.add_argument("--days", type=int, default=365, help="benchmark days per node")
+    parser.add_argument("--workers", type=int, help="benchmark loader processes")
+    parser.add_argument("--deadband", action="store_true",
+                        help="replay the logs through the dead-band filter")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.nodes, args.days, args.workers)
+        return
+    data = load_files(args.paths, args.utc_offset)
+    if args.deadband:
+        deadband_report(data, args.utc_offset)
+        return
+    print("{} rows".format(len(data["time"])))
+    for key, values in data.items():
+        if key != "time" and len(values):
+            print("  {:12s} mean {:10.2f}  min {:10.2f}  max {:10.2f}  missing {}".format(
+                key, np.nanmean(values), np.nanmin(values), np.nanmax(values),
+                int(np.isnan(values).sum())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Loads ``ESP32C3Datalogger.py`` under CPython for host tests
+===========================================================
+
+Installs stand-ins for the MicroPython modules the firmware imports
+(``machine``, ``network``, ``_thread``, ...) and the ``time.ticks_*``
+functions, then runs the firmware source up to its main program. The
+returned namespace holds the firmware's classes and functions. Files are
+read and written in the current directory, so tests chdir to a temporary one.
+"""
+
+import binascii
+import gc
+import os
+import sys
+import threading
+import time
+import types
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+TICKS_MAX = 0x3FFFFFFF
+
+
+def _ticks_ms():
+    return int(time.monotonic() * 1000) & TICKS_MAX
+
+
+def _ticks_diff(a, b):
+    d = (a - b) & TICKS_MAX
+    return d - TICKS_MAX - 1 if d > TICKS_MAX // 2 else d
+
+
+class Pin:
+    OUT = 1
+    IN = 0
+    OPEN_DRAIN = 2
+    PULL_UP = 3
+
+    def __init__(self, *args, **kwargs):
+        self.level = 1
+
+    def __call__(self, value=None):
+        if value is None:
+            return self.level
+        self.level = value
+
+    value = __call__
+
+    def init(self, *args, **kwargs):
+        pass
+
+
+class ADC:
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, *args):
+        pass
+
+    def atten(self, attenuation):
+        pass
+
+    def width(self, width):
+        pass
+
+    def read(self):
+        return 2500
+
+
+class I2C:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def scan(self):
+        return []
+
+
+class RTC:
+    """Sets nothing; tests that need a settable clock replace it"""
+
+    def datetime(self, value=None):
+        return time.gmtime()[:7] + (0,)
+
+
+class WLAN:
+    def __init__(self, *args):
+        self.connected = False
+
+    def active(self, value=None):
+        return True
+
+    def isconnected(self):
+        return self.connected
+
+    def connect(self, ssid, password):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def config(self, **kwargs):
+        pass
+
+    def ifconfig(self):
+        return ("127.0.0.1", "", "", "")
+
+    def status(self, *args):
+        return 1010 if self.connected else 1001
+
+
+def _install():
+    if not hasattr(time, "ticks_add"):
+        time.ticks_ms = _ticks_ms
+        time.ticks_diff = _ticks_diff
+        time.ticks_add = lambda a, b: (a + b) & TICKS_MAX
+        time.ticks_us = lambda: int(time.monotonic() * 1000000) & TICKS_MAX
+        time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+        time.sleep_us = lambda us: time.sleep(us / 1000000)
+    if not hasattr(gc, "mem_free"):
+        gc.mem_alloc = lambda: 0
+        gc.mem_free = lambda: 100000
+        gc.threshold = lambda *args: None
+    modules = {
+        "micropython": types.SimpleNamespace(const=lambda value: value),
+        "ubinascii": types.SimpleNamespace(hexlify=binascii.hexlify),
+        "_thread": types.SimpleNamespace(
+            allocate_lock=threading.Lock,
+            start_new_thread=lambda f, args: threading.Thread(target=f, args=args, daemon=True).start()),
+        "network": types.SimpleNamespace(WLAN=WLAN, STA_IF=0, STAT_IDLE=1000, STAT_CONNECTING=1001,
+                                         STAT_GOT_IP=1010),
+        "machine": types.SimpleNamespace(Pin=Pin, ADC=ADC, I2C=I2C, SoftI2C=I2C, RTC=RTC,
+                                         reset=lambda: None),
+    }
+    for name, module in modules.items():
+        sys.modules.setdefault(name, module)
+
+
+def load():
+    """Namespace of the firmware run up to '# --- Main Program ---'"""
+    _install()
+    with open(os.path.join(ROOT, "ESP32C3Datalogger.py")) as f:
+        source = f.read().split("# --- Main Program ---")[0]
+    namespace = {"__name__": "ESP32C3Datalogger"}
+    exec(compile(source, "ESP32C3Datalogger.py", "exec"), namespace)
+    return namespace
@@ -0,0 +1,189 @@
+"""
+Host test of the BME680 SPI page-select caching
+===============================================
+
+Runs the ``bme680`` driver under CPython against a register-level mock of the
+chip behind an SPI bus, and counts chip-select frames and the buffers a reading
+allocates. Run with::
+
+    python -m pytest tests
+"""
+
+import binascii
+import builtins
+import os
+import struct
+import sys
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# MicroPython modules and time functions the driver uses
+sys.modules.setdefault("micropython", types.SimpleNamespace(const=lambda value: value))
+sys.modules.setdefault("ubinascii", types.SimpleNamespace(hexlify=binascii.hexlify))
+if not hasattr(time, "ticks_ms"):
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.sleep_ms = lambda ms: None
+
+import bme680  # noqa: E402
+
+PAGE_SELECT = 0x73
+SOFTRESET = 0xE0
+
+
+class Chip:
+    """Register map of a BME680 with plausible calibration and ADC data"""
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        self.regs[0xD0] = 0x61
+        low = struct.pack("<hbBHhbBhhbbHhhBB", 26457, 3, 0, 35875, -10381, 88, 0, 7349, -93,
+                          46, 30, 0, -2588, -2636, 30, 0)
+        self.regs[0x8A:0x8A + len(low)] = low
+        high = struct.pack("<BBbbbBbHhbb", 0x3F, 0x34, 0, 45, 20, 120, -100, 25987, -13276, -33, 18)
+        self.regs[0xE1:0xE1 + len(high)] = high
+        self.regs[0xEE] = 18  # par_gh3, the ambient temperature term of the heater resistance
+        self.regs[0x00] = 40
+        self.regs[0x02] = 0x10
+        self.regs[0x1F:0x27] = bytes((0x60, 0x00, 0x00, 0x38, 0x00, 0x00, 0x60, 0x00))  # P, T, H
+        self.regs[0x2A:0x2C] = bytes((0x80, 0x35))
+
+    def write(self, register, value):
+        self.regs[register] = value
+        if register == 0x74 and value & 0x03 == 0x01:
+            # Forced mode: the conversion is done at once
+            self.regs[0x1D] = 0x80 | (self.regs[0x71] & 0x0F)
+
+
+class CS:
+    """Chip-select pin counting frames (high to low edges)"""
+
+    def __init__(self):
+        self.value = 1
+        self.frames = 0
+
+    def __call__(self, value):
+        if self.value == 1 and value == 0:
+            self.frames += 1
+        self.value = value
+
+
+class SPI:
+    """SPI bus with the BME680's two 128-byte memory pages"""
+
+    def __init__(self, chip, cs):
+        self.chip = chip
+        self.cs = cs
+        self.page = 0
+        self.command = None
+        self.fail = False
+        self.buffers = []  # Every buffer passed to the bus, kept alive so ids stay unique
+
+    def address(self, register):
+        register &= 0x7F
+        if register == PAGE_SELECT:
+            return register
+        return register | (0x80 if self.page == 0 else 0)
+
+    def write(self, buffer):
+        assert self.cs.value == 0
+        self.buffers.append(buffer)
+        if self.fail:
+            raise OSError("bus error")
+        if len(buffer) == 1 and buffer[0] & 0x80:
+            self.command = buffer[0]
+            return
+        for i in range(0, len(buffer), 2):
+            register = self.address(buffer[i])
+            if register == PAGE_SELECT:
+                self.page = 1 if buffer[i + 1] & 0x10 else 0
+            elif register == SOFTRESET and buffer[i + 1] == 0xB6:
+                self.page = 0
+            self.chip.write(register, buffer[i + 1])
+
+    def readinto(self, buffer):
+        assert self.cs.value == 0
+        self.buffers.append(buffer)
+        register = self.address(self.command)
+        buffer[:] = self.chip.regs[register:register + len(buffer)]
+
+
+@pytest.fixture
+def sensor():
+    cs = CS()
+    spi = SPI(Chip(), cs)
+    return bme680.BME680_SPI(spi, cs), spi
+
+
+def test_init_frames(sensor):
+    device, spi = sensor
+    assert spi.cs.frames == 13
+    assert device._spi_mem_page == spi.page << 4  # The cache matches the chip
+
+
+def test_reading_frames(sensor):
+    device, spi = sensor
+    spi.cs.frames = 0
+    device._perform_reading()
+    assert spi.cs.frames == 7
+    assert device.raw[:3] == (0x38000, 0x60000, 0x6000)  # T, P, H
+    assert 25 < device.temperature < 26
+
+
+def test_page_cache_cleared_by_soft_reset(sensor):
+    device, spi = sensor
+    device._write_byte(SOFTRESET, 0xB6)
+    assert device._spi_mem_page is None
+    frames = spi.cs.frames
+    assert device._read(0xD0, 1)[0] == 0x61
+    assert spi.cs.frames == frames + 2  # The page is selected again before the read
+
+
+def test_page_cache_cleared_by_bus_error(sensor):
+    device, spi = sensor
+    spi.fail = True
+    with pytest.raises(OSError):
+        device._write_byte(0x74, 0)
+    assert device._spi_mem_page is None
+    assert spi.cs.value == 1
+    spi.fail = False
+    assert device._read(0xD0, 1)[0] == 0x61
+
+
+def test_res_heat_follows_ambient(sensor):
+    device, spi = sensor
+    frames = spi.cs.frames
+    res_heat = spi.chip.regs[0x5A]
+    device.ambient_temperature = 26
+    assert spi.cs.frames == frames  # Same register value, nothing written
+    device.ambient_temperature = -30
+    assert spi.cs.frames == frames + 1
+    assert spi.chip.regs[0x5A] == device._calc_res_heat(320) != res_heat
+
+
+def test_measurement_time_rounds_up(sensor):
+    device, spi = sensor
+    # 1x oversampling: 3 * 1963 + 477 * 9 + 1000 us = 11182 us
+    device._temp_oversample = device._pressure_oversample = device._humidity_oversample = 1
+    assert device.measurement_time(-1) == 12
+
+
+def test_reading_allocates_no_buffers(sensor, monkeypatch):
+    device, spi = sensor
+    made = []
+    for name in ("bytearray", "bytes"):
+        real = getattr(builtins, name)
+        monkeypatch.setattr(bme680, name, lambda *args, real=real: made.append(real) or real(*args),
+                            raising=False)
+    spi.buffers = []
+    for _ in range(10):
+        device.start_measurement()
+        device.finish_measurement()
+    assert made == []
+    # 90 transfers through the same few preallocated buffers
+    assert len(spi.buffers) == 90
+    assert len({id(buffer) for buffer in spi.buffers}) <= 4
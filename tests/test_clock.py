@@ -0,0 +1,133 @@
+"""
+Host test of the NTP clock service against a stand-in server
+=============================================================
+
+Runs ``ClockService`` against a local UDP NTP responder, with the RTC
+replaced by an offset from the host clock, and checks that the first sync
+steps the clock and that small offsets are slewed. Run with::
+
+    python -m pytest tests
+"""
+
+import calendar
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+import firmware
+
+NTP_DELTA = 2208988800  # 1900 to 1970
+
+
+class Responder:
+    """NTP server that answers with the host clock plus skew_us"""
+
+    def __init__(self):
+        self.skew_us = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                request, addr = self.sock.recvfrom(48)
+            except OSError:
+                return  # Closed
+            us = time.time_ns() // 1000 + self.skew_us
+            secs, frac = us // 1000000 + NTP_DELTA, ((us % 1000000) << 32) // 1000000
+            reply = bytearray(48)
+            reply[0] = 0x24  # Version 4, server
+            reply[1] = 2  # Stratum
+            reply[24:32] = request[40:48]  # Originate = the client's transmit time
+            struct.pack_into("!IIII", reply, 32, secs, frac, secs, frac)
+            self.sock.sendto(reply, addr)
+
+
+class RTC:
+    """RTC kept as an offset from the host clock"""
+
+    def __init__(self, offset_us):
+        self.offset_us = offset_us
+        self.sets = 0
+
+    def now_us(self):
+        return time.time_ns() // 1000 + self.offset_us
+
+    def datetime(self, value):
+        year, month, day, _, hour, minute, second, us = value
+        target = calendar.timegm((year, month, day, hour, minute, second)) * 1000000 + us
+        self.offset_us = target - time.time_ns() // 1000
+        self.sets += 1
+
+
+@pytest.fixture
+def responder():
+    responder = Responder()
+    yield responder
+    responder.sock.close()
+
+
+@pytest.fixture
+def fw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return firmware.load()
+
+
+@pytest.fixture
+def clock(fw, responder):
+    clock = fw["ClockService"]("127.0.0.1", responder.port)
+    clock.rtc = RTC(-25 * 365 * 86400 * 1000000)  # Power-on default date
+    clock.wall_us = clock.rtc.now_us
+    return clock
+
+
+def sync(clock, metrics):
+    clock.next_sync = time.ticks_ms()
+    syncs = metrics["ntp_syncs"]
+    for _ in range(100):
+        clock.poll(True)
+        if metrics["ntp_syncs"] > syncs:
+            return
+        time.sleep(0.01)
+    raise AssertionError("no reply")
+
+
+def test_first_sync_steps_the_clock(fw, clock):
+    sync(clock, fw["metrics"])
+    assert clock.synced
+    assert fw["metrics"]["ntp_steps"] == 1
+    assert abs(clock.rtc.offset_us) < 50000  # Within the loopback round trip
+    assert 0 <= fw["metrics"]["ntp_delay_ms"] < 50
+
+
+def test_small_offset_is_slewed(fw, clock, responder):
+    sync(clock, fw["metrics"])
+    responder.skew_us = 300000
+    sets = clock.rtc.sets
+    sync(clock, fw["metrics"])
+    assert fw["metrics"]["ntp_steps"] == 1  # Below CLOCK_STEP_THRESHOLD
+    assert clock.rtc.sets == sets
+    assert 250 < clock.pending_ms < 350
+
+    # Two seconds of run time slew at most 2 * SLEW_MS_PER_S
+    before = clock.rtc.offset_us
+    pending = clock.pending_ms
+    clock.last_discipline = time.ticks_add(time.ticks_ms(), -2000)
+    clock.discipline()
+    moved_ms = (clock.rtc.offset_us - before) / 1000
+    assert moved_ms == pytest.approx(2 * clock.SLEW_MS_PER_S, abs=1)
+    assert clock.pending_ms == pytest.approx(pending - 2 * clock.SLEW_MS_PER_S, abs=0.5)
+
+
+def test_large_offset_after_sync_is_stepped(fw, clock, responder):
+    sync(clock, fw["metrics"])
+    responder.skew_us = -5000000
+    sync(clock, fw["metrics"])
+    assert fw["metrics"]["ntp_steps"] == 2
+    assert clock.rtc.offset_us == pytest.approx(-5000000, abs=50000)
+    assert clock.pending_ms == 0
@@ -0,0 +1,64 @@
+"""
+Host test of the log archive's month rewrite
+============================================
+
+Checks that merging late rows into a month switches column generations only
+when the manifest is replaced. Needs ``numpy``. Run with::
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import log_archive  # noqa: E402
+
+JAN = 1735689600  # 2025-01-01 00:00 UTC
+
+
+def rows(minutes, temperature):
+    return {"time": np.array([JAN + 60 * m for m in minutes], np.int64),
+            "temperature": np.array(temperature, np.float64)}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = log_archive.Archive(str(tmp_path))
+    archive.ingest("kitchen", rows([10, 20, 30], [21.0, 22.0, 23.0]))
+    return archive
+
+
+def test_late_rows_rewrite_in_time_order(archive):
+    assert archive.ingest("kitchen", rows([15, 25, 30], [21.5, 22.5, 99.0])) == 2
+    month = archive.month("kitchen", "2025-01")
+    assert month.manifest["generation"] == 1
+    assert list(month.column("temperature")) == [21.0, 21.5, 22.0, 22.5, 23.0]
+    # Only the new generation and the manifest are left
+    assert sorted(os.listdir(month.path)) == ["manifest.json", "temperature.1.f4", "time.1.i8"]
+    assert archive.ingest("kitchen", rows([40], [24.0])) == 1
+    assert list(archive.month("kitchen", "2025-01").column("time"))[-1] == JAN + 2400
+
+
+def test_crash_before_manifest_keeps_old_month(archive, monkeypatch):
+    def crash(path, data):
+        raise OSError("power cut")
+
+    monkeypatch.setattr(log_archive, "_write_json", crash)
+    with pytest.raises(OSError):
+        archive.ingest("kitchen", rows([5, 15], [20.0, 21.5]))
+    monkeypatch.undo()
+
+    month = archive.month("kitchen", "2025-01")
+    assert month.manifest["generation"] == 0
+    assert list(month.column("temperature")) == [21.0, 22.0, 23.0]
+    # The next rewrite overwrites the half-written generation and removes it
+    assert archive.ingest("kitchen", rows([5, 15], [20.0, 21.5])) == 2
+    month = archive.month("kitchen", "2025-01")
+    assert list(month.column("temperature")) == [20.0, 21.0, 21.5, 22.0, 23.0]
+    assert sorted(os.listdir(month.path)) == ["manifest.json", "temperature.1.f4", "time.1.i8"]
@@ -0,0 +1,45 @@
+"""
+Host test of checksummed log records
+====================================
+
+Checks that a daily log written before records carried checksums is converted
+at boot, so rows appended later match its header. Run with::
+
+    python -m pytest tests
+"""
+
+import pytest
+
+import firmware
+
+
+@pytest.fixture
+def fw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return firmware.load()
+
+
+def test_unframed_log_is_converted_at_boot(fw):
+    with open("2025-01-01.log", "w") as f:
+        f.write("Time, Temp(C), Humidity(%)\n")
+        f.write("00:00:00, 21.50, 40.00\n")
+        f.write("#deadband, heartbeat=600\n")
+        f.write("00:01:00, 21.60, 40.10\n")
+        f.write("00:02:00, 21.7")  # Torn by a power cut
+    fw["recover_log"]()
+
+    with open("2025-01-01.log") as f:
+        columns, framed = fw["read_log_header"](f)
+        lines = f.read().splitlines()
+    assert framed and columns == ["Time", "Temp(C)", "Humidity(%)"]
+    assert fw["check_record"](lines[0]) == ["00:00:00", "21.50", "40.00"]
+    assert lines[1] == "#deadband, heartbeat=600"
+    assert fw["check_record"](lines[2]) == ["00:01:00", "21.60", "40.10"]
+    assert fw["check_record"](lines[3]) is None  # The torn row is still skipped
+
+    # A framed log is left alone
+    with open("2025-01-01.log") as f:
+        before = f.read()
+    fw["recover_log"]()
+    with open("2025-01-01.log") as f:
+        assert f.read() == before
@@ -0,0 +1,61 @@
+"""
+Host test of log compaction and retention
+=========================================
+
+Checks that compacting a day twice (a reset between the summary append and
+the log's removal) adds its hours once, and that rotation under flash
+pressure keeps the current month's summary. Run with::
+
+    python -m pytest tests
+"""
+
+import os
+
+import pytest
+
+import firmware
+
+
+@pytest.fixture
+def fw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fw = firmware.load()
+    with open("2025-01-01.log", "w") as f:
+        f.write("Time, Temp(C), Chk\n")
+        for hour in range(3):
+            f.write(fw["frame_record"](["{:02d}:00:00".format(hour), "21.50"]))
+    return fw
+
+
+def summary_rows():
+    with open("2025-01.sum") as f:
+        return [line.rstrip("\n") for line in f][1:]
+
+
+def test_compacting_again_adds_nothing(fw):
+    fw["compact_log"]("2025-01-01.log")
+    rows = summary_rows()
+    assert [row[:14] for row in rows] == ["2025-01-01, 00", "2025-01-01, 01", "2025-01-01, 02"]
+    fw["compact_log"]("2025-01-01.log")
+    assert summary_rows() == rows
+
+
+def test_row_cut_by_a_reset_is_written_again(fw):
+    fw["compact_log"]("2025-01-01.log")
+    rows = summary_rows()
+    with open("2025-01.sum", "rb+") as f:
+        f.truncate(os.path.getsize("2025-01.sum") - 10)
+    fw["compact_log"]("2025-01-01.log")
+    assert summary_rows()[:2] == rows[:2]
+    assert summary_rows()[-1] == rows[-1]
+
+
+def test_rotation_keeps_the_current_summary(fw):
+    os.remove("2025-01-01.log")
+    current = "{}.sum".format(fw["date_str"]()[:7])
+    for name in ("2024-11.sum", "2024-12.sum", current):
+        with open(name, "w") as f:
+            f.write(", ".join(fw["SUMMARY_HEADER"]) + "\n")
+    fw["flash_usage"] = lambda: 1.0
+    fw["rotate_logs"](31)
+    assert sorted(f for f in os.listdir() if f.endswith(".sum")) == [current]
@@ -0,0 +1,132 @@
+"""
+Host test of the uplink against stand-in collectors
+===================================================
+
+Pushes a daily log through ``Uplink`` to a local HTTP server and to an MQTT
+client stand-in, and checks that a collector that never answers costs at most
+UPLINK_TIMEOUT. Run with::
+
+    python -m pytest tests
+"""
+
+import json
+import socket
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import firmware
+
+
+@pytest.fixture
+def fw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fw = firmware.load()
+    fw["UPLINK_TIMEOUT"] = 1
+    with open("2025-01-01.log", "w") as f:
+        f.write("Time, Temp(C), Chk\n")
+        for minute in range(3):
+            f.write(fw["frame_record"](["00:{:02d}:00".format(minute), "21.50"]))
+    return fw
+
+
+def serve(handler):
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def silent_listener():
+    """Accepts connections and never replies"""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    return listener
+
+
+def test_http_push_advances_cursor(fw):
+    bodies = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            bodies.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = serve(Collector)
+    fw["UPLINK_URL"] = "http://127.0.0.1:{}/ingest".format(server.server_port)
+    uplink = fw["Uplink"]()
+    uplink.poll(True, 60000)
+    server.shutdown()
+
+    assert len(bodies) == 1
+    assert bodies[0]["header"] == ["Time", "Temp(C)", "Chk"]
+    assert [row[:8] for row in bodies[0]["rows"]] == ["00:00:00", "00:01:00", "00:02:00"]
+    with open(fw["UPLINK_STATE_FILE"]) as f:
+        assert json.load(f) == {"file": "2025-01-01.log", "offset": uplink.offset}
+    assert fw["metrics"]["uplink_records"] == 3
+
+
+def test_silent_http_collector_times_out(fw):
+    listener = silent_listener()
+    fw["UPLINK_URL"] = "http://127.0.0.1:{}/ingest".format(listener.getsockname()[1])
+    uplink = fw["Uplink"]()
+    start = time.monotonic()
+    uplink.poll(True, 60000)
+    assert time.monotonic() - start < 3
+    assert fw["metrics"]["uplink_failures"] == 1
+    assert uplink.offset == 0
+    listener.close()
+
+
+class MQTTClient:
+    """umqtt.simple stand-in that connects a real socket and waits for CONNACK"""
+
+    made = []
+    broker_port = 1883  # Port used when none is given, moved to the stand-in broker
+
+    def __init__(self, client_id, server, port=0, keepalive=0):
+        self.server = server
+        self.port = port or MQTTClient.broker_port
+        self.keepalive = keepalive
+        self.sock = None
+        MQTTClient.made.append(self)
+
+    def connect(self, clean_session=True, timeout=None):
+        self.timeout = timeout
+        self.sock = socket.socket()
+        self.sock.settimeout(timeout)
+        self.sock.connect((self.server, self.port))
+        if self.sock.recv(4) == b"":
+            raise OSError("closed")
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        raise AssertionError("not connected")
+
+
+def test_silent_mqtt_broker_times_out(fw, monkeypatch):
+    listener = silent_listener()
+    simple = types.SimpleNamespace(MQTTClient=MQTTClient)
+    monkeypatch.setitem(sys.modules, "umqtt", types.SimpleNamespace(simple=simple))
+    monkeypatch.setitem(sys.modules, "umqtt.simple", simple)
+    MQTTClient.made = []
+    monkeypatch.setattr(MQTTClient, "broker_port", listener.getsockname()[1])
+    fw["UPLINK_MQTT_BROKER"] = "127.0.0.1"
+
+    uplink = fw["Uplink"]()
+    start = time.monotonic()
+    uplink.poll(True, 60000)
+    assert time.monotonic() - start < 3
+    client = MQTTClient.made[0]
+    assert client.timeout == fw["UPLINK_TIMEOUT"]
+    assert client.keepalive == fw["UPLINK_MQTT_KEEPALIVE"]
+    assert fw["metrics"]["uplink_failures"] == 1
+    assert uplink.mqtt is None
+    listener.close()